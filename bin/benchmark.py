@@ -0,0 +1,16 @@
+import sys
+import importlib
+from os.path import dirname, basename, abspath
+
+# Post processing reaches the add-in config.py with relative imports, so it has to be imported
+# as a package named after the add-in catalog - eg. from the add-in catalog:
+#   python -m bin.benchmark --sizes small medium
+ADDIN_ROOT_PATH = dirname(dirname(abspath(__file__)))
+
+if dirname(ADDIN_ROOT_PATH) not in sys.path:
+    sys.path.insert(0, dirname(ADDIN_ROOT_PATH))
+
+harness = importlib.import_module(f'{basename(ADDIN_ROOT_PATH)}.lib.postProcessUtils.src.benchmark.harness')
+
+if __name__ == "__main__":
+    harness.main()
@@ -1,8 +1,9 @@
 import adsk.core, adsk.fusion, traceback
 import os
+import json
 from ...lib import fusionAddInUtils as futil
-from ...lib import postProcessUtils as pputil
 from ... import config
+from .post_process_worker import PostProcessJob
 
 app = adsk.core.Application.get()
 ui = app.userInterface
@@ -12,7 +13,7 @@ units = design.unitsManager.defaultLengthUnits
 
 CMD_NAME = os.path.basename(os.path.dirname(__file__))
 CMD_ID = f'{config.COMPANY_NAME}_{config.ADDIN_NAME}_{CMD_NAME}'
-CMD_Description = 'Export selected component as 3MF and apply post processing scripts - to convert specific objects into special types interpretable by slicer.'
+CMD_Description = 'Export selected components (each into its own file) as 3MF and apply post processing scripts - to convert specific objects into special types interpretable by slicer.'
 IS_PROMOTED = False
 
 # Global variables by referencing values from /config.py
@@ -30,6 +31,12 @@ ICON_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'resource
 # Holds references to event handlers
 local_handlers = []
 
+# Background post processing reports back through this custom event, see start_post_processing
+POST_PROCESS_EVENT_ID = f'{CMD_ID}_post_process'
+
+# job_id: (PostProcessJob, adsk.core.ProgressDialog) of post processing still running
+post_process_jobs = {}
+
 selectedExportPath = futil.get_default_upload_directory()
 defaultExportFileName = '_exports'
 
@@ -65,6 +72,8 @@ def start():
     # Now you can set various options on the control such as promoting it to always be shown.
     control.isPromoted = IS_PROMOTED
 
+    futil.register_custom_event(POST_PROCESS_EVENT_ID, on_post_process_event)
+
 # Executed when add-in is stopped.
 def stop():
     # Get the various UI elements for this command
@@ -90,6 +99,14 @@ def stop():
     if toolbar_tab.toolbarPanels.count == 0:
         toolbar_tab.deleteMe()
 
+    # Running post processing stops before its next stage, nobody is left to report to
+    for job, progress_dialog in post_process_jobs.values():
+        job.cancel()
+        progress_dialog.hide()
+    post_process_jobs.clear()
+
+    futil.unregister_custom_event(POST_PROCESS_EVENT_ID)
+
 # Function to be called when a user clicks the corresponding button in the UI.
 def command_created(args: adsk.core.CommandCreatedEventArgs):
     futil.log(f'{CMD_NAME} Command Created Event')
@@ -161,13 +178,14 @@ def export_tab_view(parent_inputs: adsk.core.CommandInputs):
     inputs.addSeparatorCommandInput('separator_2')
 
     ## Select objects to be exported
-    export_selections = inputs.addSelectionInput('export_selections', 'Selected Component', '')
+    export_selections = inputs.addSelectionInput('export_selections', 'Selected Components', '')
 
     export_selections.addSelectionFilter('SolidBodies')
     export_selections.addSelectionFilter('Occurrences')
     # export_selections.addSelectionFilter('RootComponents')
 
-    export_selections.setSelectionLimits(1, 1)
+    # any number of components and bodies, each one exported into its own file
+    export_selections.setSelectionLimits(1, 0)
 
     inputs.addSeparatorCommandInput('separator_3')
 
@@ -194,24 +212,51 @@ def execute_export(inputs: adsk.core.CommandInputs):
     export_selections = inputs.itemById('export_selections')
     file_name_string_value = inputs.itemById('file_name_string_value')
 
-    selected_entity = export_selections.selection(0).entity
-    output_path = f'{selectedExportPath}\\{file_name_string_value.value}'
+    entities = [export_selections.selection(idx).entity for idx in range(export_selections.selectionCount)]
+    # a single selection is exported under the (editable) filename, many - each one named after itself
+    file_names = [file_name_string_value.value] if len(entities) == 1 else get_unique_file_names(entities)
+
+    job, progress_dialog = start_post_processing(len(entities))
+
+    # exports run back to back on the main thread, exported files are post processed in the background meanwhile
+    for entity, file_name in zip(entities, file_names):
+        output_path = os.path.join(selectedExportPath, file_name)
+
+        export_options = export_mgr.createC3MFExportOptions(entity, output_path)
+
+        export_options.sendToPrintUtility = False
+        export_options.isOneFilePerBody = False
+        export_options.meshRefinement = get_refinement_option_value(inputs)
 
-    export_options = export_mgr.createC3MFExportOptions(selected_entity, output_path)
+        # lets Fusion process the cancel button click (and post processing progress) between exports
+        adsk.doEvents()
+        if progress_dialog.wasCancelled:
+            job.cancel()
+            job.add_result(f'{output_path}.3mf', 'cancelled')
+            continue
 
-    export_options.sendToPrintUtility = False
-    export_options.isOneFilePerBody = False
-    export_options.meshRefinement = get_refinement_option_value(inputs)
+        isExportSuccess = export_mgr.execute(export_options)
 
-    isExportSuccess = export_mgr.execute(export_options)
+        if (isExportSuccess):
+            job.submit(f'{output_path}.3mf')
+        else:
+            job.add_result(f'{output_path}.3mf', 'failed', 'Fusion 3MF export failed')
 
-    if (isExportSuccess):
-        try:
-            pputil.process_file(f'{output_path}.3mf')
-        except Exception as err:
-            if config.DEBUG:
-                raise err
-            ui.messageBox(f'Error:\n"{err}"\n\n---------Trace:\n\n{traceback.format_exc()}')
+    job.close()
+
+# Post processing runs on background threads, Fusion stays responsive meanwhile.
+# Progress and results come back through POST_PROCESS_EVENT_ID, handled on the main thread (see on_post_process_event).
+def start_post_processing(total: int) -> tuple:
+    job = PostProcessJob(lambda payload: futil.fire_custom_event(POST_PROCESS_EVENT_ID, payload))
+
+    progress_dialog = ui.createProgressDialog()
+    progress_dialog.isCancelButtonShown = True
+    progress_dialog.cancelButtonText = 'Cancel'
+    progress_dialog.show(f'{CMD_NAME} - post processing', 'Exporting...', 0, total)
+
+    post_process_jobs[job.job_id] = (job, progress_dialog)
+
+    return job, progress_dialog
 
 ################
 ## UTILS
@@ -234,10 +279,79 @@ def get_refinement_option_value(inputs: adsk.core.CommandInputs):
 
     return refinement_value
 
+# file name of every entity, the same names are numbered - eg. "Body1", "Body1_2"
+def get_unique_file_names(entities: list) -> list:
+    file_names = []
+
+    for entity in entities:
+        base_name = file_name = futil.get_file_name(entity)
+        idx = 1
+        while file_name in file_names:
+            idx += 1
+            file_name = f'{base_name}_{idx}'
+        file_names.append(file_name)
+
+    return file_names
+
+def format_post_process_results(results: list) -> str:
+    lines = []
+
+    for result in results:
+        # only the first line of (usually multi line) error
+        details = f'-> {os.path.basename(result["output_path"])}' if result['status'] == 'ok' else ((result['error'] or '').strip().splitlines() or [''])[0]
+        lines.append(f'{result["status"].upper()}: {os.path.basename(result["path"])} {details}')
+
+    return '\n'.join(lines)
+
 ################
 ## LISTENERS
 ################
 
+# background post processing state, see PostProcessJob
+def on_post_process_event(args: adsk.core.CustomEventArgs):
+    payload = json.loads(args.additionalInfo)
+    job, progress_dialog = post_process_jobs.get(payload['job_id'], (None, None))
+    if job is None:
+        return
+
+    if payload['status'] == 'progress':
+        # lets Fusion process the cancel button click - it could also handle the job being done meanwhile
+        adsk.doEvents()
+        if payload['job_id'] not in post_process_jobs:
+            return
+
+        # every file stops before its next stage
+        if progress_dialog.wasCancelled:
+            job.cancel()
+            return
+
+        step = f' ({payload["step"]}/{payload["steps"]})' if payload['step'] else ''
+        progress_dialog.progressValue = payload['processed']
+        progress_dialog.message = f'%v/%m processed - {os.path.basename(payload["path"])}: {payload["stage"]}{step}'
+        return
+
+    progress_dialog.hide()
+    del post_process_jobs[payload['job_id']]
+
+    results = payload['results']
+    for result in results:
+        if result['status'] == 'failed':
+            futil.log(f'{CMD_NAME} post processing of "{result["path"]}" failed\n{result["trace"] or result["error"]}', adsk.core.LogLevels.ErrorLogLevel)
+        else:
+            futil.log(f'{CMD_NAME} post processing of "{result["path"]}": {result["status"]}')
+
+    failed = [result for result in results if result['status'] == 'failed']
+
+    errors = [job.errors[result['path']] for result in failed if result['path'] in job.errors]
+    if config.DEBUG and errors:
+        raise errors[0]
+
+    # a single file - the error as it was raised
+    if len(results) == 1 and failed:
+        ui.messageBox(f'Error:\n"{failed[0]["error"]}"\n\n---------Trace:\n\n{failed[0]["trace"] or ""}')
+    elif len(results) > 1:
+        ui.messageBox(f'Exported {len(results)} file(s), {len(failed)} failed:\n\n{format_post_process_results(results)}')
+
 def handle_input_changed(changed_input: adsk.core.CommandInput, inputs: adsk.core.CommandInputs):
     if changed_input.id == 'export_selections':
         on_change_export_selections(inputs)
@@ -247,11 +361,15 @@ def handle_input_changed(changed_input: adsk.core.CommandInput, inputs: adsk.cor
 
 def on_change_export_selections(inputs: adsk.core.CommandInputs):
     selectionInput = inputs.itemById('export_selections')
+    file_name_string_value = inputs.itemById('file_name_string_value')
+
+    # many selections are named after themselves, see execute_export
+    file_name_string_value.isEnabled = selectionInput.selectionCount <= 1
+
     selection = selectionInput.selection(0)
     if (not selection):
         return
 
-    file_name_string_value = inputs.itemById('file_name_string_value')
     file_name_string_value.value = futil.get_file_name(selection.entity)
 
 def on_change_export_button(inputs: adsk.core.CommandInputs):
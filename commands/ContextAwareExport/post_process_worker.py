@@ -0,0 +1,121 @@
+import os
+import threading
+import traceback
+from itertools import count
+from typing import Callable
+from concurrent.futures import ThreadPoolExecutor
+
+from ...lib import postProcessUtils as pputil
+
+# Stages of the default pipeline in order they run, to turn the current stage into progress.
+# Stages not listed here (eg. of other modes) don't move the progress.
+PROGRESS_STAGES = [
+    'check_archive_names',
+    'extract',
+    'parse',
+    'process_3d_model',
+    'build_components',
+    'write',
+    'create_model_settings',
+    'archive',
+]
+
+# Files post processed at once. Threads, not processes - Fusion's embedded Python can't start worker processes,
+# (de)compression and file I/O release the GIL, so exports still overlap well.
+POST_PROCESS_WORKERS = max(min((os.cpu_count() or 1) - 1, 4), 1)
+
+_job_ids = count(1)
+
+# Post processing of exported files on background threads - Fusion's UI is not blocked meanwhile.
+# Files are submitted as they are exported and processed in parallel, while the next ones are still being exported.
+#
+# Every state change is passed to notify(payload: dict), called from a background thread
+# (in Fusion it fires a custom event, handled back on the main thread - see entry.on_post_process_event):
+#   {'job_id', 'status': 'progress', 'path', 'stage', 'step', 'steps', 'processed', 'total'}
+#   {'job_id', 'status': 'done', 'results': [{'path', 'status', 'output_path', 'error', 'trace'}]}
+# where status of a file is one of "ok", "cancelled" or "failed". 'done' is sent once the job is closed and all files are processed.
+#
+# Nothing here touches Fusion API, so the job runs headless as well.
+class PostProcessJob:
+    def __init__(self, notify: Callable[[dict], None], workers: int = POST_PROCESS_WORKERS, **options):
+        self.job_id = next(_job_ids)
+        self.notify = notify
+        # see ProcessOptions
+        self.options = options
+
+        self.pool = ThreadPoolExecutor(workers, thread_name_prefix=f'post_process_{self.job_id}')
+        self.cancelled = threading.Event()
+        self.lock = threading.Lock()
+        # path: result, in order of submission
+        self.results = {}
+        # path: exception raised by processing of the file (eg. re-raised in debug mode)
+        self.errors = {}
+        self.futures = []
+        self.processed = 0
+        self.waiter = None
+
+    # path of an exported file, processed as soon as a worker is free
+    def submit(self, path: str):
+        with self.lock:
+            self.results[path] = None
+        self.futures.append(self.pool.submit(self.run, path))
+
+    # Result of a file which didn't get to post processing (eg. failed export)
+    def add_result(self, path: str, status: str, error: str = None):
+        with self.lock:
+            self.results[path] = {'path': path, 'status': status, 'output_path': None, 'error': error, 'trace': None}
+
+    # no more files - 'done' is sent once the submitted ones are processed
+    def close(self) -> 'PostProcessJob':
+        self.waiter = threading.Thread(target=self.wait, name=f'post_process_{self.job_id}_wait', daemon=True)
+        self.waiter.start()
+        return self
+
+    # processing of every file stops before its next stage, files not started yet are skipped
+    def cancel(self):
+        self.cancelled.set()
+
+    def join(self, timeout: float = None):
+        self.waiter.join(timeout)
+
+    def wait(self):
+        self.pool.shutdown(wait=True)
+
+        with self.lock:
+            results = list(self.results.values())
+
+        self.notify({'job_id': self.job_id, 'status': 'done', 'results': results})
+
+    def run(self, path: str):
+        result = {'path': path, 'status': 'ok', 'output_path': None, 'error': None, 'trace': None}
+        error = None
+
+        try:
+            with pputil.watch_stages(lambda name: self.on_stage(path, name)):
+                self.check_cancelled(path)
+                result['output_path'] = pputil.process_file(path, **self.options)
+        except pputil.ProcessCancelledException:
+            result['status'] = 'cancelled'
+        except Exception as err:
+            result.update(status='failed', error=str(err), trace=traceback.format_exc())
+            error = err
+
+        with self.lock:
+            self.results[path] = result
+            if error is not None:
+                self.errors[path] = error
+            self.processed += 1
+
+    def on_stage(self, path: str, name: str):
+        self.check_cancelled(path)
+
+        step = PROGRESS_STAGES.index(name) + 1 if name in PROGRESS_STAGES else None
+
+        with self.lock:
+            processed, total = self.processed, len(self.results)
+
+        self.notify({'job_id': self.job_id, 'status': 'progress', 'path': path, 'stage': name, 'step': step, 'steps': len(PROGRESS_STAGES), 'processed': processed, 'total': total})
+
+    def check_cancelled(self, path: str):
+        if self.cancelled.is_set():
+            raise pputil.ProcessCancelledException(f'Post processing of "{path}" cancelled.')
@@ -1,6 +1,5 @@
 import adsk.core, adsk.fusion, traceback
 import os
-import shutil
 from ...lib import fusionAddInUtils as futil
 from ...lib import postProcessUtils as pputil
 from ... import config
@@ -87,6 +86,12 @@ class ModEntityStack:
 
 mod_entities_stack = ModEntityStack()
 
+# appearance id: appearance of plugin material libraries.
+# Built when libraries are loaded, dropped when they are unloaded - see get_appearance_index
+appearance_index = None
+# ids of the libraries the index was built from, in order
+appearance_index_libs = None
+
 ################
 ## BOILERPLATE
 ################
@@ -383,6 +388,7 @@ def load_plugin_materials():
         f_icons_dict = futil.open_json_to_dict(f_icons_json_path)
 
         load_plugin_settings(a_lib)
+        rebuild_appearance_index([a_lib, f_lib])
 
         return {
             'a_lib': a_lib,
@@ -405,6 +411,7 @@ def load_plugin_materials():
     futil.dump_to_json(f_icons_dict, f_icons_json_path)
 
     load_plugin_settings(a_lib)
+    rebuild_appearance_index([a_lib, f_lib])
 
 def get_plugin_materials() -> list[adsk.core.MaterialLibrary]:
     a_lib = app.materialLibraries.itemByName(APPEARANCE_LIB_NAME)
@@ -427,14 +434,41 @@ def get_plugin_materials() -> list[adsk.core.MaterialLibrary]:
         ]
     }
 
+# Generated icons are kept - they are reused on the next start, unless the library changes (see futil.createIcon)
 def unload_plugin_materials():
+    global appearance_index, appearance_index_libs
+
+    appearance_index = None
+    appearance_index_libs = None
     app.materialLibraries.itemByName(APPEARANCE_LIB_NAME).unload()
 
-    a_icons_path = os.path.join(DIST_RESOURCES_FOLDER, f'{APPEARANCE_LIB_NAME}')
-    f_icons_path = os.path.join(DIST_RESOURCES_FOLDER, f'{FAVORITES_LIB_NAME}')
+# Every appearance of the libraries, indexed by id - the first library with the id wins.
+def rebuild_appearance_index(m_libs: list[adsk.core.MaterialLibrary]) -> dict:
+    global appearance_index, appearance_index_libs
+
+    appearance_index = {}
+    appearance_index_libs = get_library_ids(m_libs)
+
+    for lib in m_libs:
+        if not lib:
+            continue
+
+        appearances = lib.appearances
+        for aIdx in range(appearances.count):
+            a = appearances.item(aIdx)
+            appearance_index.setdefault(a.id, a)
 
-    shutil.rmtree(a_icons_path, ignore_errors=True)
-    shutil.rmtree(f_icons_path, ignore_errors=True)
+    return appearance_index
+
+# index of the given libraries - rebuilt when it was built from other ones (or not built yet)
+def get_appearance_index(m_libs: list[adsk.core.MaterialLibrary]) -> dict:
+    if appearance_index is None or appearance_index_libs != get_library_ids(m_libs):
+        return rebuild_appearance_index(m_libs)
+
+    return appearance_index
+
+def get_library_ids(m_libs: list[adsk.core.MaterialLibrary]) -> tuple:
+    return tuple(lib.id if lib else None for lib in m_libs)
 
 ################
 ## UTILS
@@ -452,11 +486,20 @@ def to_context_aware_format(parent_name: str, obj_type: str, obj_name: str):
 def get_shorthand_object_type(o_type: str):
     return pputil.consts.object_types_to_shorthand.get(o_type, o_type)
 
+# O(1) lookup in the appearance index, see rebuild_appearance_index
 def find_appearance_in_material_libraries(id: str, m_libs: list[adsk.core.MaterialLibrary]):
-    for lib in m_libs:
-        a = lib.appearances.itemById(id)
-        if a:
-            return a
+    index = get_appearance_index(m_libs)
+
+    # eg. added to favorites after the index was built - found ones are added, misses are not cached,
+    # the appearance can still be added later
+    if id not in index:
+        appearance = next((a for a in (lib.appearances.itemById(id) for lib in m_libs if lib) if a), None)
+        if appearance:
+            index[id] = appearance
+
+        return appearance
+
+    return index[id]
 
 ################
 ## LISTENERS
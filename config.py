@@ -11,6 +11,10 @@ DEBUG = False
 
 F__UNLOAD_PLUGIN_MATERIAL_LIBRARY_ON_STOP = PROD
 
+# (de)compress 3MF archives in process, on all cores - instead of shelling out to zip/unzip or powershell
+# (the shell strategies are kept as the fallback, set it to False to use them)
+F__PARALLEL_ARCHIVE_STRATEGY = True
+
 ADDIN_NAME = os.path.basename(os.path.dirname(__file__))
 
 ADDIN_ROOT_PATH = os.path.dirname(os.path.abspath(__file__))
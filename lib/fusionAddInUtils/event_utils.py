@@ -10,6 +10,7 @@
 #  UNINTERRUPTED OR ERROR FREE.
 
 import sys
+import json
 from typing import Callable
 
 import adsk.core
@@ -86,3 +87,48 @@ def _define_handler(handler_type, callback, name: str = None):
                 handle_error(name)
 
     return Handler
+
+
+def register_custom_event(
+        event_id: str,
+        callback: Callable,
+        *,
+        local_handlers: list = None
+) -> adsk.core.CustomEvent:
+    """Registers a custom event and connects a handler to it.
+
+    Custom events are the way to get back onto Fusion's main thread from a
+    background thread - see fire_custom_event.
+
+    Arguments:
+    event_id -- Unique id of the custom event.
+    callback -- The function that will handle the event, it gets
+                adsk.core.CustomEventArgs with the fired payload in additionalInfo.
+    local_handlers -- See add_handler.
+
+    :returns:
+        The registered custom event.
+    """
+    app = adsk.core.Application.get()
+
+    # a previous run of the add-in may not have been stopped cleanly
+    app.unregisterCustomEvent(event_id)
+
+    custom_event = app.registerCustomEvent(event_id)
+    add_handler(custom_event, callback, name=event_id, local_handlers=local_handlers)
+    return custom_event
+
+
+def unregister_custom_event(event_id: str):
+    """Unregisters a custom event registered with register_custom_event.
+    """
+    adsk.core.Application.get().unregisterCustomEvent(event_id)
+
+
+def fire_custom_event(event_id: str, payload: dict):
+    """Fires a custom event with a JSON serialized payload. Safe to call from any thread.
+
+    The handler runs later, on Fusion's main thread - read the payload
+    with json.loads(args.additionalInfo).
+    """
+    adsk.core.Application.get().fireCustomEvent(event_id, json.dumps(payload))
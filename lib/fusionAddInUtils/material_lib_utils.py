@@ -9,8 +9,11 @@ import os
 import re
 import io
 import zipfile
+import json
 import pathlib
 import shutil
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 
 try:
     from ...dist.packages.PIL import Image
@@ -19,6 +22,13 @@ except:
 
 MAIN_RESOURCES_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'resources')
 
+ICON_SIZES = [(32, 32), (16, 16)]
+ICON_WORKERS = min(os.cpu_count() or 1, 8)
+
+# see createIcon, bump when icons are generated differently
+ICONS_MANIFEST_FILENAME = 'icons_manifest.json'
+ICONS_MANIFEST_VERSION = 1
+
 def getFavoritesAdsklibPath() -> list:
     app: adsk.core.Application = adsk.core.Application.get()
 
@@ -27,38 +37,115 @@ def getFavoritesAdsklibPath() -> list:
 
     return os.path.join(materialPath, 'Favorites.adsklib')
 
+# Icons (32x32 and 16x16) of every appearance swatch in .adsklib library, in basePath/<appearance id>/.
+#
+# basePath is a cache - its manifest (ICONS_MANIFEST_FILENAME) keeps the library's size, mtime and hash, and CRC of every swatch:
+#   - unchanged library (same mtime, or same hash when only mtime changed) - icons are returned as they are,
+#   - otherwise only new and changed swatches are decoded and resized, on a thread pool. Icons of removed ones are deleted.
+#
+# Returns appearance id: icon folder.
 def createIcon(zipPath: str, basePath: str):
+    manifestPath = os.path.join(basePath, ICONS_MANIFEST_FILENAME)
+    manifest = readIconsManifest(manifestPath)
+    library = getLibraryState(zipPath, manifest.get('library'))
+
+    iconsExist = all(hasIcons(iconPath) for iconPath in manifest.get('icons', {}).values())
+    if 'icons' in manifest and library['sha256'] == manifest['library']['sha256'] and iconsExist:
+        # touched, but not changed - next time it's recognized by mtime again
+        if library != manifest['library']:
+            writeIconsManifest(manifestPath, {**manifest, 'library': library})
+
+        return manifest['icons']
+
     iconPaths = {}
+    swatches = {}
 
     with zipfile.ZipFile(zipPath) as myzip:
         # get png file path
-        paths = [f for f in myzip.namelist() if re.search('._png', f) != None]
+        infos = [info for info in myzip.infolist() if re.search('._png', info.filename) != None]
+
+        # the last swatch of an appearance wins
+        swatchInfos = {getAppearanceId(info.filename): info for info in infos}
 
-        for path in paths:
-            # open Byte stream
-            with myzip.open(path) as img_file:
-                img_bin = io.BytesIO(img_file.read())
-                img = Image.open(img_bin)
+        with ThreadPoolExecutor(ICON_WORKERS) as pool:
+            futures = []
 
-                # get  material id
-                path = pathlib.Path(path)
-                id = re.sub(r'[\\|/|:|?|.|"|<|>|\|]', '-', str(path.parts[2]))
+            for id, info in swatchInfos.items():
                 iconPath = os.path.join(basePath, id)
+                iconPaths[id] = str(iconPath)
+                swatches[id] = f'{info.CRC:08x}:{info.file_size}'
 
-                # resize
-                for width, height in [(32, 32), (16, 16)]:
-                    # create icon folder
-                    pathlib.Path(iconPath).mkdir(parents=True, exist_ok=True)
+                if manifest.get('swatches', {}).get(id) == swatches[id] and hasIcons(iconPath):
+                    continue
 
-                    savePath = os.path.join(iconPath, f'{width}x{height}.png')
+                # decode and resize off the main thread, archive is read here
+                futures.append(pool.submit(resizeIcon, myzip.read(info), iconPath))
 
-                    clone = img.copy()
-                    img_resize_lanczos = clone.resize(
-                        (width, height), Image.LANCZOS)
+            for future in futures:
+                future.result()
 
-                    # save png
-                    img_resize_lanczos.save(str(savePath))
+    # icons of swatches no longer in the library
+    for id, iconPath in manifest.get('icons', {}).items():
+        if id not in iconPaths:
+            shutil.rmtree(iconPath, ignore_errors=True)
 
-                iconPaths[id] = str(iconPath)
+    pathlib.Path(basePath).mkdir(parents=True, exist_ok=True)
+    writeIconsManifest(manifestPath, {'version': ICONS_MANIFEST_VERSION, 'library': library, 'swatches': swatches, 'icons': iconPaths})
 
     return iconPaths
+
+def resizeIcon(pngBytes: bytes, iconPath: str):
+    img = Image.open(io.BytesIO(pngBytes))
+
+    # create icon folder
+    pathlib.Path(iconPath).mkdir(parents=True, exist_ok=True)
+
+    # resize
+    for width, height in ICON_SIZES:
+        savePath = os.path.join(iconPath, f'{width}x{height}.png')
+
+        clone = img.copy()
+        img_resize_lanczos = clone.resize(
+            (width, height), Image.LANCZOS)
+
+        # save png
+        img_resize_lanczos.save(str(savePath))
+
+def getAppearanceId(swatchPath: str) -> str:
+    # get  material id
+    path = pathlib.Path(swatchPath)
+
+    return re.sub(r'[\\|/|:|?|.|"|<|>|\|]', '-', str(path.parts[2]))
+
+def hasIcons(iconPath: str) -> bool:
+    return all(os.path.isfile(os.path.join(iconPath, f'{width}x{height}.png')) for width, height in ICON_SIZES)
+
+# size, mtime and sha256 of library file - hashed only when size or mtime differs from the cached state
+def getLibraryState(zipPath: str, cached: dict = None) -> dict:
+    stat = os.stat(zipPath)
+    state = {'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+
+    if cached and cached.get('size') == state['size'] and cached.get('mtime') == state['mtime']:
+        state['sha256'] = cached.get('sha256')
+        return state
+
+    digest = hashlib.sha256()
+    with open(zipPath, 'rb') as infile:
+        for chunk in iter(lambda: infile.read(1024 * 1024), b''):
+            digest.update(chunk)
+    state['sha256'] = digest.hexdigest()
+
+    return state
+
+def readIconsManifest(manifestPath: str) -> dict:
+    try:
+        with open(manifestPath, 'r') as infile:
+            manifest = json.load(infile)
+    except (OSError, ValueError):
+        return {}
+
+    return manifest if manifest.get('version') == ICONS_MANIFEST_VERSION else {}
+
+def writeIconsManifest(manifestPath: str, manifest: dict):
+    with open(manifestPath, 'w') as outfile:
+        json.dump(manifest, outfile)
@@ -1,2 +1,4 @@
 from .src.handle import process_file as process_file
+from .src.utils import watch_stages as watch_stages
+from .src.errors import ProcessCancelledException as ProcessCancelledException
 from .src.common import consts
\ No newline at end of file
@@ -1,2 +1,3 @@
-from .handle import process_file
+from .handle import process_file, process_file_result, ProcessResult
+from .pipeline import process_file_async, process_files_async
 from .common import consts
\ No newline at end of file
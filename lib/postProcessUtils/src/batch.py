@@ -0,0 +1,122 @@
+import os
+from glob import glob, has_magic, escape
+from time import perf_counter
+from os.path import isdir, isfile, getsize, join, abspath, normcase
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from . import handle
+from .errors import BusinessException, BusinessLogicException
+from .utils import is_processed_path, set_xml_backend, xml_backend
+
+__all__ = [
+    'BatchResult',
+    'collect_input_paths',
+    'process_files',
+    'create_pool',
+    'format_result',
+    'format_summary',
+]
+
+class BatchResult:
+    def __init__(self, path: str, status: str = 'ok', output_path: str = None, error: str = None, duration: float = 0.0, peak_memory: int = None):
+        self.path = path
+        # "ok" or "failed"
+        self.status = status
+        self.output_path = output_path
+        self.error = error
+        self.duration = duration
+        # bytes the file took to process at the peak, on top of RSS of the worker before (see handle.ProcessResult)
+        self.peak_memory = peak_memory
+
+    @property
+    def ok(self) -> bool:
+        return self.status == 'ok'
+
+# Expand paths, glob patterns and catalogs (searched recursively) into a list of 3MF files to process.
+# Outputs of previous runs ("*_processed.3mf") are skipped, a file reached more than once (eg. "a.3mf" and "./A.3mf"
+# on Windows) is listed only the first time.
+def collect_input_paths(inputs: list[str]) -> list[str]:
+    paths = []
+    seen = set()
+
+    for input_path in inputs:
+        if isdir(input_path):
+            candidates = sorted(glob(join(escape(input_path), '**', '*.3mf'), recursive=True))
+        elif has_magic(input_path):
+            candidates = sorted(glob(input_path, recursive=True))
+        else:
+            candidates = [input_path]
+
+        for candidate in candidates:
+            key = normcase(abspath(candidate))
+
+            if not is_processed_path(candidate) and key not in seen:
+                seen.add(key)
+                paths.append(candidate)
+
+    return paths
+
+# Process many files on a pool of worker processes.
+# Largest files are scheduled first, so a huge export doesn't end up as the last (and only) running job.
+# A failure of one file doesn't affect the others - it's reported in its BatchResult.
+def process_files(paths: list[str], workers: int = None, **options) -> list[BatchResult]:
+    results = {path: BatchResult(path, 'failed', error='Not processed') for path in paths}
+
+    missing = [path for path in paths if not isfile(path)]
+    for path in missing:
+        results[path].error = 'File not found'
+
+    scheduled = sorted([path for path in paths if path not in missing], key=getsize, reverse=True)
+
+    with create_pool(workers) as pool:
+        futures = {pool.submit(process_file_safely, path, options): path for path in scheduled}
+
+        for future in as_completed(futures):
+            path = futures[future]
+
+            try:
+                results[path] = future.result()
+            except BrokenProcessPool as err:
+                # a worker died (eg. killed by the OS) - every file which didn't finish by then ends up here
+                results[path].error = f'Worker process terminated abruptly: {err}'
+
+    return [results[path] for path in paths]
+
+def create_pool(workers: int = None) -> ProcessPoolExecutor:
+    # worker processes don't share the parent's XML backend selection (eg. under "spawn" start method)
+    return ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1, initializer=set_xml_backend, initargs=(xml_backend.name,))
+
+# runs in a worker process
+def process_file_safely(path: str, options: dict) -> BatchResult:
+    start = perf_counter()
+    result = BatchResult(path)
+
+    try:
+        processed = handle.process_file_result(path, measure_memory=True, **options)
+        result.output_path, result.peak_memory = processed.output_path, processed.peak_memory
+    except (BusinessException, BusinessLogicException) as err:
+        result.status, result.error = 'failed', str(err).strip()
+    except Exception as err:
+        result.status, result.error = 'failed', f'{type(err).__name__}: {err}'.strip()
+
+    result.duration = perf_counter() - start
+
+    return result
+
+def format_result(result: BatchResult) -> str:
+    status = 'OK' if result.ok else 'FAILED'
+    # only the first line of (usually multi line) error
+    details = f'-> {result.output_path}' if result.ok else (result.error.splitlines()[0] if result.error else '')
+    memory = f'  (peak {result.peak_memory / 1024 ** 2:.0f} MB)' if result.peak_memory else ''
+
+    return f'{status:<7} {result.duration:>8.2f}s  {result.path}{memory}\n{"":<18}{details}'
+
+def format_summary(results: list[BatchResult], duration: float) -> str:
+    lines = [format_result(result) for result in results]
+
+    failed = len([result for result in results if not result.ok])
+    lines.append('')
+    lines.append(f'Processed {len(results)} file(s) in {duration:.2f}s: {len(results) - failed} ok, {failed} failed.')
+
+    return '\n'.join(lines)
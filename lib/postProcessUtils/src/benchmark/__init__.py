@@ -0,0 +1,2 @@
+from .generator import GeneratorOptions, generate_3mf
+from .harness import SIZES, run_benchmark, compare_results
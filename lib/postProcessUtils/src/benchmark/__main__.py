@@ -0,0 +1,4 @@
+from .harness import main
+
+if __name__ == "__main__":
+    main()
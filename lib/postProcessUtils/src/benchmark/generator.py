@@ -0,0 +1,142 @@
+import math
+import random
+from uuid import UUID
+from zipfile import ZipFile, ZIP_DEFLATED
+
+from ..common.consts import model_file_path
+from ..utils.xml_utils import ns
+
+__all__ = [
+    'GeneratorOptions',
+    'generate_3mf',
+]
+
+CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml" />'
+    '<Default Extension="model" ContentType="application/vnd.ms-package.3dmanufacturing-3dmodel+xml" />'
+    '<Default Extension="png" ContentType="image/png" />'
+    '</Types>'
+)
+
+RELS = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Target="/3D/3dmodel.model" Id="rel0" Type="http://schemas.microsoft.com/3dmanufacturing/2013/01/3dmodel" />'
+    '</Relationships>'
+)
+
+class GeneratorOptions:
+    def __init__(self, components: int = 3, sub_types: tuple[str] = ('MOD', 'NEG'), triangles: int = 1000, colors: int = 4, seed: int = 1):
+        # amount of "$Comp{n}" components, each with a MAIN object
+        self.components = components
+        # additional objects of each component - "$Comp{n}__{TYPE}_body"
+        self.sub_types = sub_types
+        # (approximate) triangles per object
+        self.triangles = triangles
+        # distinct colors, objects are spread over them
+        self.colors = colors
+        # same seed gives the same file
+        self.seed = seed
+
+# Synthetic Fusion 360 style 3MF export - one <object> (closed tube mesh) per body, each with its own
+# <m:colorgroup>, named after "$Component__TYPE_name" convention, and placed on the build plate as a separate item.
+#
+# The model is streamed into the archive - files of any size can be generated.
+def generate_3mf(path: str, options: GeneratorOptions = GeneratorOptions()) -> str:
+    rng = random.Random(options.seed)
+    palette = [f'#{rng.randrange(16 ** 6):06X}FF' for _ in range(max(options.colors, 1))]
+
+    with ZipFile(path, 'w', ZIP_DEFLATED) as zip_file:
+        zip_file.writestr('[Content_Types].xml', CONTENT_TYPES)
+        zip_file.writestr('_rels/.rels', RELS)
+        zip_file.writestr('Metadata/thumbnail.png', rng.randbytes(4096))
+
+        with zip_file.open(model_file_path, 'w', force_zip64=True) as target:
+            for chunk in model_chunks(options, rng, palette):
+                target.write(chunk.encode('utf-8'))
+
+    return path
+
+def model_chunks(options: GeneratorOptions, rng: random.Random, palette: list[str]):
+    yield (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<model unit="millimeter" xml:lang="en-US" xmlns="{ns["core"]}" xmlns:m="{ns["material"]}" xmlns:p="{ns["production"]}" requiredextensions="p">\n'
+        ' <metadata name="Application">Fusion</metadata>\n'
+        ' <resources>\n'
+    )
+
+    resource_id = 1
+    items = []
+
+    for component in range(options.components):
+        for object_index, type_name in enumerate(['MAIN', *options.sub_types]):
+            color_group_id = resource_id
+            object_id = resource_id + 1
+            resource_id += 2
+
+            yield (
+                f'  <m:colorgroup id="{color_group_id}">\n'
+                f'   <m:color color="{rng.choice(palette)}" />\n'
+                '  </m:colorgroup>\n'
+                f'  <object id="{object_id}" name="$Comp{component}__{type_name}_body {object_index}" type="model" p:UUID="{uuid(rng)}" pid="{color_group_id}" pindex="0">\n'
+                '   <mesh>\n'
+            )
+            yield from mesh_chunks(options.triangles, rng)
+            yield (
+                '   </mesh>\n'
+                '  </object>\n'
+            )
+
+            items.append(object_id)
+
+    yield f' </resources>\n <build p:UUID="{uuid(rng)}">\n'
+    for object_id in items:
+        yield f'  <item objectid="{object_id}" p:UUID="{uuid(rng)}" transform="1 0 0 0 1 0 0 0 1 0 0 0" />\n'
+    yield ' </build>\n</model>\n'
+
+# closed tube - rings of vertices around z axis, side walls and both caps made of triangles
+def mesh_chunks(triangles: int, rng: random.Random, chunk_size: int = 4096):
+    segments = max(3, int(math.sqrt(triangles / 2)))
+    rings = max(2, (triangles - 2 * (segments - 2)) // (2 * segments) + 1)
+
+    radius = rng.uniform(5, 20)
+    height = rng.uniform(5, 40)
+    x0, y0 = rng.uniform(0, 200), rng.uniform(0, 200)
+
+    yield '    <vertices>\n'
+    lines = []
+    for ring in range(rings):
+        z = height * ring / (rings - 1)
+        for segment in range(segments):
+            angle = 2 * math.pi * segment / segments
+            lines.append(f'     <vertex x="{x0 + radius * math.cos(angle):.6f}" y="{y0 + radius * math.sin(angle):.6f}" z="{z:.6f}" />\n')
+
+            if len(lines) >= chunk_size:
+                yield ''.join(lines)
+                lines = []
+    yield ''.join(lines)
+    yield '    </vertices>\n    <triangles>\n'
+
+    lines = []
+    for ring in range(rings - 1):
+        for segment in range(segments):
+            a = ring * segments + segment
+            b = ring * segments + (segment + 1) % segments
+            lines.append(f'     <triangle v1="{a}" v2="{b}" v3="{b + segments}" />\n')
+            lines.append(f'     <triangle v1="{a}" v2="{b + segments}" v3="{a + segments}" />\n')
+
+            if len(lines) >= chunk_size:
+                yield ''.join(lines)
+                lines = []
+
+    top = (rings - 1) * segments
+    for segment in range(1, segments - 1):
+        lines.append(f'     <triangle v1="0" v2="{segment + 1}" v3="{segment}" />\n')
+        lines.append(f'     <triangle v1="{top}" v2="{top + segment}" v3="{top + segment + 1}" />\n')
+    yield ''.join(lines)
+    yield '    </triangles>\n'
+
+def uuid(rng: random.Random) -> str:
+    return str(UUID(int=rng.getrandbits(128), version=4))
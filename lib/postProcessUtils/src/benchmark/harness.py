@@ -0,0 +1,178 @@
+import sys
+import json
+import shutil
+import argparse
+import platform
+import tempfile
+from os.path import join
+from time import perf_counter
+from contextlib import contextmanager
+
+from ..common.models import ProcessOptions
+from ..builder import build_model_components, create_model_settings
+from ..utils import extract_from_archive, archive_as_3mf, xml_backend
+from .. import handle
+from .generator import GeneratorOptions, generate_3mf
+
+__all__ = [
+    'SIZES',
+    'run_benchmark',
+    'compare_results',
+]
+
+BASELINE_VERSION = 1
+
+# size matrix - components x (MAIN + sub types) objects x triangles per object
+SIZES = {
+    'small': GeneratorOptions(components=3, triangles=500),
+    'medium': GeneratorOptions(components=10, triangles=5000),
+    'large': GeneratorOptions(components=20, triangles=25000),
+}
+
+# whole process_file runs in each mode, timed after stages of the default (catalog) pipeline
+MODES = {
+    'process_file': {},
+    'process_file[stream]': {'stream': True},
+    'process_file[low_memory]': {'low_memory': True},
+}
+
+# regressions smaller than that (seconds) are taken as noise, whatever the threshold
+MIN_DELTA = 0.005
+
+# Best of `repeat` runs (seconds) of every stage and mode, for every size.
+def run_benchmark(sizes: list[str], repeat: int = 3) -> dict:
+    results = {}
+    catalog_path = tempfile.mkdtemp(prefix='post_process_benchmark_')
+
+    try:
+        for size in sizes:
+            path = generate_3mf(join(catalog_path, f'{size}.3mf'), SIZES[size])
+            timings = {}
+
+            for _ in range(repeat):
+                for name, seconds in [*time_stages(path).items(), *time_modes(path).items()]:
+                    timings[name] = min(timings.get(name, seconds), seconds)
+
+            results[size] = timings
+    finally:
+        shutil.rmtree(catalog_path, ignore_errors=True)
+
+    return {
+        'version': BASELINE_VERSION,
+        'environment': environment(),
+        'repeat': repeat,
+        'results': results,
+    }
+
+def time_stages(path: str) -> dict:
+    timings = {}
+
+    @contextmanager
+    def stage(name: str):
+        start = perf_counter()
+        yield
+        timings[name] = perf_counter() - start
+
+    options = ProcessOptions()
+
+    with stage('extract'):
+        catalog_path = extract_from_archive(path)
+
+    try:
+        with stage('build_model_components'):
+            model_dict = build_model_components(catalog_path, options)
+        with stage('create_model_settings'):
+            create_model_settings(catalog_path, model_dict)
+        with stage('archive'):
+            archive_as_3mf(catalog_path)
+    finally:
+        shutil.rmtree(catalog_path, ignore_errors=True)
+
+    return timings
+
+def time_modes(path: str) -> dict:
+    timings = {}
+
+    for name, options in MODES.items():
+        start = perf_counter()
+        handle.process_file(path, **options)
+        timings[name] = perf_counter() - start
+
+    return timings
+
+def environment() -> dict:
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'xml_backend': xml_backend.name,
+    }
+
+# [(size, stage, baseline, current)] of stages slower than baseline by more than threshold (eg. 0.25 - 25%)
+def compare_results(baseline: dict, current: dict, threshold: float) -> list[tuple]:
+    regressions = []
+
+    for size, timings in current['results'].items():
+        for name, seconds in timings.items():
+            expected = baseline['results'].get(size, {}).get(name)
+
+            if expected is not None and seconds > expected * (1 + threshold) and seconds - expected > MIN_DELTA:
+                regressions.append((size, name, expected, seconds))
+
+    return regressions
+
+def format_results(current: dict, baseline: dict = None) -> str:
+    lines = []
+
+    for size, timings in current['results'].items():
+        lines.append(f'{size}:')
+
+        for name, seconds in timings.items():
+            expected = (baseline or {}).get('results', {}).get(size, {}).get(name)
+            change = f'{(seconds / expected - 1) * 100:+7.1f}%' if expected else ''
+
+            lines.append(f'  {name:<28} {seconds:>9.4f}s {change}')
+
+    return '\n'.join(lines)
+
+def load_results(path: str) -> dict:
+    with open(path, 'r', encoding='utf-8') as file:
+        results = json.load(file)
+
+    if results.get('version') != BASELINE_VERSION:
+        raise ValueError(f'Unsupported baseline version in "{path}", expected {BASELINE_VERSION}')
+
+    return results
+
+def save_results(path: str, results: dict):
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(results, file, indent=2)
+        file.write('\n')
+
+# Exit code 1 when any stage regressed past the threshold.
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(description='Benchmark post processing stages on synthetic 3MF files, optionally against a JSON baseline.')
+    parser.add_argument('--sizes', nargs='+', choices=list(SIZES), default=['small', 'medium'], help='Sizes of generated files to run')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs of each size, best one is taken')
+    parser.add_argument('--baseline', type=str, default=None, help='JSON results of a previous run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Allowed slowdown against the baseline, eg. 0.25 for 25%%')
+    parser.add_argument('--save', type=str, default=None, help='Write results as JSON (eg. to be used as a baseline)')
+    args = parser.parse_args(argv)
+
+    baseline = load_results(args.baseline) if args.baseline else None
+    current = run_benchmark(args.sizes, args.repeat)
+
+    print(format_results(current, baseline))
+
+    if args.save:
+        save_results(args.save, current)
+
+    if baseline is None:
+        return
+
+    regressions = compare_results(baseline, current, args.threshold)
+    for size, name, expected, seconds in regressions:
+        print(f'REGRESSION {size} {name}: {expected:.4f}s -> {seconds:.4f}s')
+
+    if regressions:
+        sys.exit(1)
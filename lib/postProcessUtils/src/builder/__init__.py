@@ -1,10 +1,111 @@
 from .model_components import *
 from .slicer_settings import *
+from .model_stream import *
+from ..common.models import ProcessOptions, ModelDict
+import os
+from io import BytesIO
+from os.path import join, dirname, exists
+from zipfile import ZipFile, BadZipFile
+
+from ..common.consts import model_file_path, model_settings_file_path, model_rels_file_path, project_settings_file_path
+from ..common.naming import get_naming_grammar, check_names
+from ..errors import BusinessException
+from ..utils import open_archive_entry, stage
+from ..utils.zip_utils import open_entry_source
+from .model_parts import write_model_rels
+from .model_scan import scan_object_names
+from .filament_mapping import map_filaments
 
 __all__ = [
     'rebuild_files',
+    'rebuild_archive',
+    'rebuilt_entries',
+    'check_archive_names',
 ]
 
-def rebuild_files(catalog_path: str):
-    model_dict = build_model_components(catalog_path)
-    create_model_settings(catalog_path, model_dict)
+# All naming errors of the archive at once (see check_names) - before it's extracted or the model is parsed.
+def check_archive_names(file_path_zip: str, options: ProcessOptions = ProcessOptions()):
+    try:
+        with ZipFile(file_path_zip, 'r') as source_zip, open_entry_source(source_zip, model_file_path) as source:
+            objects = scan_object_names(source)
+    except (BadZipFile, KeyError) as err:
+        raise BusinessException(f'Unable to read "{model_file_path}" from archive "{file_path_zip}".\n\nOriginal message: "{err}"\n')
+
+    check_names(objects, get_naming_grammar(options.naming_pattern), model_file_path)
+
+# archive entries written by rebuild_archive, every other entry is copied over as is.
+def rebuilt_entries(options: ProcessOptions = ProcessOptions()) -> tuple:
+    entries = (model_file_path, model_settings_file_path)
+
+    if options.split_objects:
+        entries += (model_rels_file_path,)
+    if options.map_filaments:
+        entries += (project_settings_file_path,)
+
+    return entries
+
+def rebuild_files(catalog_path: str, options: ProcessOptions = ProcessOptions()):
+    if options.low_memory:
+        with stage('stream_model', bytes_in=join(catalog_path, model_file_path)):
+            model_dict = stream_model_components(catalog_path, options.deterministic, get_naming_grammar(options.naming_pattern))
+    else:
+        model_dict = build_model_components(catalog_path, options)
+
+    if model_dict.parts:
+        with stage('write_model_parts'):
+            create_model_parts(catalog_path, model_dict)
+
+    if options.map_filaments:
+        with stage('map_filaments'):
+            map_filaments(model_dict, options.max_filaments)
+            create_project_settings(catalog_path, model_dict)
+
+    with stage('create_model_settings'):
+        create_model_settings(catalog_path, model_dict)
+
+def create_model_parts(catalog_path: str, model_dict: ModelDict):
+    for path, data in model_dict.parts.items():
+        os.makedirs(dirname(join(catalog_path, path)), exist_ok=True)
+
+        with open(join(catalog_path, path), 'wb') as file:
+            file.write(data)
+
+    rels_path = join(catalog_path, model_rels_file_path)
+    source = rels_path if exists(rels_path) else None
+    os.makedirs(dirname(rels_path), exist_ok=True)
+
+    data = BytesIO()
+    write_model_rels(data, list(model_dict.parts), source)
+
+    with open(rels_path, 'wb') as file:
+        file.write(data.getvalue())
+
+# same as rebuild_files, but reads from and writes to opened zip archives - without a catalog on disk.
+# pool - entries are compressed on, see archive_pool
+def rebuild_archive(source_zip, target_zip, options: ProcessOptions = ProcessOptions(), pool=None):
+    with source_zip.open(model_file_path) as source, open_archive_entry(target_zip, model_file_path, options.deterministic, pool) as target:
+        if options.low_memory:
+            with stage('stream_model', bytes_in=source_zip.getinfo(model_file_path).file_size):
+                model_dict = stream_model(source, target, options.deterministic, get_naming_grammar(options.naming_pattern))
+        else:
+            model_dict = rebuild_model(source, target, options)
+
+    if model_dict.parts:
+        with stage('write_model_parts'):
+            for path, data in model_dict.parts.items():
+                with open_archive_entry(target_zip, path, options.deterministic, pool) as target:
+                    target.write(data)
+
+            source = BytesIO(source_zip.read(model_rels_file_path)) if model_rels_file_path in source_zip.NameToInfo else None
+
+            with open_archive_entry(target_zip, model_rels_file_path, options.deterministic, pool) as target:
+                write_model_rels(target, list(model_dict.parts), source)
+
+    if options.map_filaments:
+        with stage('map_filaments'), open_archive_entry(target_zip, project_settings_file_path, options.deterministic, pool) as target:
+            map_filaments(model_dict, options.max_filaments)
+            write_project_settings(target, model_dict)
+
+    with stage('create_model_settings'):
+        with open_archive_entry(target_zip, model_settings_file_path, options.deterministic, pool) as target:
+            write_model_settings(target, model_dict)
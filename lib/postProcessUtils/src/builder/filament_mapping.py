@@ -0,0 +1,56 @@
+from ..common.models import ModelDict
+from ..common.types import interned
+
+__all__ = [
+    'map_filaments',
+]
+
+# filament slots of a single printer (eg. 4 AMS units, 4 slots each)
+MAX_FILAMENTS = 16
+
+# Assign objects to extruders (filaments) by their color:
+#   - palette (model_dict.filaments) - unique colors, most used first (ties in order of first appearance),
+#   - over max_filaments colors, the remaining ones share the filament of the nearest palette color.
+#
+# The color -> extruder lookup is built once, every object is then assigned in O(1).
+# Extruders are numbered from 1, in palette order - the same order filaments are written into project settings.
+#
+# Returns the color -> extruder lookup.
+def map_filaments(model_dict: ModelDict, max_filaments: int = MAX_FILAMENTS) -> dict[str, int]:
+    usage = {}
+    for obj in model_dict.objects:
+        if obj.color:
+            usage[obj.color] = usage.get(obj.color, 0) + 1
+
+    palette = sorted(usage, key=usage.get, reverse=True)[:max(max_filaments, 1)]
+    extruders = {color: extruder for extruder, color in enumerate(palette, start=1)}
+
+    palette_rgb = [to_rgb(color) for color in palette]
+    for color in usage:
+        if color not in extruders:
+            extruders[color] = nearest_color_index(to_rgb(color), palette_rgb) + 1
+
+    # a single (interned) string per extruder, shared by its objects
+    extruder_ids = {color: interned(str(extruder)) for color, extruder in extruders.items()}
+
+    for obj in model_dict.objects:
+        if obj.color:
+            obj.extruder_color_idx = extruder_ids[obj.color]
+
+    model_dict.filaments = palette
+
+    return extruders
+
+# "#RRGGBB" or "#RRGGBBAA"
+def to_rgb(color: str) -> tuple[int, int, int]:
+    value = color.lstrip('#')
+
+    try:
+        return int(value[0:2], 16), int(value[2:4], 16), int(value[4:6], 16)
+    except ValueError:
+        return 0, 0, 0
+
+def nearest_color_index(rgb: tuple[int, int, int], palette_rgb: list[tuple[int, int, int]]) -> int:
+    distances = [sum((a - b) ** 2 for a, b in zip(rgb, other)) for other in palette_rgb]
+
+    return distances.index(min(distances))
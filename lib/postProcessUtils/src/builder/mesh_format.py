@@ -0,0 +1,57 @@
+from decimal import Decimal
+
+from ..utils.xml_utils import *
+from ..errors import BusinessException
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+__all__ = [
+    'round_coordinates',
+    'compact_meshes',
+]
+
+# Round vertex coordinates to given amount of decimals and/or snap them to a grid (mm, eg. 0.001 - micron).
+# Values are rounded and formatted (shortest representation) by NumPy for a whole mesh at once.
+def round_coordinates(root, decimals: int = None, grid: float = None):
+    if np is None:
+        raise BusinessException('Rounding coordinates requires NumPy - install it (pip install numpy) or run without it.')
+
+    if grid:
+        # no more decimals than the grid itself has
+        grid_decimals = max(0, -Decimal(str(grid)).normalize().as_tuple().exponent)
+        decimals = grid_decimals if decimals is None else min(decimals, grid_decimals)
+
+    for vertices in xml_backend.findall(root, 'core:resources/core:object/core:mesh/core:vertices'):
+        vertex_elements = xml_backend.findall(vertices, 'core:vertex')
+        if not vertex_elements:
+            continue
+
+        coordinates = np.array([vertex.get(axis) for vertex in vertex_elements for axis in 'xyz'], dtype=np.float64)
+
+        if grid:
+            coordinates = np.round(coordinates / grid) * grid
+        if decimals is not None:
+            coordinates = np.round(coordinates, decimals)
+
+        # adding zero turns "-0.0" into "0.0"
+        values = (coordinates + 0.0).astype(str).reshape(-1, 3).tolist()
+
+        for vertex, (x, y, z) in zip(vertex_elements, values):
+            vertex.set('x', x)
+            vertex.set('y', y)
+            vertex.set('z', z)
+
+# Drop indentation inside <mesh> elements - it's a large part of the file (every vertex and triangle is on its own line).
+def compact_meshes(root):
+    for mesh in xml_backend.findall(root, 'core:resources/core:object/core:mesh'):
+        mesh.text = None
+
+        for block in mesh:
+            block.text = None
+            block.tail = None
+
+            for element in block:
+                element.tail = None
@@ -0,0 +1,97 @@
+import hashlib
+
+from ..utils.xml_utils import *
+from ..common.models import ModelDict
+
+__all__ = [
+    'instance_meshes',
+]
+
+# max. difference of vertex coordinates of the same meshes (mm) - exported coordinates are rounded independently
+TOLERANCE = 1e-4
+
+# Fusion exports every occurrence of a repeated body (fasteners, patterns...) as a separate <object> with a full <mesh>,
+# already placed - so copies differ from each other only by translation.
+#
+# Objects with the same mesh (relative to its first vertex), type and color are reduced to a single mesh <object>.
+# Components of the removed ones refer to the kept one instead, moved into place with a "transform".
+#
+# A mesh is shared only between different components - within a single component every part
+# must have its own object, parts are matched with ./Metadata/model_settings.config by object id.
+#
+# Returns number of removed objects.
+def instance_meshes(model_dict: ModelDict, root) -> int:
+    resources = xml_backend.find(root, 'core:resources')
+    objects = model_dict.objects_by_id()
+
+    candidates = {}
+    for object_element in xml_backend.findall(resources, 'core:object'):
+        obj = objects.get(object_element.get('id'))
+        mesh = xml_backend.find(object_element, 'core:mesh')
+
+        if obj is not None and mesh is not None:
+            candidates.setdefault(mesh_outline(object_element, mesh, obj), []).append((object_element, mesh, obj))
+
+    removed = 0
+
+    # only outlines shared by more objects are worth comparing vertex by vertex
+    for group in [group for group in candidates.values() if len(group) > 1]:
+        # [(kept object, its origin, relative vertices, names of components using it)]
+        instances = []
+
+        for object_element, mesh, obj in group:
+            origin, vertices = relative_vertices(mesh)
+            shared = next((
+                instance for instance in instances
+                if obj.component_name not in instance[3] and is_same_shape(instance[2], vertices)
+            ), None)
+
+            if shared is None:
+                instances.append((obj, origin, vertices, {obj.component_name}))
+                continue
+
+            kept_obj, kept_origin, _, component_names = shared
+            component_names.add(obj.component_name)
+
+            obj.id = kept_obj.id
+            obj.transform = translation(*(position - kept_position for position, kept_position in zip(origin, kept_origin)))
+
+            resources.remove(object_element)
+            removed += 1
+
+    return removed
+
+# objects with a different outline can't have the same mesh - type, color, amount of vertices and the triangles
+def mesh_outline(object_element, mesh, obj) -> tuple:
+    digest = hashlib.sha1()
+    for triangle in xml_backend.findall(mesh, 'core:triangles/core:triangle'):
+        digest.update(str(sorted(triangle.attrib.items())).encode('utf-8'))
+
+    return (
+        object_element.get('type'),
+        obj.color,
+        len(xml_backend.findall(mesh, 'core:vertices/core:vertex')),
+        digest.hexdigest(),
+    )
+
+# position of the first vertex and flat list of all coordinates relative to it
+def relative_vertices(mesh) -> tuple[tuple, list[float]]:
+    vertices = xml_backend.findall(mesh, 'core:vertices/core:vertex')
+    if not vertices:
+        return (0.0, 0.0, 0.0), []
+
+    origin = tuple(float(vertices[0].get(axis)) for axis in 'xyz')
+
+    return origin, [float(vertex.get(axis)) - offset for vertex in vertices for axis, offset in zip('xyz', origin)]
+
+def is_same_shape(vertices: list[float], other_vertices: list[float]) -> bool:
+    return all(abs(a - b) <= TOLERANCE for a, b in zip(vertices, other_vertices))
+
+# 3MF transform - 3x3 rotation (here identity) followed by translation
+def translation(x: float, y: float, z: float) -> str:
+    return ' '.join(['1', '0', '0', '0', '1', '0', '0', '0', '1', *(format_number(value) for value in [x, y, z])])
+
+def format_number(value: float) -> str:
+    text = f'{value:.6f}'.rstrip('0').rstrip('.')
+
+    return '0' if text in ['', '-0'] else text
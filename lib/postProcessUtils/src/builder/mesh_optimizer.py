@@ -0,0 +1,110 @@
+from itertools import chain
+
+from ..utils.xml_utils import *
+from ..errors import BusinessException
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+__all__ = [
+    'optimize_meshes',
+]
+
+# vertices closer than that (mm) are welded into one
+WELD_TOLERANCE = 1e-4
+
+# Mesh clean up, vectorized with NumPy (optional dependency):
+#   - coincident vertices are welded (coordinates quantized to the tolerance grid, deduplicated with np.unique),
+#   - degenerate triangles (repeated vertex or zero area) are dropped,
+#   - duplicate triangles (same vertices, same winding) are dropped,
+#   - vertices no longer used by any triangle are dropped.
+# A mesh with nothing but degenerate triangles is kept as it is - an empty mesh isn't a valid 3MF object.
+#
+# Kept <vertex> and <triangle> elements are reused as they are (in the original order), only the triangles get new indices -
+# so coordinates aren't formatted again and triangle properties (pid, p1...) are preserved.
+#
+# Returns number of removed vertices and triangles.
+def optimize_meshes(root, tolerance: float = WELD_TOLERANCE) -> tuple[int, int]:
+    if np is None:
+        raise BusinessException('Mesh optimization requires NumPy - install it (pip install numpy) or run without it.')
+
+    removed_vertices = 0
+    removed_triangles = 0
+
+    for mesh in xml_backend.findall(root, 'core:resources/core:object/core:mesh'):
+        vertices, triangles = optimize_mesh(mesh, tolerance)
+
+        removed_vertices += vertices
+        removed_triangles += triangles
+
+    return removed_vertices, removed_triangles
+
+def optimize_mesh(mesh, tolerance: float) -> tuple[int, int]:
+    vertices_element = xml_backend.find(mesh, 'core:vertices')
+    triangles_element = xml_backend.find(mesh, 'core:triangles')
+    if vertices_element is None or triangles_element is None:
+        return 0, 0
+
+    vertex_elements = xml_backend.findall(vertices_element, 'core:vertex')
+    triangle_elements = xml_backend.findall(triangles_element, 'core:triangle')
+    if not vertex_elements or not triangle_elements:
+        return 0, 0
+
+    # attribute values are parsed by NumPy straight into preallocated arrays, without intermediate lists
+    coordinates = np.fromiter(chain.from_iterable((vertex.get('x'), vertex.get('y'), vertex.get('z')) for vertex in vertex_elements), dtype=np.float64, count=3 * len(vertex_elements)).reshape(-1, 3)
+    indices = np.fromiter(chain.from_iterable((triangle.get('v1'), triangle.get('v2'), triangle.get('v3')) for triangle in triangle_elements), dtype=np.int64, count=3 * len(triangle_elements)).reshape(-1, 3)
+
+    kept_vertices, kept_triangles, new_indices = weld(coordinates, indices, tolerance)
+
+    if not kept_triangles or (len(kept_vertices) == len(vertex_elements) and len(kept_triangles) == len(triangle_elements)):
+        return 0, 0
+
+    replace_children(vertices_element, vertex_elements, [vertex_elements[index] for index in kept_vertices])
+    replace_children(triangles_element, triangle_elements, [triangle_elements[index] for index in kept_triangles])
+
+    for triangle, (v1, v2, v3) in zip(triangles_element, new_indices.astype(str).tolist()):
+        triangle.set('v1', v1)
+        triangle.set('v2', v2)
+        triangle.set('v3', v3)
+
+    return len(vertex_elements) - len(kept_vertices), len(triangle_elements) - len(kept_triangles)
+
+# Returns indexes of kept vertices, indexes of kept triangles and vertex indices of kept triangles (in kept vertices).
+def weld(coordinates, indices, tolerance: float):
+    # the first of welded vertices represents all of them
+    grid = np.round(coordinates / tolerance).astype(np.int64)
+    _, first, inverse = np.unique(grid, axis=0, return_index=True, return_inverse=True)
+    triangles = first[inverse.reshape(-1)][indices]
+
+    a, b, c = coordinates[triangles[:, 0]], coordinates[triangles[:, 1]], coordinates[triangles[:, 2]]
+    doubled_area = np.linalg.norm(np.cross(b - a, c - a), axis=1)
+
+    is_valid = (triangles[:, 0] != triangles[:, 1]) & (triangles[:, 1] != triangles[:, 2]) & (triangles[:, 0] != triangles[:, 2])
+    is_valid &= doubled_area > tolerance * tolerance
+
+    # same triangle starting from a different vertex - rotated to start from the lowest index (winding kept)
+    valid = np.flatnonzero(is_valid)
+    shift = np.argmin(triangles[valid], axis=1)
+    rotated = np.take_along_axis(triangles[valid], (shift[:, None] + np.arange(3)) % 3, axis=1)
+    _, first_triangles = np.unique(rotated, axis=0, return_index=True)
+    kept_triangles = valid[np.sort(first_triangles)]
+
+    kept_vertices = np.unique(triangles[kept_triangles])
+    remap = np.full(len(coordinates), -1, dtype=np.int64)
+    remap[kept_vertices] = np.arange(len(kept_vertices))
+
+    return kept_vertices.tolist(), kept_triangles.tolist(), remap[triangles[kept_triangles]]
+
+# keeps indentation - tails of inner and last children are taken from the original ones
+def replace_children(parent, children: list, kept: list):
+    inner_tail = children[0].tail
+    last_tail = children[-1].tail
+
+    for child in kept:
+        child.tail = inner_tail
+    if kept:
+        kept[-1].tail = last_tail
+
+    parent[:] = kept
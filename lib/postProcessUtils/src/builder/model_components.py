@@ -1,27 +1,62 @@
 from os.path import join
-from uuid import uuid4
-from itertools import chain
 
 from ..utils.xml_utils import *
-from ..common.models import ModelDict
-from ..common.types import ObjectContext
+from ..utils.profiling import stage
+from ..common.consts import model_file_path
+from ..common.models import ModelDict, ProcessOptions
+from ..common.types import ObjectContext, ObjectModel, WrappingComponent, ComponentObjectsGroup, interned
+from ..common.naming import NamingGrammar, get_naming_grammar
 from ..errors import BusinessException
+from .mesh_instances import instance_meshes
+from .mesh_optimizer import optimize_meshes
+from .mesh_format import round_coordinates, compact_meshes
+from .model_parts import split_model
 
 __all__ = [
     'build_model_components',
+    'rebuild_model',
 ]
 
-def build_model_components(catalog_path: str) -> ModelDict:
-    src_path = join(catalog_path, "3D/3dmodel.model")
-    tree = ET.parse(src_path)
-    root = tree.getroot()
-    model_dict: ModelDict = ModelDict()
+def build_model_components(catalog_path: str, options: ProcessOptions = ProcessOptions()) -> ModelDict:
+    src_path = join(catalog_path, model_file_path)
 
-    process_3d_model(model_dict, root)
-    create_components_groups(model_dict)
-    build_components(model_dict, root)
+    return rebuild_model(src_path, src_path, options)
 
-    tree.write(src_path, xml_declaration=True, encoding='UTF-8')
+# source and target are either file paths or binary file objects (eg. archive members)
+# model parts (options.split_objects) are not written, only serialized into model_dict.parts
+#
+# Names are validated once, up front by check_archive_names (process_file does it before extraction) - not here again.
+def rebuild_model(source, target, options: ProcessOptions = ProcessOptions()) -> ModelDict:
+    with stage('parse', bytes_in=source):
+        tree = xml_backend.parse(source)
+    root = tree.getroot()
+    model_dict: ModelDict = ModelDict(options.deterministic, get_naming_grammar(options.naming_pattern))
+
+    with stage('process_3d_model'):
+        process_3d_model(model_dict, root)
+        create_components_groups(model_dict)
+    if options.optimize_meshes:
+        with stage('optimize_meshes'):
+            optimize_meshes(root, options.weld_tolerance)
+    if options.coordinate_decimals is not None or options.coordinate_grid:
+        with stage('round_coordinates'):
+            round_coordinates(root, options.coordinate_decimals, options.coordinate_grid)
+    if options.compact_meshes:
+        with stage('compact_meshes'):
+            compact_meshes(root)
+    if options.mesh_instancing:
+        with stage('instance_meshes'):
+            instance_meshes(model_dict, root)
+    if options.split_objects:
+        with stage('split_model') as current:
+            model_dict.parts = split_model(root, [component_objects(group) for group in model_dict.components.values()])
+            current.bytes_out = sum(len(data) for data in model_dict.parts.values())
+    with stage('build_components'):
+        build_components(model_dict, root)
+
+    with stage('write') as current:
+        xml_backend.write(tree, target)
+        current.bytes_out = target
 
     return model_dict
 
@@ -29,87 +64,60 @@ def build_model_components(catalog_path: str) -> ModelDict:
 def process_3d_model(model_dict: ModelDict, root):
     extract_color_info(root, model_dict)
 
-    for object_element in root.findall('.//core:object', ns):
-        object_name = str(object_element.get('name'))
-        object_context = get_context_from_name(object_name)
+    for object_element in xml_backend.findall(root, './/core:object'):
+        process_object(model_dict, object_element)
 
-        extract_object_info(object_element, object_context, model_dict)
+# object_element - anything with ET.Element like get/set/attrib (eg. only the parsed <object> tag)
+def process_object(model_dict: ModelDict, object_element):
+    object_name = str(object_element.get('name'))
+    object_context = get_context_from_name(object_name, model_dict.naming)
 
-        apply_basic_modifications(object_element, object_context)
+    extract_object_info(object_element, object_context, model_dict)
+
+    apply_basic_modifications(object_element, object_context)
 
 def extract_color_info(root, model_dict: ModelDict):
     # In 3MF file exported from Fusion360 (in ./3D/3dmodel.model),
     # multiple objects with the same appearance will have their colors
     # show up multiple times as separate <colorgroup> linked to specific <object>
     #
-    # The uniq_colors are needed to create extruder_color_idx
+    # The uniq_colors are needed to create extruder_color_idx (see map_filaments)
     #
     # When Fusion360 body has a single appearance attached, the <colorgroup> for that object will hold only a single element.
-    for color_group in root.findall('.//material:colorgroup', ns):
+    for color_group in xml_backend.findall(root, './/material:colorgroup'):
         # <object pid="n">
         # <colorgroup id="n">
         # where "n" is the group_id
         group_id = color_group.get('id')
         model_dict.colors[group_id] = []
 
-        for color in color_group.findall('material:color', ns):
-            color_hex = color.get('color')
+        for color in xml_backend.findall(color_group, 'material:color'):
+            add_color(model_dict, group_id, color.get('color'))
+
+def add_color(model_dict: ModelDict, group_id: str, color_hex: str):
+    # <object pindex="n"> where "n" will match the order in which color values show up in each <colorgroup>
+    # eg. model_dict.colors[group_id][pindex] = color_hex
+    color_hex = interned(color_hex)
 
-            # <object pindex="n"> where "n" will match the order in which color values show up in each <colorgroup>
-            # eg. model_dict.colors[group_id][pindex] = color_hex
-            model_dict.colors[group_id].append(color_hex)
-            model_dict.uniq_colors.add(color_hex)
+    model_dict.colors.setdefault(group_id, []).append(color_hex)
+    model_dict.uniq_colors.add(color_hex)
 
 def extract_object_info(object_element, object_context: ObjectContext, model_dict: ModelDict):
     # <object id="1" name="ModelName" type="model" p:UUID="efe0e7c7-8a1e-4151-8da4-67c23539341b" pid="2" pindex="1">
     object_id = str(object_element.get('id'))
-    # puuid = str(object_element.get('{http://schemas.microsoft.com/3dmanufacturing/production/2015/06}UUID'))
-    puuid = str(object_element.get('p:UUID'))
+    puuid = str(object_element.get(ns_name('production', 'UUID')))
     pid = str(object_element.get('pid'))
     pindex = object_element.get('pindex')
-    name = str(object_element.get('name'))
     object_color = model_dict.colors[pid][int(pindex)]
 
-    model_dict.objects.append({
-        'id': object_id,
-        'name': name,
-        'puuid': puuid,
-        'pid': pid,
-        'pindex': pindex,
-        'color': object_color,
-        # numeric id (starting from 1)
-        # 'extruder_color_idx': str(model_dict.uniq_colors_ref().index(object_color) + 1),
-        # NOTE: since BambuStudio v2.5.0.66 - too high idx causes unknown exception.
-        # since color mapping isn't fully integrated, as quick fix just set a single extruder.
-        'extruder_color_idx': '0',
-        'component_name': object_context['component_name'],
-        'type': object_context['type'],
-        'name': object_context['name'],
-    })
-
-def get_context_from_name(name: str) -> ObjectContext:
-    tokens = name.split('_')
-
-    # allow exporting bodies with generic names as is.
-    if len(tokens) < 3:
-        return {
-            "component_name": name,
-            "type": 'MAIN',
-            "name": name
-        }
-
-    try:
-        parent_name = tokens[0].lstrip('$')
-        object_type = tokens[2]
-        object_name = ' '.join(tokens[3:])
-
-        return {
-            "component_name": parent_name,
-            "type": object_type,
-            "name": object_name
-        }
-    except Exception as err:
-        raise BusinessException(f'Unable to parse object name into context: "{name}"\n\nOriginal message: "{err}"\n')
+    # numeric extruder id (starting from 1) is assigned by map_filaments together with matching project settings.
+    # NOTE: since BambuStudio v2.5.0.66 - idx without a matching filament causes unknown exception.
+    # so without filament mapping just set a single extruder.
+    model_dict.objects.append(ObjectModel(object_id, puuid, pid, pindex, object_color, object_context, extruder_color_idx='0'))
+
+# parsed once per distinct name, see NamingGrammar
+def get_context_from_name(name: str, naming: NamingGrammar = None) -> ObjectContext:
+    return (naming or get_naming_grammar()).parse(name)
 
 def apply_basic_modifications(object_element, object_context: ObjectContext):
     # remove attributes slicer usually removes on file save
@@ -117,7 +125,7 @@ def apply_basic_modifications(object_element, object_context: ObjectContext):
     object_element.attrib.pop('pid', None)
     object_element.attrib.pop('pindex', None)
 
-    if object_context['type'] != 'MAIN':
+    if object_context.type != 'MAIN':
         # all sub types are denoted as "other"
         # the specific info on model parts sub types are stored in ./Metadata/model_settings.config
         object_element.set('type', 'other')
@@ -125,99 +133,97 @@ def apply_basic_modifications(object_element, object_context: ObjectContext):
 """
 # example:
 model_dict.components = {
-    '$CompA': {
-        'main': ObjectModel,
-        'sub_types': {
+    '$CompA': ComponentObjectsGroup(
+        main=ObjectModel,
+        sub_types={
             'MOD': [ ObjectModel, ObjectModel, ... ],
             'NEG': [ ... ],
             'PART': [ ... ],
             ...
         },
-    },.
-    '$CompB': { ... },
+        wrapping_component=WrappingComponent,
+    ),
+    '$CompB': ComponentObjectsGroup( ... ),
 }
 """
 def create_components_groups(model_dict: ModelDict):
     components = model_dict.components
 
     for obj in model_dict.objects:
-        type_name = obj['type']
-        component_name = obj['component_name']
+        component_name = obj.component_name
 
         if component_name not in components:
-            components[component_name] = {
-                'main': {},
-                'sub_types': {},
-                'wrapping_component': {
-                    'id': str(uuid4()),
-                    'type': 'model',
-                    'namespace': component_name,
-                    'name': obj['name'],
-                }
-            }
-
-        component_objects_group = components[component_name]
-
-        if type_name == 'MAIN':
-            component_objects_group['main'] = obj
+            components[component_name] = ComponentObjectsGroup(WrappingComponent(model_dict.new_uuid(component_name), component_name, obj.name))
 
-        else:
-            if type_name not in component_objects_group['sub_types']:
-                component_objects_group['sub_types'][type_name] = []
-
-            component_objects_group['sub_types'][type_name].append(obj)
+        components[component_name].add(obj)
 
     for component_name, component_objects_group in components.items():
-        if not bool(component_objects_group['main']):
+        if component_objects_group.main is None:
           raise BusinessException(f'Missing MAIN object for component_objects_group {component_name} - did you forget to name one body "${component_name}__MAIN_(...)"?')
 
 # Now we create a new (virtual) object with <components> list where each <component> refers to one <object>
 # Then this one (virtal) object will be placed under <build> as printable <item>
 #
-# This basically replicates what saving 3MF file in slicer does to its internal structure.
-# With some simplifications, like applying all above changes in the same 3dmodel.model file,
-# rather than creating new set of separate files:
-#   - "./3D/Objects/object_{n}.model" (.model per each object)
-#   - "./3D/rels/3dmodel.model.rels" (.rels to atttach 3dmodel schema relantionship to those objects)
+# This basically replicates what saving 3MF file in slicer does to its internal structure, in one of two layouts:
+#   - by default all above changes are applied in the same 3dmodel.model file - meshes stay in place,
+#     components refer to the objects next to them,
+#   - with options.split_objects (see split_model) meshes are already moved into a separate set of files by now:
+#       - "./3D/Objects/object_{n}.model" (.model with objects of n-th component)
+#       - "./3D/_rels/3dmodel.model.rels" (.rels to attach 3dmodel schema relationship to those objects)
+#     components refer to them by "p:path", 3dmodel.model keeps only the wrapping objects.
 def build_components(model_dict: ModelDict, root):
-    resources = root.find('core:resources', ns)
-    build = root.find('core:build', ns)
+    resources = xml_backend.find(root, 'core:resources')
+    build = xml_backend.find(root, 'core:build')
 
     # clear the <build> from original object items
-    for item in build.findall('core:item', ns):
+    for item in xml_backend.findall(build, 'core:item'):
         build.remove(item)
 
-    for component_name, component_objects_group in model_dict.components.items():
-        id = component_objects_group['wrapping_component']['id']
-        main_object = component_objects_group['main']
-
-        obj = ET.SubElement(resources, 'object', {
-            'id': id,
-            'p:UUID': str(uuid4()),
-            'type': 'model',
-        })
-
-        components = ET.SubElement(obj, 'components')
-
-        # add main object as component
-        ET.SubElement(components, 'component', {
-            'objectid': main_object['id'],
-            'p:UUID': str(uuid4()),
-            # 'transform': '1 0 0 0 1 0 0 0 1 0 0 0'
-        })
-
-        # add all sub types object as components
-        for sub_object in list(chain.from_iterable(component_objects_group['sub_types'].values())):
-            ET.SubElement(components, 'component', {
-                'objectid': sub_object['id'],
-                'p:UUID': str(uuid4()),
-                # 'transform': '1 0 0 0 1 0 0 0 1 0 0 0'
-            })
+    for _component_name, component_objects_group in model_dict.components.items():
+        obj = ET.SubElement(resources, ns_name('core', 'object'), wrapping_object_attributes(model_dict, component_objects_group))
+        components = ET.SubElement(obj, ns_name('core', 'components'))
+
+        # add main object and all sub types objects as components
+        for component_object in component_objects(component_objects_group):
+            ET.SubElement(components, ns_name('core', 'component'), component_attributes(model_dict, component_object))
 
         # make newly created components object a build item
-        ET.SubElement(build, 'item', {
-            'objectid': id,
-            'p:UUID': str(uuid4()),
-            'printable': '1',
-            # 'transform': '1 0 0 0 1 0 0 0 1 0 0 0'
-        })
+        ET.SubElement(build, ns_name('core', 'item'), build_item_attributes(model_dict, component_objects_group))
+
+def component_objects(component_objects_group: ComponentObjectsGroup) -> list[ObjectModel]:
+    return component_objects_group.objects()
+
+def wrapping_object_attributes(model_dict: ModelDict, component_objects_group: ComponentObjectsGroup) -> dict:
+    wrapping_component = component_objects_group.wrapping_component
+
+    return {
+        'id': wrapping_component.id,
+        ns_name('production', 'UUID'): model_dict.new_uuid(wrapping_component.namespace, 'object'),
+        'type': 'model',
+    }
+
+def component_attributes(model_dict: ModelDict, component_object: ObjectModel) -> dict:
+    attributes = {
+        'objectid': component_object.id,
+        ns_name('production', 'UUID'): model_dict.new_uuid(component_object.component_name, 'component', component_object.id),
+        # 'transform': '1 0 0 0 1 0 0 0 1 0 0 0'
+    }
+
+    if component_object.path is not None:
+        attributes[ns_name('production', 'path')] = component_object.path
+
+    # shared mesh moved into place of the original object
+    if component_object.transform is not None:
+        attributes['transform'] = component_object.transform
+
+    return attributes
+
+def build_item_attributes(model_dict: ModelDict, component_objects_group: ComponentObjectsGroup) -> dict:
+    wrapping_component = component_objects_group.wrapping_component
+
+    return {
+        'objectid': wrapping_component.id,
+        ns_name('production', 'UUID'): model_dict.new_uuid(wrapping_component.namespace, 'item'),
+        'printable': '1',
+        # 'transform': '1 0 0 0 1 0 0 0 1 0 0 0'
+    }
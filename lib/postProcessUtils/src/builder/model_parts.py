@@ -0,0 +1,126 @@
+from io import BytesIO
+from copy import deepcopy
+from xml.sax.saxutils import quoteattr
+
+from ..utils.xml_utils import *
+from ..utils.xml_utils import prefixes
+from ..common.consts import object_model_file_path
+from ..common.types import ObjectModel
+
+__all__ = [
+    'split_model',
+    'write_model_rels',
+]
+
+RELATIONSHIPS_NAMESPACE = 'http://schemas.openxmlformats.org/package/2006/relationships'
+MODEL_RELATIONSHIP_TYPE = 'http://schemas.microsoft.com/3dmanufacturing/2013/01/3dmodel'
+
+# Same layout as a project saved by the slicer:
+#   - "./3D/Objects/object_{n}.model" - meshes of all objects of n-th component,
+#   - "./3D/3dmodel.model" - only wrapping objects, their components refer to the meshes by "p:path".
+#
+# Mesh <object>s are moved from the root model into the parts, together with resources (eg. color groups) their triangles use.
+# components_objects - objects of each component, in order.
+#
+# Returns serialized parts - archive path: content. Serialized one by one, in the calling thread - writing holds the GIL
+# with either XML backend, so threads wouldn't overlap it (compression of the parts, when archived, does run in parallel).
+def split_model(root, components_objects: list[list[ObjectModel]]) -> dict[str, bytes]:
+    resources = xml_backend.find(root, 'core:resources')
+    object_elements = {element.get('id'): element for element in xml_backend.findall(resources, 'core:object')}
+    property_resources = {element.get('id'): element for element in resources if element.tag != ns_name('core', 'object')}
+
+    parts = {}
+    mesh_paths = {}
+
+    for objects in components_objects:
+        path = object_model_file_path.format(len(parts) + 1)
+        moved = []
+
+        for obj in objects:
+            # a shared mesh (see instance_meshes) is moved only once
+            object_element = object_elements.pop(obj.id, None)
+
+            if object_element is not None:
+                resources.remove(object_element)
+                moved.append(object_element)
+                mesh_paths[obj.id] = path
+
+        # component made only of meshes shared from other parts
+        if moved:
+            parts[path] = create_part(root, moved, property_resources)
+
+    for objects in components_objects:
+        for obj in objects:
+            obj.path = f'/{mesh_paths[obj.id]}'
+
+    require_production_extension(root)
+
+    return {path: serialize(tree) for path, tree in parts.items()}
+
+def create_part(root, object_elements: list, property_resources: dict):
+    # Parsed instead of built, so both XML backends write core namespace as the default one.
+    # Other namespaces are declared upfront for lxml to keep them on the root (unused ones are dropped on write).
+    namespaces = ''.join(f' xmlns:{prefix}="{ns[namespace]}"' for namespace, prefix in prefixes.items() if prefix)
+    template = f'<model xmlns="{ns["core"]}"{namespaces} unit={quoteattr(root.get("unit", "millimeter"))} xml:lang="en-US"><resources /><build /></model>'
+    tree = xml_backend.parse(BytesIO(template.encode('utf-8')))
+    part_resources = xml_backend.find(tree.getroot(), 'core:resources')
+
+    # properties have to be defined before objects using them
+    used_ids = []
+    for object_element in object_elements:
+        for triangle in xml_backend.findall(object_element, './/core:triangle[@pid]'):
+            if triangle.get('pid') not in used_ids:
+                used_ids.append(triangle.get('pid'))
+
+    for resource_id in used_ids:
+        if resource_id in property_resources:
+            part_resources.append(deepcopy(property_resources[resource_id]))
+
+    for object_element in object_elements:
+        part_resources.append(object_element)
+
+    return tree
+
+def serialize(tree) -> bytes:
+    buffer = BytesIO()
+    xml_backend.write(tree, buffer)
+
+    return buffer.getvalue()
+
+# "p:path" on components of the root model requires production extension
+def require_production_extension(root):
+    required = (root.get('requiredextensions') or '').split()
+
+    if prefixes['production'] not in required:
+        root.set('requiredextensions', ' '.join([*required, prefixes['production']]))
+
+# "./3D/_rels/3dmodel.model.rels" - relationships of the root model to its parts.
+# source - existing relationships (file path or binary file object) kept along, if any.
+def write_model_rels(target, part_paths: list[str], source=None):
+    relationships = []
+
+    if source is not None:
+        for relationship in xml_backend.parse(source).getroot():
+            relationships.append((relationship.get('Target'), relationship.get('Id'), relationship.get('Type')))
+
+    used_ids = [relationship_id for _, relationship_id, _ in relationships]
+    targets = [relationship_target for relationship_target, _, _ in relationships]
+
+    for index, path in enumerate(part_paths, start=1):
+        if f'/{path}' not in targets:
+            relationship_id = f'rel-{index}'
+            while relationship_id in used_ids:
+                relationship_id = f'{relationship_id}-{index}'
+
+            used_ids.append(relationship_id)
+            relationships.append((f'/{path}', relationship_id, MODEL_RELATIONSHIP_TYPE))
+
+    # written as text - ElementTree has a single (global) default namespace, taken by 3MF core
+    lines = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        f'<Relationships xmlns="{RELATIONSHIPS_NAMESPACE}">',
+        *(f' <Relationship Target={quoteattr(str(relationship_target))} Id={quoteattr(str(relationship_id))} Type={quoteattr(str(relationship_type))}/>' for relationship_target, relationship_id, relationship_type in relationships),
+        '</Relationships>',
+    ]
+
+    target.write('\n'.join(lines).encode('utf-8'))
@@ -0,0 +1,110 @@
+from ..common.consts import model_file_path
+from ..errors import BusinessException
+from .model_stream import ModelStreamRewriter, TagHeader, CHUNK_SIZE
+
+__all__ = [
+    'ModelHeaders',
+    'scan_model_headers',
+    'scan_object_names',
+]
+
+# <object>, <colorgroup> and build <item> headers of 3dmodel.model, see scan_model_headers
+class ModelHeaders:
+    def __init__(self):
+        # <object> headers (id, name, pid, pindex, type...), in document order
+        self.objects: list[TagHeader] = []
+        # <colorgroup> id: colors of its <color>s, in order
+        self.colors: dict[str, list[str]] = {}
+        # <item> headers (objectid, transform...) of <build>, in document order
+        self.items: list[TagHeader] = []
+
+    # [(object id, object name)], see validate_names
+    def object_names(self) -> list[tuple[str, str]]:
+        return [(header.get('id'), header.get('name')) for header in self.objects]
+
+# Headers of <object>s, <colorgroup>s and build <item>s of 3dmodel.model, without building the model.
+# Tags are read the same way ModelStreamRewriter does, mesh content is skipped without parsing it and nothing is written.
+# The whole document is scanned, up to the end of <model> - every end tag has to match its start tag.
+# Memory mapped sources (see open_entry_source) skip mesh bodies in place, without reading them at all.
+#
+# source is a binary file object (eg. archive member).
+def scan_model_headers(source, chunk_size: int = CHUNK_SIZE) -> ModelHeaders:
+    return ModelHeadersScanner(source, chunk_size).run()
+
+# [(object id, object name)] of all <object>s of 3dmodel.model, in document order.
+def scan_object_names(source, chunk_size: int = CHUNK_SIZE) -> list[tuple[str, str]]:
+    return scan_model_headers(source, chunk_size).object_names()
+
+class ModelHeadersScanner(ModelStreamRewriter):
+    def __init__(self, source, chunk_size: int = CHUNK_SIZE):
+        super().__init__(source, None, chunk_size)
+        self.headers = ModelHeaders()
+        # names of elements started, but not ended yet - the root element first
+        self.open_tags: list[str] = []
+        self.model_closed = False
+
+    # stops at the end of the root element
+    def run(self) -> ModelHeaders:
+        while not self.model_closed and self.pass_until(b'<', inclusive=False, emit=False):
+            self.handle_markup()
+
+        if not self.model_closed:
+            raise BusinessException(f'Unable to process {model_file_path} - unexpected end of file, <{self.open_tags[-1] if self.open_tags else "model"}> is not closed.')
+        if not self.resources_closed:
+            raise BusinessException(f'Unable to process {model_file_path} - missing <resources> element.')
+
+        return self.headers
+
+    def handle_start_tag(self, name: str, tag: bytes):
+        if name == self.qname('material', 'colorgroup'):
+            self.color_group_id = TagHeader.parse(tag).get('id')
+            self.headers.colors[self.color_group_id] = []
+
+        elif name == self.qname('material', 'color'):
+            self.headers.colors.setdefault(self.color_group_id, []).append(TagHeader.parse(tag).get('color'))
+
+        elif name == self.qname('core', 'object'):
+            self.headers.objects.append(TagHeader.parse(tag, self.prefixes))
+
+        elif name == self.qname('core', 'item'):
+            self.headers.items.append(TagHeader.parse(tag, self.prefixes))
+
+        elif name == self.qname('core', 'mesh') and not tag.endswith(b'/>'):
+            # mesh content is skipped up to the closing tag, which is taken as matched
+            if not self.skip_until(f'</{name}'.encode('utf-8')):
+                raise BusinessException(f'Unable to process {model_file_path} - unexpected end of file, <{name}> is not closed.')
+            return
+
+        if not tag.endswith(b'/>'):
+            self.open_tags.append(name)
+
+    def handle_end_tag(self, name: str, tag: bytes):
+        expected = self.open_tags.pop() if self.open_tags else None
+        if name != expected:
+            found = f'does not match <{expected}>' if expected else 'has no start tag'
+            raise BusinessException(f'Unable to process {model_file_path} - end tag </{name}> {found}.')
+
+        if name == self.qname('core', 'resources'):
+            self.resources_closed = True
+
+        self.model_closed = not self.open_tags
+
+    # Drop everything up to (including) the marker.
+    # A memory mapped source is searched in place - from the first position not looked at yet.
+    def skip_until(self, marker: bytes) -> bool:
+        if not hasattr(self.source, 'skip_until') or self.buffer.find(marker, self.pos) != -1:
+            return self.pass_until(marker, emit=False)
+
+        # the buffered tail could hold the beginning of the marker
+        self.source.seek(self.source.tell() - (len(self.buffer) - self.pos))
+        self.buffer = b''
+        self.pos = 0
+
+        if self.source.skip_until(marker):
+            return True
+
+        self.eof = True
+        return False
+
+    def write(self, data):
+        pass
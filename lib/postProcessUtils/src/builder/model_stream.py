@@ -0,0 +1,322 @@
+import re
+from os import replace, remove
+from os.path import join, exists
+from html import unescape
+from xml.sax.saxutils import escape
+
+from ..utils.xml_utils import ns, prefixes as default_prefixes
+from ..common.consts import model_file_path
+from ..common.models import ModelDict
+from ..common.naming import NamingGrammar
+from ..errors import BusinessException
+from .model_components import (
+    process_object,
+    add_color,
+    create_components_groups,
+    component_objects,
+    wrapping_object_attributes,
+    component_attributes,
+    build_item_attributes,
+)
+
+__all__ = [
+    'stream_model_components',
+    'stream_model',
+]
+
+CHUNK_SIZE = 1024 * 1024
+
+# complete tag - ">" is allowed inside of quoted attribute values
+TAG_PATTERN = re.compile(rb'<(?:[^>"\']|"[^"]*"|\'[^\']*\')*>')
+TAG_NAME_PATTERN = re.compile(rb'</?([^\s/>]+)')
+ATTRIBUTE_PATTERN = re.compile(rb'([^\s=/>]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+
+ATTRIBUTE_ENTITIES = {
+    '"': '&quot;',
+    '\n': '&#10;',
+    '\r': '&#13;',
+    '\t': '&#09;',
+}
+
+# Same as build_model_components, but rewrites ./3D/3dmodel.model in a single pass.
+def stream_model_components(catalog_path: str, deterministic: bool = False, naming: NamingGrammar = None) -> ModelDict:
+    src_path = join(catalog_path, model_file_path)
+    # streamed model can't be written over the file it's being read from
+    tmp_path = f'{src_path}.tmp'
+
+    try:
+        with open(src_path, 'rb') as source, open(tmp_path, 'wb') as target:
+            model_dict = stream_model(source, target, deterministic, naming)
+    except BaseException as err:
+        if exists(tmp_path):
+            remove(tmp_path)
+        raise err
+
+    replace(tmp_path, src_path)
+
+    return model_dict
+
+# Byte level rewriter of 3dmodel.model.
+#
+# Only tags the post processing cares about are parsed (<colorgroup>, <color>, <object>, <build> and <item>),
+# everything else - most notably <mesh> content with millions of vertices and triangles - is copied as is, chunk by chunk.
+# Memory usage doesn't depend on the mesh size, only on the amount of objects.
+#
+# source and target are binary file objects.
+# Object names are validated as they come - see scan_object_names to validate them before anything is written.
+def stream_model(source, target, deterministic: bool = False, naming: NamingGrammar = None) -> ModelDict:
+    return ModelStreamRewriter(source, target, deterministic=deterministic, naming=naming).run()
+
+class TagHeader:
+    # Just enough of ET.Element interface (get, set, attrib) for process_object.
+    # Attributes are kept under their names as written, "{namespace}name" keys are translated using document's prefixes.
+    def __init__(self, name: str, attrib: dict, is_empty: bool, prefixes: dict = None):
+        self.name = name
+        self.attrib = attrib
+        self.is_empty = is_empty
+        self.prefixes = prefixes or {}
+
+    @staticmethod
+    def parse(tag: bytes, prefixes: dict = None) -> 'TagHeader':
+        name = TAG_NAME_PATTERN.match(tag).group(1).decode('utf-8')
+        attrib = {}
+
+        for match in ATTRIBUTE_PATTERN.finditer(tag, len(name) + 1):
+            value = match.group(2) if match.group(2) is not None else match.group(3)
+            attrib[match.group(1).decode('utf-8')] = unescape(value.decode('utf-8'))
+
+        return TagHeader(name, attrib, tag.endswith(b'/>'), prefixes)
+
+    def get(self, key: str, default=None):
+        return self.attrib.get(to_prefixed_name(key, self.prefixes), default)
+
+    def set(self, key: str, value: str):
+        self.attrib[to_prefixed_name(key, self.prefixes)] = value
+
+    def tobytes(self) -> bytes:
+        return to_tag(self.name, self.attrib, self.is_empty)
+
+# "{namespace}name" -> "prefix:name"; prefixes maps short namespace names (as in ns) to prefixes
+def to_prefixed_name(key: str, prefixes: dict) -> str:
+    if not key.startswith('{'):
+        return key
+
+    uri, name = key[1:].split('}', 1)
+    namespace = next((short for short, ns_uri in ns.items() if ns_uri == uri), None)
+    # attributes without prefix aren't in the default namespace - fall back to the usual prefix
+    prefix = prefixes.get(namespace) or default_prefixes.get(namespace)
+
+    return f'{prefix}:{name}' if prefix else name
+
+def to_tag(name: str, attrib: dict, is_empty: bool = True) -> bytes:
+    attributes = ''.join(f' {key}="{escape(str(value), ATTRIBUTE_ENTITIES)}"' for key, value in attrib.items())
+
+    return f'<{name}{attributes}{" /" if is_empty else ""}>'.encode('utf-8')
+
+class ModelStreamRewriter:
+    def __init__(self, source, target, chunk_size: int = CHUNK_SIZE, deterministic: bool = False, naming: NamingGrammar = None):
+        self.source = source
+        self.target = target
+        self.chunk_size = chunk_size
+
+        self.buffer = b''
+        self.pos = 0
+        self.eof = False
+
+        self.model_dict = ModelDict(deterministic, naming)
+        self.color_group_id = None
+        self.resources_closed = False
+
+        # prefixes used in this document, eg. "" (default namespace) for core, "m" for material
+        self.prefixes = None
+
+    def run(self) -> ModelDict:
+        while self.pass_until(b'<', inclusive=False):
+            self.handle_markup()
+
+        if not self.resources_closed:
+            raise BusinessException(f'Unable to process {model_file_path} - missing <resources> element.')
+
+        return self.model_dict
+
+    ################
+    ## TAGS
+    ################
+
+    def handle_markup(self):
+        self.ensure(9)
+
+        if self.buffer.startswith(b'<!--', self.pos):
+            self.pass_until(b'-->')
+            return
+        if self.buffer.startswith(b'<![CDATA[', self.pos):
+            self.pass_until(b']]>')
+            return
+        if self.buffer.startswith(b'<?', self.pos):
+            self.pass_until(b'?>')
+            return
+
+        tag = self.read_tag()
+        is_end = tag.startswith(b'</')
+        name = TAG_NAME_PATTERN.match(tag).group(1).decode('utf-8')
+
+        if self.prefixes is None:
+            self.prefixes = get_prefixes(TagHeader.parse(tag).attrib)
+
+        if is_end:
+            self.handle_end_tag(name, tag)
+        else:
+            self.handle_start_tag(name, tag)
+
+    def handle_start_tag(self, name: str, tag: bytes):
+        if name == self.qname('material', 'colorgroup'):
+            self.color_group_id = TagHeader.parse(tag).get('id')
+            self.model_dict.colors[self.color_group_id] = []
+
+        elif name == self.qname('material', 'color'):
+            add_color(self.model_dict, self.color_group_id, TagHeader.parse(tag).get('color'))
+
+        elif name == self.qname('core', 'object'):
+            object_header = TagHeader.parse(tag, self.prefixes)
+            process_object(self.model_dict, object_header)
+            tag = object_header.tobytes()
+
+        elif name == self.qname('core', 'mesh') and not tag.endswith(b'/>'):
+            # mesh content is copied without looking into it, up to the closing tag.
+            # the remaining ">" of the closing tag is copied over as regular text.
+            self.write(tag)
+            self.pass_until(f'</{name}'.encode('utf-8'))
+            return
+
+        elif name == self.qname('core', 'build'):
+            self.handle_build(name, tag)
+            return
+
+        self.write(tag)
+
+    def handle_end_tag(self, name: str, tag: bytes):
+        if name == self.qname('core', 'resources'):
+            create_components_groups(self.model_dict)
+
+            for component_objects_group in self.model_dict.components.values():
+                self.write(self.wrapping_object(component_objects_group))
+
+            self.resources_closed = True
+
+        self.write(tag)
+
+    # original build items are dropped, replaced with one item per component
+    def handle_build(self, name: str, tag: bytes):
+        if not self.resources_closed:
+            raise BusinessException(f'Unable to process {model_file_path} - <build> before end of <resources>.')
+
+        is_empty = tag.endswith(b'/>')
+        if is_empty:
+            tag = tag[:-2].rstrip() + b'>'
+        else:
+            self.pass_until(f'</{name}'.encode('utf-8'), emit=False)
+
+        self.write(tag)
+
+        for component_objects_group in self.model_dict.components.values():
+            self.write(to_tag(self.qname('core', 'item'), self.qualify(build_item_attributes(self.model_dict, component_objects_group))))
+
+        # for a regular <build> remaining ">" of the closing tag is copied over as text
+        self.write(f'</{name}{">" if is_empty else ""}'.encode('utf-8'))
+
+    def wrapping_object(self, component_objects_group) -> bytes:
+        object_name = self.qname('core', 'object')
+        components_name = self.qname('core', 'components')
+
+        components = b''.join(
+            to_tag(self.qname('core', 'component'), self.qualify(component_attributes(self.model_dict, component_object)))
+            for component_object in component_objects(component_objects_group)
+        )
+
+        return b''.join([
+            to_tag(object_name, self.qualify(wrapping_object_attributes(self.model_dict, component_objects_group)), False),
+            to_tag(components_name, {}, False),
+            components,
+            f'</{components_name}></{object_name}>'.encode('utf-8'),
+        ])
+
+    # qualified tag name of an element, with prefix used in this document
+    def qname(self, namespace: str, local_name: str) -> str:
+        prefix = self.prefixes.get(namespace, '') if self.prefixes else ''
+
+        return f'{prefix}:{local_name}' if prefix else local_name
+
+    def qualify(self, attrib: dict) -> dict:
+        return {to_prefixed_name(key, self.prefixes or {}): value for key, value in attrib.items()}
+
+    ################
+    ## BUFFER
+    ################
+
+    def fill(self) -> bool:
+        if self.eof:
+            return False
+
+        chunk = self.source.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+
+        return True
+
+    # make sure at least "size" bytes are buffered after pos (unless source ended)
+    def ensure(self, size: int):
+        while len(self.buffer) - self.pos < size and self.fill():
+            pass
+
+    def read_tag(self) -> bytes:
+        while True:
+            match = TAG_PATTERN.match(self.buffer, self.pos)
+            if match:
+                self.pos = match.end()
+                return match.group(0)
+
+            if not self.fill():
+                raise BusinessException(f'Unable to process {model_file_path} - unexpected end of file inside of a tag.')
+
+    # Copy (or drop when emit is False) everything up to the marker.
+    # Returns False when source ended before the marker showed up.
+    def pass_until(self, marker: bytes, inclusive: bool = True, emit: bool = True) -> bool:
+        while True:
+            idx = self.buffer.find(marker, self.pos)
+            if idx != -1:
+                end = idx + len(marker) if inclusive else idx
+                if emit:
+                    self.write(memoryview(self.buffer)[self.pos:end])
+                self.pos = end
+                return True
+
+            # keep the tail, marker could be split between chunks
+            flush_to = max(self.pos, len(self.buffer) - len(marker) + 1)
+            if emit:
+                self.write(memoryview(self.buffer)[self.pos:flush_to])
+            self.pos = flush_to
+
+            if not self.fill():
+                if emit:
+                    self.write(memoryview(self.buffer)[self.pos:])
+                self.pos = len(self.buffer)
+                return False
+
+    def write(self, data):
+        self.target.write(data)
+
+def get_prefixes(root_attrib: dict) -> dict:
+    namespaces = {uri: name for name, uri in ns.items()}
+    prefixes = {}
+
+    for key, value in root_attrib.items():
+        if key == 'xmlns' and value in namespaces:
+            prefixes[namespaces[value]] = ''
+        elif key.startswith('xmlns:') and value in namespaces:
+            prefixes[namespaces[value]] = key[len('xmlns:'):]
+
+    return prefixes
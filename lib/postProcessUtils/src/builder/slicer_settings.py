@@ -3,44 +3,51 @@ from os.path import join
 from itertools import chain
 
 from ..utils.xml_utils import *
-from ..common.consts import shorthand_object_types_to_parts
+from ..common.consts import shorthand_object_types_to_parts, model_settings_file_path, project_settings_file_path
 from ..common.types import ObjectModel
 
 __all__ = [
     'create_model_settings',
+    'write_model_settings',
+    'create_project_settings',
+    'write_project_settings',
 ]
 
 # create XML config file: "./Metadata/model_settings.config"
 def create_model_settings(catalog_path: str, model_dict):
+    with open(join(catalog_path, model_settings_file_path), "wb") as file:
+        write_model_settings(file, model_dict)
+
+# target is a binary file object (eg. file on disk or archive member)
+def write_model_settings(target, model_dict):
     config_root = ET.Element('config')
 
     for _component_name, component_objects_group in model_dict.components.items():
         # there must be at least one "real" config->object.
         # which is the actual object on a plate, and works as group for all other parts
         # (printed 3d models - "normal_part" sub type; and other ephemeral models like "modifier_part" and "negative_part")
-        main_obj = component_objects_group['main']
-        wrapping_component = component_objects_group['wrapping_component']
+        main_obj = component_objects_group.main
+        wrapping_component = component_objects_group.wrapping_component
 
         # config->object
         object_element = ET.SubElement(config_root, 'object', {
-            'id': wrapping_component['id'],
+            'id': wrapping_component.id,
         })
 
         # config->object->metadata
         ET.SubElement(object_element, 'metadata', {
             'key': 'name',
-            'value': f"{wrapping_component['namespace']}_{wrapping_component['name']}"
+            'value': f"{wrapping_component.namespace}_{wrapping_component.name}"
         })
 
         # config->object->part w/ its metadata for the main object
         object_element.append(create_part_config(main_obj))
 
         # config->object->part w/ its metadata for rest of the parts
-        for sub_object in list(chain.from_iterable(component_objects_group['sub_types'].values())):
+        for sub_object in list(chain.from_iterable(component_objects_group.sub_types.values())):
             object_element.append(create_part_config(sub_object))
 
-    with open (join(catalog_path, "Metadata/model_settings.config"), "wb") as file:
-        ET.ElementTree(config_root).write(file, xml_declaration=True, encoding='UTF-8')
+    xml_backend.write(ET.ElementTree(config_root), target)
 
 def type_to_part_name(type_name: str) -> str:
     return shorthand_object_types_to_parts.get(type_name, 'normal_part')
@@ -50,22 +57,22 @@ def type_to_part_name(type_name: str) -> str:
 def create_part_config(model: ObjectModel) -> ET.Element:
     # part element
     part = ET.Element('part', {
-        'id': model['id'],
+        'id': model.id,
         # subtype - eg. modifier_part, negative_part; interpreted accordingly as such by the slicer.
-        'subtype': type_to_part_name(model['type']),
+        'subtype': type_to_part_name(model.type),
     })
 
     # displayed object name
     ET.SubElement(part, 'metadata', {
         'key': 'name',
-        'value': model['name'],
+        'value': model.name,
     })
 
     # set filament color (in Orca/BambuStudio)
-    if (model['color'] != ''):
+    if (model.color != ''):
         ET.SubElement(part, 'metadata', {
             'key': 'extruder',
-            'value': model['extruder_color_idx'],
+            'value': model.extruder_color_idx,
         })
 
     # we can omit rest of the metadata,
@@ -74,20 +81,23 @@ def create_part_config(model: ObjectModel) -> ET.Element:
     return part
 
 # create JSON config file: "./Metadata/project_settings.config"
-def create_project_settings_stub(catalog_path, model_dict):
-    repeat_count = len(model_dict.uniq_colors)
+def create_project_settings(catalog_path: str, model_dict):
+    with open(join(catalog_path, project_settings_file_path), "wb") as file:
+        write_project_settings(file, model_dict)
 
-    # unused stub for the time being.
-    # These settings are usually more specific and include things like filament config, nozzle temperature, bed temperature, fans speed, gcode snippets and more.
-    # As the filament -> part assignment is correctly interpreted by the slicers without this config it's not needed now.
+# Filaments (model_dict.filaments, see map_filaments) in extruder order, so "extruder" of every part points at its color.
+# target is a binary file object (eg. file on disk or archive member)
+def write_project_settings(target, model_dict):
+    repeat_count = len(model_dict.filaments)
 
-    # We can get away with this stub to at least pass Filament color w/ some stub data.
-    # But then we'd have to overwrite these manually by selecting preset from a dropdown.
-    # And the colors weren't always displaying as expected - for example OrcaSlicer loads the correct amount of filament and color; while BambuStudio tends to display previously used ones.
+    # These settings are usually more specific and include things like filament config, nozzle temperature, bed temperature, fans speed, gcode snippets and more.
+    # Generic PLA defaults are repeated for every filament, to be replaced by selecting a preset in the slicer.
+    # (OrcaSlicer loads the correct amount of filament and color; while BambuStudio tends to display previously used ones.)
 
     project_settings_config__json = {
-        # should match uniq_colors order
+        # "#RRGGBB", should match filaments order
         "filament_colour": [
+            color[:7] for color in model_dict.filaments
         ],
 
         ### default
@@ -199,9 +209,4 @@ def create_project_settings_stub(catalog_path, model_dict):
         ] * repeat_count
     }
 
-    # just repeat stub values for every unique color used in 3MF file.
-    for color in model_dict.uniq_colors:
-        project_settings_config__json['filament_colour'].append(color)
-
-    with open(join(catalog_path, "Metadata/project_settings.config"), "w") as file:
-        json.dump(project_settings_config__json, file, indent=4)
+    target.write(json.dumps(project_settings_config__json, indent=4).encode('utf-8'))
@@ -0,0 +1,178 @@
+import os
+import json
+import shutil
+import hashlib
+import argparse
+from time import time
+from os.path import join, exists, expanduser, dirname
+from zipfile import ZipFile, BadZipFile
+
+from .errors import BusinessException
+from .common.consts import model_settings_file_path
+
+__all__ = [
+    'ResultCache',
+]
+
+# bump whenever processing changes in a way that makes previously cached results stale
+CACHE_VERSION = 3
+
+CACHE_DIR_ENV = 'POST_PROCESS_CACHE_DIR'
+CACHE_SIZE_ENV = 'POST_PROCESS_CACHE_SIZE'
+# bytes
+DEFAULT_CACHE_SIZE = 2 * 1024 ** 3
+CHUNK_SIZE = 1024 * 1024
+
+# entries regenerated from scratch, their input content doesn't affect the result
+IGNORED_ENTRIES = [model_settings_file_path]
+
+def default_cache_dir() -> str:
+    base = os.environ.get('LOCALAPPDATA') or os.environ.get('XDG_CACHE_HOME') or join(expanduser('~'), '.cache')
+
+    return os.environ.get(CACHE_DIR_ENV) or join(base, 'post_process_3mf')
+
+def default_cache_size() -> int:
+    return int(os.environ.get(CACHE_SIZE_ENV) or DEFAULT_CACHE_SIZE)
+
+# On disk cache of processed archives, addressed by the hash of input archive content and processing options.
+#
+# Least recently used results are evicted once the cache grows over max_size (bytes),
+# modification time of cached file is its last use.
+class ResultCache:
+    def __init__(self, root: str = None, max_size: int = None):
+        self.root = root or default_cache_dir()
+        self.max_size = default_cache_size() if max_size is None else max_size
+
+    # Every entry (name and uncompressed content) of the input archive, in name order - so
+    # the same design re-exported (different timestamps, entry order or compression) hits the cache.
+    # Content is hashed, not taken from the central directory - CRC32 and size collide too easily to tell designs apart.
+    def key(self, path: str, options: dict) -> str:
+        digest = hashlib.sha256()
+        digest.update(json.dumps({'version': CACHE_VERSION, 'options': options}, sort_keys=True).encode('utf-8'))
+
+        try:
+            with ZipFile(path, 'r') as source_zip:
+                for info in sorted(source_zip.infolist(), key=lambda info: info.filename):
+                    if info.is_dir() or info.filename in IGNORED_ENTRIES:
+                        continue
+
+                    digest.update(f'\0{info.filename}\0{info.file_size}\0'.encode('utf-8'))
+                    with source_zip.open(info) as source:
+                        while chunk := source.read(CHUNK_SIZE):
+                            digest.update(chunk)
+        except BadZipFile as err:
+            raise BusinessException(f'Unable to read archive "{path}".\n\nOriginal message: "{err}"\n')
+
+        return digest.hexdigest()
+
+    def entry_path(self, key: str) -> str:
+        return join(self.root, key[:2], f'{key}.3mf')
+
+    # Put a copy of cached result at output_path, False on a miss.
+    # Copy, not link - output can be modified by the user in place, which would corrupt the cached result.
+    def restore(self, key: str, output_path: str) -> bool:
+        cached_path = self.entry_path(key)
+
+        try:
+            os.utime(cached_path)
+        except FileNotFoundError:
+            return False
+
+        if exists(output_path):
+            os.remove(output_path)
+
+        shutil.copyfile(cached_path, output_path)
+
+        return True
+
+    def store(self, key: str, output_path: str):
+        cached_path = self.entry_path(key)
+        temporary_path = f'{cached_path}.{os.getpid()}.tmp'
+
+        os.makedirs(dirname(cached_path), exist_ok=True)
+
+        # copy, not link - output can be modified by the user in place
+        shutil.copyfile(output_path, temporary_path)
+        os.replace(temporary_path, cached_path)
+
+        self.prune()
+
+    # [(path, size, last use)], least recently used first
+    def entries(self) -> list:
+        entries = []
+
+        if not exists(self.root):
+            return entries
+
+        for sub_catalog in os.scandir(self.root):
+            if not sub_catalog.is_dir():
+                continue
+
+            for entry in os.scandir(sub_catalog.path):
+                if entry.name.endswith('.3mf'):
+                    try:
+                        stat = entry.stat()
+                        entries.append((entry.path, stat.st_size, stat.st_mtime))
+                    except FileNotFoundError:
+                        # evicted meanwhile by another process
+                        pass
+
+        return sorted(entries, key=lambda entry: entry[2])
+
+    # evict least recently used results, until the cache fits in max_size
+    def prune(self, max_size: int = None) -> list:
+        max_size = self.max_size if max_size is None else max_size
+        entries = self.entries()
+        total_size = sum(size for _, size, _ in entries)
+        evicted = []
+
+        for path, size, _ in entries:
+            if total_size <= max_size:
+                break
+
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+            total_size -= size
+            evicted.append(path)
+
+        return evicted
+
+    def clear(self) -> int:
+        return len(self.prune(0))
+
+    def stats(self) -> dict:
+        entries = self.entries()
+
+        return {
+            'root': self.root,
+            'entries': len(entries),
+            'size': sum(size for _, size, _ in entries),
+            'max_size': self.max_size,
+        }
+
+# as cli command
+def main():
+    parser = argparse.ArgumentParser(description='Inspect and prune the cache of processed 3MF files.')
+    parser.add_argument('command', choices=['stats', 'list', 'prune', 'clear'], help='stats - totals, list - entries by last use, prune - evict down to --max-size, clear - remove everything')
+    parser.add_argument('--dir', type=str, default=None, help=f'Cache catalog, by default {default_cache_dir()} (also set by {CACHE_DIR_ENV})')
+    parser.add_argument('--max-size', type=int, default=None, help=f'Cache size limit in bytes, by default {DEFAULT_CACHE_SIZE} (also set by {CACHE_SIZE_ENV})')
+    args = parser.parse_args()
+
+    result_cache = ResultCache(args.dir, args.max_size)
+
+    if args.command == 'stats':
+        for name, value in result_cache.stats().items():
+            print(f'{name:<10} {value}')
+    elif args.command == 'list':
+        for path, size, last_use in result_cache.entries():
+            print(f'{size:>12}  {int(time() - last_use):>8}s ago  {path}')
+    elif args.command == 'prune':
+        print(f'Evicted {len(result_cache.prune())} entries.')
+    elif args.command == 'clear':
+        print(f'Removed {result_cache.clear()} entries.')
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,40 @@
+from uuid import UUID
+
+# archive entries rewritten by the post processing
+model_file_path = '3D/3dmodel.model'
+model_settings_file_path = 'Metadata/model_settings.config'
+model_rels_file_path = '3D/_rels/3dmodel.model.rels'
+# n-th component's meshes, when split into parts
+object_model_file_path = '3D/Objects/object_{}.model'
+project_settings_file_path = 'Metadata/project_settings.config'
+
+# stages process_file is measured by (see utils.profiling.stage), roughly in order they run - any of them can be profiled
+pipeline_stages = [
+    'process_file',
+    'cache_restore',
+    'check_archive_names',
+    'extract',
+    'rebuild_archive',
+    'parse',
+    'stream_model',
+    'process_3d_model',
+    'optimize_meshes',
+    'round_coordinates',
+    'compact_meshes',
+    'instance_meshes',
+    'split_model',
+    'build_components',
+    'write',
+    'write_model_parts',
+    'map_filaments',
+    'create_model_settings',
+    'archive',
+    'cache_store',
+]
+
+# namespace of name derived (uuid5) UUIDs in deterministic mode - never change it, outputs would change with it
+deterministic_uuid_namespace = UUID('3b0c5f5e-6f4b-4c1d-9a57-2f7d6c9e1a30')
+
 shorthand_object_types_to_parts = {
     'MAIN': 'normal_part',
     'MOD': 'modifier_part',
@@ -1,20 +1,116 @@
-from typing import Dict, List, Set, Tuple, Literal, NotRequired, TypedDict
+import sys
+from typing import Dict, List, Set, Optional
+from uuid import uuid4, uuid5
 from .types import *
+from .consts import deterministic_uuid_namespace
+from .naming import NamingGrammar, get_naming_grammar
+
+# options which don't affect the output (memory_budget only through low_memory, which does)
+RUNTIME_OPTIONS = ('cache', 'memory_budget', 'report', 'trace_memory', 'profile_stage', 'profile_output')
+
+# post processing pipeline switches, see process_file
+class ProcessOptions:
+    def __init__(self, stream: bool = False, low_memory: bool = False, cache: bool = False, deterministic: bool = False, mesh_instancing: bool = False, split_objects: bool = False, optimize_meshes: bool = False, weld_tolerance: float = 1e-4, coordinate_decimals: int = None, coordinate_grid: float = None, compact_meshes: bool = False, naming_pattern: str = None, map_filaments: bool = False, max_filaments: int = 16, memory_budget: int = None, report: str = None, trace_memory: bool = False, profile_stage: str = None, profile_output: str = None):
+        # zip to zip processing, without extracting archive into a catalog
+        self.stream = stream
+        # rewrite 3dmodel.model in a single pass, without loading meshes into memory
+        self.low_memory = low_memory
+        # reuse result of a previous run on the same input, see ResultCache
+        self.cache = cache
+        # byte for byte the same output for the same input - stable UUIDs, sorted archive entries, fixed timestamps
+        self.deterministic = deterministic
+        # objects with the same mesh share a single one, see instance_meshes - not available in low_memory mode
+        self.mesh_instancing = mesh_instancing
+        # meshes written into per component model files, see split_model - not available in low_memory mode
+        self.split_objects = split_objects
+        # weld vertices closer than weld_tolerance (mm), drop degenerate and duplicate triangles, see optimize_meshes - requires NumPy, not available in low_memory mode
+        self.optimize_meshes = optimize_meshes
+        self.weld_tolerance = weld_tolerance
+        # round vertex coordinates to decimals and/or snap them to a grid (mm), see round_coordinates - requires NumPy, not available in low_memory mode
+        self.coordinate_decimals = coordinate_decimals
+        self.coordinate_grid = coordinate_grid
+        # mesh sections written without indentation, see compact_meshes - not available in low_memory mode
+        self.compact_meshes = compact_meshes
+        # regular expression object names are parsed with, see NamingGrammar - by default "$Component__TYPE_name"
+        self.naming_pattern = naming_pattern
+        # assign parts to extruders by color (at most max_filaments) and write matching project settings, see map_filaments
+        self.map_filaments = map_filaments
+        self.max_filaments = max_filaments
+        # bytes a file may take to process (on top of what the process already uses) - over it, processing switches to low_memory or the file is refused, see apply_memory_budget
+        self.memory_budget = memory_budget
+        # JSON file (or catalog, for a batch) per stage timings, bytes in and out and peak memory are written to, see collect_report
+        self.report = report
+        # peak memory measured with tracemalloc instead of process peak RSS - more precise, but slows processing down
+        self.trace_memory = trace_memory
+        # stage (eg. "parse", "write") run under cProfile, stats dumped into profile_output or printed when it's not set
+        self.profile_stage = profile_stage
+        self.profile_output = profile_output
+
+    # switches which affect the output
+    def output_options(self) -> dict:
+        return {name: value for name, value in vars(self).items() if name not in RUNTIME_OPTIONS}
+
+    # enabled options which need the whole model loaded - not available in low_memory mode
+    def full_model_options(self) -> list[str]:
+        enabled = {
+            'mesh_instancing': self.mesh_instancing,
+            'split_objects': self.split_objects,
+            'optimize_meshes': self.optimize_meshes,
+            'coordinate_decimals': self.coordinate_decimals is not None,
+            'coordinate_grid': self.coordinate_grid,
+            'compact_meshes': self.compact_meshes,
+        }
+
+        return [name for name, value in enabled.items() if value]
+
+    def is_reported(self) -> bool:
+        return self.report is not None or self.profile_stage is not None
 
 class ModelDict:
-    def __init__(self):
+    def __init__(self, deterministic: bool = False, naming: NamingGrammar = None):
+        self.deterministic = deterministic
+        # parses object names into ObjectContext
+        self.naming = naming or get_naming_grammar()
         self.colors: Dict[str, List[str]] = {}
         self.uniq_colors: Set[str] = set()
         self.objects: List[ObjectModel] = []
         self.components: Dict[str, ComponentObjectsGroup] = {}
+        # serialized model parts (split_objects) - archive path: content
+        self.parts: Dict[str, bytes] = {}
+        # filament colors, extruder n uses filaments[n - 1] (see map_filaments)
+        self.filaments: List[str] = []
+
+    # random UUID, or derived from names when deterministic, eg. new_uuid(component_name, 'item')
+    def new_uuid(self, *names: str) -> str:
+        if not self.deterministic:
+            return str(uuid4())
+
+        return str(uuid5(deterministic_uuid_namespace, '/'.join(names)))
+
+    def objects_by_id(self) -> Dict[str, ObjectModel]:
+        return {obj.id: obj for obj in self.objects}
+
+    # Bytes taken by objects, components and colors - every object (including interned strings) counted once.
+    # Divided by len(objects) it's the memory per object.
+    def memory_size(self) -> int:
+        seen = set()
+        pending = [self.objects, self.components, self.colors, self.uniq_colors, self.filaments]
+        size = 0
 
-        self._uniq_colors_ref: Optional[List[str]] = None
+        while pending:
+            value = pending.pop()
+            if id(value) in seen or value is None:
+                continue
 
-    def uniq_colors_ref(self, reload: bool = False):
-        if reload or not self._uniq_colors_ref:
-            uc = list(self.uniq_colors)
-            uc.sort()
+            seen.add(id(value))
+            size += sys.getsizeof(value)
 
-            self._uniq_colors_ref = uc
+            if isinstance(value, dict):
+                pending.extend(value.keys())
+                pending.extend(value.values())
+            elif isinstance(value, (list, tuple, set)):
+                pending.extend(value)
+            elif hasattr(value, '__slots__'):
+                pending.extend(getattr(value, name, None) for name in value.__slots__)
 
-        return self._uniq_colors_ref
+        return size
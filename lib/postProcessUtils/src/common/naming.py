@@ -0,0 +1,115 @@
+import re
+from functools import lru_cache
+
+from .types import ObjectContext
+from .consts import shorthand_object_types_to_parts, object_types_to_shorthand
+from ..errors import BusinessException
+
+__all__ = [
+    'NamingGrammar',
+    'get_naming_grammar',
+    'validate_names',
+    'check_names',
+]
+
+# "$Component__TYPE_name" - as named by the ContextHelper command, eg. "$CompA__MOD_body 2".
+# Named groups: component, type, name (optional, "_" in it are read as spaces).
+#
+# Same as the original split on "_": the first token is the component, the second one is skipped and the third one
+# is the type, so eg. "a_b_c" is still component "a" of type "c". Names with fewer than 3 tokens are generic.
+DEFAULT_NAMING_PATTERN = r'\$*(?P<component>[^_]*)_[^_]*_(?P<type>[^_]*)(?:_(?P<name>.*))?'
+
+MAIN_TYPE = 'MAIN'
+KNOWN_TYPES = frozenset([*shorthand_object_types_to_parts, *object_types_to_shorthand.values()])
+
+# names parsed by a single grammar, kept across files (eg. by service workers)
+PARSED_NAMES_CACHE_SIZE = 64 * 1024
+
+# errors reported at most, the rest is summarized
+MAX_REPORTED_ERRORS = 20
+
+# Object name -> ObjectContext, compiled once per pattern (see get_naming_grammar).
+#
+# Names not matching the pattern (eg. generic "Body1") are exported as they are - MAIN object of their own component.
+class NamingGrammar:
+    def __init__(self, pattern: str = DEFAULT_NAMING_PATTERN, types: frozenset = KNOWN_TYPES):
+        try:
+            self.pattern = re.compile(pattern, re.DOTALL)
+        except re.error as err:
+            raise BusinessException(f'Invalid naming pattern "{pattern}": {err}')
+        self.types = types
+
+        missing_groups = {'component', 'type'} - set(self.pattern.groupindex)
+        if missing_groups:
+            raise BusinessException(f'Naming pattern "{pattern}" is missing named groups: {", ".join(sorted(missing_groups))}')
+
+        # every distinct name is parsed once
+        self.parse = lru_cache(maxsize=PARSED_NAMES_CACHE_SIZE)(self.parse_name)
+
+    def parse_name(self, name: str) -> ObjectContext:
+        match = self.pattern.fullmatch(name)
+
+        # allow exporting bodies with generic names as is.
+        if match is None:
+            return ObjectContext(name, MAIN_TYPE, name, generic=True)
+
+        object_name = match.groupdict().get('name') or ''
+
+        return ObjectContext(match.group('component'), match.group('type'), object_name.replace('_', ' '))
+
+    # generic names are MAIN objects - only names following the pattern can have an unknown type
+    def is_known_type(self, context: ObjectContext) -> bool:
+        return context.type in self.types
+
+@lru_cache(maxsize=None)
+def get_naming_grammar(pattern: str = None) -> NamingGrammar:
+    return NamingGrammar(pattern or DEFAULT_NAMING_PATTERN)
+
+# Validate names of all objects at once - [(object id, object name)], in document order.
+#   - object ids are unique,
+#   - types are known (see shorthand_object_types_to_parts),
+#   - every component has a MAIN object, named by the convention - only one.
+#     (bodies with the same generic name, eg. "Body1", are left as they are)
+#
+# Returns all found errors (empty when valid).
+def validate_names(objects: list[tuple[str, str]], grammar: NamingGrammar = None) -> list[str]:
+    grammar = grammar or get_naming_grammar()
+    errors = []
+    seen_ids = set()
+    main_objects = {}
+
+    for object_id, name in objects:
+        context = grammar.parse(str(name))
+
+        if object_id in seen_ids:
+            errors.append(f'Duplicate object id {object_id} ("{name}")')
+        seen_ids.add(object_id)
+
+        if not grammar.is_known_type(context):
+            errors.append(f'Unknown type "{context.type}" of "{name}" - expected one of: {", ".join(sorted(grammar.types))}')
+
+        main_objects.setdefault(context.component_name, [])
+        if context.type == MAIN_TYPE and not context.generic:
+            main_objects[context.component_name].append(name)
+        elif context.generic and not main_objects[context.component_name]:
+            main_objects[context.component_name].append(name)
+
+    for component_name, names in main_objects.items():
+        if not names:
+            errors.append(f'Missing MAIN object for component {component_name} - did you forget to name one body "${component_name}__MAIN_(...)"?')
+        elif len(names) > 1:
+            errors.append(f'Multiple MAIN objects for component {component_name}: {", ".join(f"{name!r}" for name in names)}')
+
+    return errors
+
+# validate_names, raising all errors together
+def check_names(objects: list[tuple[str, str]], grammar: NamingGrammar = None, source: str = None):
+    errors = validate_names(objects, grammar)
+    if not errors:
+        return
+
+    lines = [f'  - {error}' for error in errors[:MAX_REPORTED_ERRORS]]
+    if len(errors) > MAX_REPORTED_ERRORS:
+        lines.append(f'  ... and {len(errors) - MAX_REPORTED_ERRORS} more')
+
+    raise BusinessException(f'Invalid object names{f" in {source}" if source else ""} ({len(errors)} error(s)):\n' + '\n'.join(lines) + '\n')
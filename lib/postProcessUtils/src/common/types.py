@@ -1,33 +1,72 @@
-from typing import Dict, List, Set, Tuple, Literal, NotRequired, TypedDict
-
-class ObjectContext(TypedDict): {
-    "component_name": str,
-    "type": str,
-    "name": str,
-}
-
-class ObjectModel(TypedDict): {
-    'id': str,
-    'name': str,
-    'puuid': str,
-    'pid': str,
-    'pindex': str,
-    'color': str,
-    'extruder_color_idx': str,
-    'component': str,
-    'type': str,
-    'name': str,
-}
-
-class WrappingComponent(TypedDict): {
-    'id': str,
-    'type': str,
-    'namespace': str,
-    'name': str,
-}
-
-class ComponentObjectsGroup(TypedDict): {
-    'main': ObjectModel,
-    'sub_types': Dict[str, List[ObjectModel]],
-    'wrapping_component': WrappingComponent,
-}
+from sys import intern
+from typing import Dict, List, Optional
+
+# Model classes are slotted (no per instance __dict__) and their repeated values (colors, types, component names...)
+# are interned - assemblies with tens of thousands of bodies keep a single copy of each distinct string.
+
+# missing attributes (None) are kept as they are
+def interned(value: Optional[str]) -> Optional[str]:
+    return intern(value) if isinstance(value, str) else value
+
+# parsed from object name, see get_context_from_name
+class ObjectContext:
+    __slots__ = ('component_name', 'type', 'name', 'generic')
+
+    def __init__(self, component_name: str, type: str, name: str, generic: bool = False):
+        self.component_name = interned(component_name)
+        # eg. MAIN, MOD, NEG - see shorthand_object_types_to_parts
+        self.type = interned(type)
+        self.name = name
+        # name doesn't follow the naming convention, object is exported as is
+        self.generic = generic
+
+# mesh <object> of the 3D model
+class ObjectModel:
+    __slots__ = ('id', 'puuid', 'pid', 'pindex', 'color', 'extruder_color_idx', 'component_name', 'type', 'name', 'transform', 'path')
+
+    def __init__(self, id: str, puuid: str, pid: str, pindex: str, color: str, context: ObjectContext, extruder_color_idx: str = '0'):
+        self.id = id
+        self.puuid = puuid
+        # color group and index of object color in it
+        self.pid = interned(pid)
+        self.pindex = interned(pindex)
+        self.color = interned(color)
+        # numeric id (starting from 1), see map_filaments
+        self.extruder_color_idx = interned(extruder_color_idx)
+        self.component_name = context.component_name
+        self.type = context.type
+        self.name = context.name
+        # placement of a shared mesh, see instance_meshes
+        self.transform: Optional[str] = None
+        # model part with the mesh, see split_model
+        self.path: Optional[str] = None
+
+# (virtual) object grouping objects of a component, see build_components
+class WrappingComponent:
+    __slots__ = ('id', 'type', 'namespace', 'name')
+
+    def __init__(self, id: str, namespace: str, name: str, type: str = 'model'):
+        self.id = id
+        self.type = type
+        self.namespace = namespace
+        self.name = name
+
+# objects of a single component - one MAIN object, any amount of objects of the other types
+class ComponentObjectsGroup:
+    __slots__ = ('main', 'sub_types', 'wrapping_component')
+
+    def __init__(self, wrapping_component: WrappingComponent):
+        self.main: Optional[ObjectModel] = None
+        # type: objects, in order
+        self.sub_types: Dict[str, List[ObjectModel]] = {}
+        self.wrapping_component = wrapping_component
+
+    def add(self, obj: ObjectModel):
+        if obj.type == 'MAIN':
+            self.main = obj
+        else:
+            self.sub_types.setdefault(obj.type, []).append(obj)
+
+    # main object first, then the other types
+    def objects(self) -> List[ObjectModel]:
+        return [self.main, *(obj for objects in self.sub_types.values() for obj in objects)]
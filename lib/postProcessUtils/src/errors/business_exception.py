@@ -3,3 +3,7 @@ class BusinessException(Exception):
 
 class BusinessLogicException(Exception):
     pass
+
+# processing stopped on request, between stages (see watch_stages)
+class ProcessCancelledException(Exception):
+    pass
@@ -1,25 +1,252 @@
+import sys
 import shutil
 import argparse
+from time import perf_counter
+from os.path import isfile, isdir, join, basename, splitext
+from functools import partial
 
-from .errors import BusinessLogicException
-from .builder import rebuild_files
-from .utils import extract_from_archive, archive_as_3mf
+from .errors import BusinessException, BusinessLogicException
+from .common.models import ProcessOptions
+from . import batch, watch, preflight
+from .cache import ResultCache
+from .builder import rebuild_files, rebuild_archive, rebuilt_entries, check_archive_names
+from .common.naming import get_naming_grammar
+from .common.consts import model_file_path, pipeline_stages
+from .utils import extract_from_archive, archive_as_3mf, rebuild_as_3mf, set_xml_backend, xml_backend, collect_report, stage
+from .utils import get_entry_size, estimate_memory, parse_size, MemoryMonitor
+from .utils.archive_utils import get_catalog_path, get_processed_path
 
 # as cli command
 def main():
     parser = argparse.ArgumentParser(description='Process 3d models from a 3MF file into context aware, sub typed objects understood by some slicers (OrcaSlicer, BambuStudio).')
-    parser.add_argument('input_path', type=str, help='Path to the input 3MF file')
+    parser.add_argument('input_paths', type=str, nargs='+', help='Path to the input 3MF file. Multiple files, glob patterns or catalogs (searched recursively) are processed as a batch')
+    parser.add_argument('--check', action='store_true', help='Only check the input files - archive entries, object headers, colors and names - without processing them. Exits with 1 when any file is invalid')
+    parser.add_argument('--watch', action='store_true', help='Watch input catalogs and process 3MF files as they appear or change, until interrupted')
+    parser.add_argument('--settle-time', type=float, default=watch.SETTLE_TIME, help='Watch mode - seconds a file must stay unchanged before it is processed')
+    parser.add_argument('--poll-interval', type=float, default=watch.POLL_INTERVAL, help='Watch mode - seconds between scans when filesystem notifications (watchdog) are not available')
+    parser.add_argument('--workers', type=int, default=None, help='Number of worker processes in batch mode, by default number of CPUs')
+    parser.add_argument('--stream', action='store_true', help='Process archive zip to zip, without extracting it into a temporary catalog')
+    parser.add_argument('--low-memory', action='store_true', help='Rewrite 3D model in a single pass, without loading meshes into memory')
+    parser.add_argument('--deterministic', action='store_true', help='Same input gives byte for byte the same output - stable UUIDs, sorted archive entries, fixed timestamps')
+    parser.add_argument('--instance-meshes', action='store_true', help='Keep a single mesh for identical bodies (eg. repeated fasteners), placed with component transforms. Not available with --low-memory')
+    parser.add_argument('--split-objects', action='store_true', help='Write meshes into per component model files (3D/Objects/object_N.model), the same layout slicers save projects in. Not available with --low-memory')
+    parser.add_argument('--optimize-meshes', action='store_true', help='Weld coincident vertices, drop degenerate and duplicate triangles (requires NumPy). Not available with --low-memory')
+    parser.add_argument('--weld-tolerance', type=float, default=1e-4, help='Mesh optimization - vertices closer than that (mm) are welded')
+    parser.add_argument('--decimals', type=int, default=None, help='Round vertex coordinates to that many decimals (requires NumPy). Not available with --low-memory')
+    parser.add_argument('--grid', type=float, default=None, help='Snap vertex coordinates to a grid, in mm - eg. 0.001 for a micron (requires NumPy). Not available with --low-memory')
+    parser.add_argument('--compact-meshes', action='store_true', help='Write mesh sections without indentation. Not available with --low-memory')
+    parser.add_argument('--cache', action='store_true', help='Reuse results of previous runs on the same input, see the cache module to inspect and prune it')
+    parser.add_argument('--naming-pattern', type=str, default=None, help='Regular expression object names are parsed with, with named groups component, type and name (optional). By default "$Component__TYPE_name"')
+    parser.add_argument('--map-filaments', action='store_true', help='Assign parts to extruders by their color and write matching filaments into project settings')
+    parser.add_argument('--max-filaments', type=int, default=16, help='Filament mapping - number of filament slots, remaining colors share the filament of the nearest color')
+    parser.add_argument('--memory-budget', type=parse_size, default=None, help='Memory a single file may take to process, on top of what the (worker) process already uses, eg. 2G - larger files are processed with --low-memory, or refused when an option needs the whole model loaded')
+    parser.add_argument('--report', type=str, default=None, help='Write per stage wall and CPU time, bytes in and out and peak memory into a JSON file (or a catalog, one report per input file)')
+    parser.add_argument('--trace-memory', action='store_true', help='Report - measure peak memory of every stage with tracemalloc instead of process peak RSS (slows processing down)')
+    parser.add_argument('--profile-stage', type=str, default=None, choices=pipeline_stages, metavar='STAGE', help=f'Run a stage under cProfile, one of: {", ".join(pipeline_stages)}')
+    parser.add_argument('--profile-output', type=str, default=None, help='File (or a catalog) the profile stats are dumped into, by default top entries are printed')
+    parser.add_argument('--xml-backend', choices=['auto', 'lxml', 'stdlib'], help='XML library used to rewrite files, by default lxml when installed (also set by POST_PROCESS_XML_BACKEND)')
     args = parser.parse_args()
 
-    process_file(args.input_path)
+    if args.low_memory:
+        # these need the whole model (with meshes) loaded
+        for flag, enabled in [('--instance-meshes', args.instance_meshes), ('--split-objects', args.split_objects), ('--optimize-meshes', args.optimize_meshes), ('--decimals', args.decimals is not None), ('--grid', args.grid), ('--compact-meshes', args.compact_meshes)]:
+            if enabled:
+                parser.error(f'{flag} is not available with --low-memory')
+
+    try:
+        get_naming_grammar(args.naming_pattern)
+    except BusinessException as err:
+        parser.error(str(err))
+    if args.max_filaments < 1:
+        parser.error('--max-filaments must be at least 1')
+    if args.trace_memory and args.report is None:
+        parser.error('--trace-memory requires --report')
+    if args.profile_output and args.profile_stage is None:
+        parser.error('--profile-output requires --profile-stage')
+
+    if args.xml_backend:
+        set_xml_backend(args.xml_backend)
+
+    if args.check:
+        start = perf_counter()
+        reports = [preflight.preflight(path, args.naming_pattern) for path in batch.collect_input_paths(args.input_paths)]
+
+        print(preflight.format_preflight_summary(reports, perf_counter() - start))
+
+        if not all(report.ok for report in reports):
+            sys.exit(1)
+        return
+
+    options = {
+        'stream': args.stream,
+        'low_memory': args.low_memory,
+        'cache': args.cache,
+        'deterministic': args.deterministic,
+        'mesh_instancing': args.instance_meshes,
+        'split_objects': args.split_objects,
+        'optimize_meshes': args.optimize_meshes,
+        'weld_tolerance': args.weld_tolerance,
+        'coordinate_decimals': args.decimals,
+        'coordinate_grid': args.grid,
+        'compact_meshes': args.compact_meshes,
+        'naming_pattern': args.naming_pattern,
+        'map_filaments': args.map_filaments,
+        'max_filaments': args.max_filaments,
+        'memory_budget': args.memory_budget,
+        'report': args.report,
+        'trace_memory': args.trace_memory,
+        'profile_stage': args.profile_stage,
+        'profile_output': args.profile_output,
+    }
+
+    if args.watch:
+        invalid_paths = [path for path in args.input_paths if not isdir(path)]
+        if invalid_paths:
+            parser.error(f'--watch expects catalogs, got: {", ".join(invalid_paths)}')
+
+        watch.watch_folders(args.input_paths, args.workers, settle_time=args.settle_time, poll_interval=args.poll_interval, **options)
+        return
+
+    if len(args.input_paths) == 1 and isfile(args.input_paths[0]):
+        process_file(args.input_paths[0], **options)
+        return
+
+    start = perf_counter()
+    results = batch.process_files(batch.collect_input_paths(args.input_paths), args.workers, **options)
+
+    print(batch.format_summary(results, perf_counter() - start))
+
+    if not all(result.ok for result in results):
+        sys.exit(1)
+
+# Processed file, see process_file_result
+class ProcessResult:
+    def __init__(self, output_path: str, peak_memory: int = None):
+        self.output_path = output_path
+        # bytes the file took to process at the peak, on top of RSS of the process before - None when not measured
+        self.peak_memory = peak_memory
 
 # as function
-def process_file(path: str):
-    catalog_path = extract_from_archive(path)
+# options - see ProcessOptions
+def process_file(path: str, **options) -> str:
+    return process_file_result(path, **options).output_path
+
+# process_file, with memory the file took to process (see MemoryMonitor.used) -
+# measured when memory_budget is set, processing is reported or measure_memory is requested.
+def process_file_result(path: str, measure_memory: bool = False, **options) -> ProcessResult:
+    options = apply_memory_budget(path, ProcessOptions(**options))
+
+    if not (measure_memory or options.memory_budget is not None or options.is_reported()):
+        return ProcessResult(run_cached(path, options))
+
+    with MemoryMonitor() as monitor:
+        output_path = run_reported(path, options, monitor)
+
+    return ProcessResult(output_path, monitor.used)
+
+def run_reported(path: str, options: ProcessOptions, monitor: MemoryMonitor) -> str:
+    # stages are measured only within collect_report
+    if not options.is_reported():
+        return run_cached(path, options)
+
+    with collect_report(options.trace_memory, options.profile_stage) as report:
+        report.info.update(input_path=path, options=options.output_options(), memory_budget=options.memory_budget)
+
+        with stage('process_file', bytes_in=path) as current:
+            output_path = current.bytes_out = run_cached(path, options)
+
+    monitor.sample()
+    report.info.update(peak_rss=monitor.peak, peak_memory=monitor.used)
+
+    if options.report is not None:
+        report.write(get_report_path(options.report, path, '.report.json'))
+    if options.profile_stage is not None:
+        report.dump_profile(options.profile_output and get_report_path(options.profile_output, path, f'.{options.profile_stage}.prof'))
+
+    return output_path
+
+# path - either a file, or a catalog the file named after input file is put in (eg. in batch mode)
+def get_report_path(path: str, input_path: str, suffix: str) -> str:
+    if isdir(path):
+        return join(path, splitext(basename(input_path))[0] + suffix)
+
+    return path
+
+# Options the file is processed with, to stay within options.memory_budget - checked before anything is loaded.
+# The budget is memory the file itself takes to process (see estimate_memory), what the process already uses doesn't count -
+# eg. a warm service worker or the batch parent.
+#
+#   - as they are, when estimated memory of the whole model fits into the budget,
+#   - switched to low_memory when it doesn't (and no option needs the whole model),
+#   - otherwise the file is refused with BusinessException.
+def apply_memory_budget(path: str, options: ProcessOptions) -> ProcessOptions:
+    if options.memory_budget is None:
+        return options
+
+    model_size = get_entry_size(path, model_file_path)
+    available = options.memory_budget
+    required = estimate_memory(model_size, xml_backend.name, options.low_memory)
+
+    if required <= available:
+        return options
+
+    full_model_options = options.full_model_options()
+    low_memory_required = estimate_memory(model_size, xml_backend.name, low_memory=True)
+
+    if not options.low_memory and not full_model_options and low_memory_required <= available:
+        return ProcessOptions(**{**vars(options), 'low_memory': True})
+
+    needed = required if full_model_options else low_memory_required
+    details = f' Options which need the whole model loaded: {", ".join(full_model_options)}.' if full_model_options else ''
+
+    raise BusinessException(
+        f'Not enough memory to process "{path}": about {format_size(needed)} needed for {format_size(model_size)} 3D model, '
+        f'over {format_size(options.memory_budget)} memory budget.{details}\n'
+    )
+
+def format_size(value: int) -> str:
+    return f'{value / 1024 ** 2:.0f} MB'
+
+def run_cached(path: str, options: ProcessOptions) -> str:
+    if not options.cache:
+        return run_pipeline(path, options)
+
+    result_cache = ResultCache()
+    output_path = get_processed_path(get_catalog_path(path))
+
+    with stage('cache_restore', bytes_in=path):
+        key = result_cache.key(path, options.output_options())
+        restored = result_cache.restore(key, output_path)
+
+    if restored:
+        return output_path
+
+    output_path = run_pipeline(path, options)
+
+    with stage('cache_store', bytes_in=output_path):
+        result_cache.store(key, output_path)
+
+    return output_path
+
+def run_pipeline(path: str, options: ProcessOptions) -> str:
+    # a badly named export fails before anything is extracted or parsed
+    with stage('check_archive_names', bytes_in=path):
+        check_archive_names(path, options)
+
+    if options.stream:
+        with stage('rebuild_archive', bytes_in=path) as current:
+            current.bytes_out = rebuild_as_3mf(path, partial(rebuild_archive, options=options), rebuilt_entries(options), options.deterministic)
+            return current.bytes_out
+
+    with stage('extract', bytes_in=path) as current:
+        catalog_path = current.bytes_out = extract_from_archive(path)
 
     try:
-        rebuild_files(catalog_path)
-        archive_as_3mf(catalog_path)
+        rebuild_files(catalog_path, options)
+
+        with stage('archive', bytes_in=catalog_path) as current:
+            current.bytes_out = archive_as_3mf(catalog_path, options.deterministic)
+            return current.bytes_out
     except BusinessLogicException as err:
         raise err
     finally:
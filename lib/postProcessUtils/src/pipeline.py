@@ -0,0 +1,132 @@
+import os
+import shutil
+import asyncio
+from time import perf_counter
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from . import batch, handle
+from .errors import BusinessException, BusinessLogicException
+from .common.models import ProcessOptions
+from .builder import rebuild_files, check_archive_names
+from .utils import extract_from_archive, archive_as_3mf
+
+__all__ = [
+    'AsyncPipeline',
+    'process_file_async',
+    'process_files_async',
+]
+
+# files read (and decompressed) at once, and written (compressed) at once - both mostly I/O, run on threads
+READ_WORKERS = 2
+WRITE_WORKERS = 2
+
+# Post processing as a coroutine - process_file run on the event loop's default executor.
+# Many files can be awaited at once (eg. with asyncio.gather), to pipeline a batch use process_files_async.
+async def process_file_async(path: str, **options) -> str:
+    return await asyncio.get_running_loop().run_in_executor(None, partial(handle.process_file, path, **options))
+
+# Pipelined batch - see AsyncPipeline. Results are in order of paths.
+async def process_files_async(paths: list[str], read_workers: int = READ_WORKERS, cpu_workers: int = None, write_workers: int = WRITE_WORKERS, **options) -> list[batch.BatchResult]:
+    async with AsyncPipeline(read_workers, cpu_workers, write_workers, **options) as pipeline:
+        return await asyncio.gather(*(pipeline.process_safely(path) for path in paths))
+
+# Files processed concurrently, every stage with its own bounded concurrency:
+#   - read (check names, extract and decompress) - read_workers threads,
+#   - rebuild (parse, process and write 3D model) - cpu_workers processes (see batch.create_pool) or cpu_executor,
+#   - write (compress into the output archive) - write_workers threads.
+# While file N is being rebuilt, file N+1 is read and file N-1 written.
+# At most as many extracted catalogs as there are workers in total wait on disk.
+#
+# Stream, cached and reported processing is not split into stages - the whole process_file runs on cpu_executor.
+#
+#   async with AsyncPipeline(cpu_workers=4, deterministic=True) as pipeline:
+#       output_path = await pipeline.process(path)
+class AsyncPipeline:
+    def __init__(self, read_workers: int = READ_WORKERS, cpu_workers: int = None, write_workers: int = WRITE_WORKERS, cpu_executor=None, **options):
+        self.read_workers = read_workers
+        self.cpu_workers = cpu_workers or os.cpu_count() or 1
+        self.write_workers = write_workers
+        self.options = options
+        # given executor is left running on close, the default process pool is shut down
+        self.cpu_executor = cpu_executor
+        self.owns_cpu_executor = cpu_executor is None
+        self.io_executor = None
+
+        # created within the running event loop, see open
+        self.read_slots = None
+        self.cpu_slots = None
+        self.write_slots = None
+        self.in_flight = None
+
+    async def __aenter__(self) -> 'AsyncPipeline':
+        self.open()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    def open(self):
+        if self.owns_cpu_executor:
+            self.cpu_executor = batch.create_pool(self.cpu_workers)
+        self.io_executor = ThreadPoolExecutor(self.read_workers + self.write_workers, thread_name_prefix='post_process_io')
+
+        self.read_slots = asyncio.Semaphore(self.read_workers)
+        self.cpu_slots = asyncio.Semaphore(self.cpu_workers)
+        self.write_slots = asyncio.Semaphore(self.write_workers)
+        self.in_flight = asyncio.Semaphore(self.read_workers + self.cpu_workers + self.write_workers)
+
+    def close(self):
+        self.io_executor.shutdown(wait=True)
+        if self.owns_cpu_executor:
+            self.cpu_executor.shutdown(wait=True, cancel_futures=True)
+
+    # path of the processed archive, raises the same exceptions process_file does
+    async def process(self, path: str) -> str:
+        options = ProcessOptions(**self.options)
+
+        if options.stream or options.cache or options.is_reported():
+            async with self.cpu_slots:
+                return await self.run(self.cpu_executor, handle.process_file, path, **self.options)
+
+        async with self.in_flight:
+            async with self.read_slots:
+                options = await self.run(self.io_executor, handle.apply_memory_budget, path, options)
+                catalog_path = await self.run(self.io_executor, read_archive, path, options)
+
+            try:
+                async with self.cpu_slots:
+                    await self.run(self.cpu_executor, rebuild_files, catalog_path, options)
+
+                async with self.write_slots:
+                    return await self.run(self.io_executor, archive_as_3mf, catalog_path, options.deterministic)
+            finally:
+                await self.run(self.io_executor, shutil.rmtree, catalog_path, True)
+
+    # failures are reported in the result, see batch.process_file_safely
+    async def process_safely(self, path: str) -> batch.BatchResult:
+        start = perf_counter()
+        result = batch.BatchResult(path)
+
+        try:
+            result.output_path = await self.process(path)
+        except (BusinessException, BusinessLogicException) as err:
+            result.status, result.error = 'failed', str(err).strip()
+        except BrokenProcessPool as err:
+            result.status, result.error = 'failed', f'Worker process terminated abruptly: {err}'
+        except Exception as err:
+            result.status, result.error = 'failed', f'{type(err).__name__}: {err}'.strip()
+
+        result.duration = perf_counter() - start
+
+        return result
+
+    async def run(self, executor, function, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(executor, partial(function, *args, **kwargs))
+
+# first stage of run_pipeline - a badly named export fails before it's extracted
+def read_archive(path: str, options: ProcessOptions) -> str:
+    check_archive_names(path, options)
+
+    return extract_from_archive(path)
@@ -0,0 +1,135 @@
+from time import perf_counter
+from zipfile import ZipFile, BadZipFile, ZIP_STORED
+
+from .errors import BusinessException
+from .common.consts import model_file_path
+from .common.naming import get_naming_grammar, validate_names, MAX_REPORTED_ERRORS
+from .builder.model_scan import scan_model_headers
+from .utils import xml_backend, estimate_memory
+from .utils.zip_utils import open_entry_source
+
+__all__ = [
+    'PreflightReport',
+    'preflight',
+    'format_preflight',
+    'format_preflight_summary',
+]
+
+# entries every export has to have
+REQUIRED_ENTRIES = ('[Content_Types].xml', model_file_path)
+
+# components listed at most in format_preflight
+MAX_REPORTED_COMPONENTS = 20
+
+class PreflightReport:
+    def __init__(self, path: str):
+        self.path = path
+        # everything which would make processing fail, empty when the file is fine
+        self.errors: list[str] = []
+        # uncompressed size of the 3D model (bytes) and whether it's stored without compression (memory mapped)
+        self.model_size: int = None
+        self.stored = False
+        self.objects = 0
+        # component name: {type: number of objects}
+        self.components: dict[str, dict[str, int]] = {}
+        self.colors = 0
+        # bytes needed to process the file with the whole model loaded, see estimate_memory
+        self.estimated_memory: int = None
+        self.duration = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+# Fast check of an export, before anything is extracted or parsed - reads only the archive directory
+# and <object> / <colorgroup> headers of the 3D model (mesh content is skipped, see scan_model_headers):
+#   - the file is a readable archive with all REQUIRED_ENTRIES,
+#   - the model is well formed (tags of the whole document, mesh content aside),
+#   - object colors reference existing color groups, build items reference existing objects,
+#   - object names follow the naming pattern (see validate_names).
+def preflight(path: str, naming_pattern: str = None) -> PreflightReport:
+    start = perf_counter()
+    report = PreflightReport(path)
+
+    try:
+        with ZipFile(path, 'r') as source_zip:
+            names = set(source_zip.namelist())
+            report.errors.extend(f'Missing archive entry "{name}"' for name in REQUIRED_ENTRIES if name not in names)
+
+            if model_file_path in names:
+                info = source_zip.getinfo(model_file_path)
+                report.model_size = info.file_size
+                report.stored = info.compress_type == ZIP_STORED
+
+                with open_entry_source(source_zip, model_file_path) as source:
+                    headers = scan_model_headers(source)
+
+                check_headers(report, headers, get_naming_grammar(naming_pattern))
+    except (BadZipFile, OSError) as err:
+        report.errors.append(f'Unable to read archive: {err}')
+    except BusinessException as err:
+        report.errors.append(str(err).strip())
+
+    if report.model_size is not None:
+        report.estimated_memory = estimate_memory(report.model_size, xml_backend.name)
+
+    report.duration = perf_counter() - start
+
+    return report
+
+def check_headers(report: PreflightReport, headers, grammar):
+    if not headers.objects:
+        report.errors.append(f'No objects in {model_file_path}')
+
+    report.objects = len(headers.objects)
+    report.colors = len({color for colors in headers.colors.values() for color in colors})
+
+    for header in headers.objects:
+        name = str(header.get('name'))
+        pid, pindex = header.get('pid'), header.get('pindex')
+
+        # see extract_object_info
+        if pid not in headers.colors:
+            report.errors.append(f'Object "{name}" references missing color group {pid}')
+        elif not str(pindex).isdigit() or int(pindex) >= len(headers.colors[pid]):
+            report.errors.append(f'Object "{name}" references missing color {pindex} of color group {pid}')
+
+        context = grammar.parse(name)
+        types = report.components.setdefault(context.component_name, {})
+        types[context.type] = types.get(context.type, 0) + 1
+
+    object_ids = {header.get('id') for header in headers.objects}
+    for item in headers.items:
+        if item.get('objectid') not in object_ids:
+            report.errors.append(f'Build item references missing object {item.get("objectid")}')
+
+    report.errors.extend(validate_names(headers.object_names(), grammar))
+
+def format_preflight(report: PreflightReport) -> str:
+    status = 'OK' if report.ok else 'INVALID'
+    size = f'{report.model_size / 1024 ** 2:.1f} MB model{" (stored)" if report.stored else ""}, ' if report.model_size is not None else ''
+    lines = [f'{status:<7} {report.duration * 1000:>8.1f}ms  {report.path}']
+
+    if report.model_size is not None:
+        lines.append(f'{"":<18}{size}{report.objects} object(s), {len(report.components)} component(s), {report.colors} color(s), about {report.estimated_memory / 1024 ** 2:.0f} MB to process')
+
+    for component_name, types in list(report.components.items())[:MAX_REPORTED_COMPONENTS]:
+        lines.append(f'{"":<20}{component_name}: {", ".join(f"{type} x{count}" for type, count in types.items())}')
+
+    if len(report.components) > MAX_REPORTED_COMPONENTS:
+        lines.append(f'{"":<20}... and {len(report.components) - MAX_REPORTED_COMPONENTS} more')
+
+    lines.extend(f'{"":<20}- {error}' for error in report.errors[:MAX_REPORTED_ERRORS])
+    if len(report.errors) > MAX_REPORTED_ERRORS:
+        lines.append(f'{"":<20}... and {len(report.errors) - MAX_REPORTED_ERRORS} more')
+
+    return '\n'.join(lines)
+
+def format_preflight_summary(reports: list[PreflightReport], duration: float) -> str:
+    lines = [format_preflight(report) for report in reports]
+
+    invalid = len([report for report in reports if not report.ok])
+    lines.append('')
+    lines.append(f'Checked {len(reports)} file(s) in {duration:.2f}s: {len(reports) - invalid} ok, {invalid} invalid.')
+
+    return '\n'.join(lines)
@@ -0,0 +1,331 @@
+import os
+import json
+import shutil
+import argparse
+import tempfile
+from threading import Lock, BoundedSemaphore
+from time import perf_counter, monotonic
+from os.path import realpath, isfile, join, getsize, commonpath
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from concurrent.futures.process import BrokenProcessPool
+
+from . import batch
+from .utils import is_processed_path, set_xml_backend, parse_size
+
+__all__ = [
+    'ProcessingService',
+    'serve',
+]
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+# requests waiting for a free worker, on top of the ones being processed
+DEFAULT_QUEUE_SIZE = 16
+# largest accepted upload (bytes)
+DEFAULT_MAX_UPLOAD = 1024 ** 3
+CHUNK_SIZE = 1024 * 1024
+
+# Post processing as a local HTTP service, on a pool of worker processes started (and warmed up) once.
+#
+#   POST /process                 - body is a 3MF file, processed archive is sent back
+#   POST /process?path=<path>     - file on shared storage is processed in place, JSON with output path is sent back
+#   GET  /health                  - liveness, workers, queue state and pool restarts (503 when workers can't be started)
+#   GET  /stats                   - counters since start
+#
+# When all workers are busy and the queue is full, requests are rejected with 503 and "Retry-After".
+class ProcessingService:
+    def __init__(self, workers: int = None, queue_size: int = DEFAULT_QUEUE_SIZE, max_upload: int = DEFAULT_MAX_UPLOAD, allowed_roots: list[str] = None, **options):
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = batch.create_pool(self.workers)
+        self.capacity = self.workers + queue_size
+        self.max_upload = max_upload
+        self.allowed_roots = [realpath(root) for root in allowed_roots or []]
+        self.options = options
+
+        self.slots = BoundedSemaphore(self.capacity)
+        self.lock = Lock()
+        # pool replacement, see replace_pool
+        self.pool_lock = Lock()
+        # a new pool couldn't be started - the service has to be restarted, see health
+        self.broken = False
+        self.started = monotonic()
+        self.stats = {
+            'accepted': 0,
+            'rejected': 0,
+            'processed': 0,
+            'failed': 0,
+            'in_progress': 0,
+            'processing_time': 0.0,
+            'pool_restarts': 0,
+        }
+
+        self.warm_up()
+
+    # starts every worker process up front, so the first requests don't pay for it
+    def warm_up(self):
+        futures = [self.pool.submit(os.getpid) for _ in range(self.workers)]
+        for future in futures:
+            future.result()
+
+    def shutdown(self):
+        self.pool.shutdown(wait=True, cancel_futures=True)
+
+    def try_acquire(self) -> bool:
+        if not self.slots.acquire(blocking=False):
+            self.count('rejected')
+            return False
+
+        with self.lock:
+            self.stats['accepted'] += 1
+            self.stats['in_progress'] += 1
+
+        return True
+
+    def release(self):
+        with self.lock:
+            self.stats['in_progress'] -= 1
+
+        self.slots.release()
+
+    def count(self, name: str, value=1):
+        with self.lock:
+            self.stats[name] += value
+
+    def process(self, path: str) -> batch.BatchResult:
+        start = perf_counter()
+        pool = self.pool
+
+        try:
+            result = pool.submit(batch.process_file_safely, path, self.options).result()
+        except BrokenProcessPool as err:
+            # a worker died (eg. killed by the OS) - the file being processed isn't retried, it may be the cause
+            result = batch.BatchResult(path, 'failed', error=f'Worker process terminated abruptly: {err}')
+
+            if not self.replace_pool(pool):
+                result.error = f'Worker processes could not be restarted: {err}'
+
+        self.count('processed' if result.ok else 'failed')
+        self.count('processing_time', perf_counter() - start)
+
+        return result
+
+    # A broken pool fails every request submitted to it - it's replaced once, by the first request which finds it broken.
+    # False when a new pool couldn't be started - the service is marked as broken and the next request tries again.
+    def replace_pool(self, broken_pool) -> bool:
+        with self.pool_lock:
+            if self.pool is not broken_pool:
+                return not self.broken
+
+            broken_pool.shutdown(wait=False, cancel_futures=True)
+
+            try:
+                self.pool = batch.create_pool(self.workers)
+                self.warm_up()
+            except Exception:
+                self.broken = True
+                return False
+
+            self.broken = False
+
+        self.count('pool_restarts')
+        return True
+
+    def is_allowed_path(self, path: str) -> bool:
+        if not self.allowed_roots:
+            return True
+
+        # symlinks are resolved, so a link inside an allowed catalog can't lead out of it
+        path = realpath(path)
+        return any(commonpath([root, path]) == root for root in self.allowed_roots)
+
+    def health(self) -> dict:
+        with self.lock:
+            in_progress = self.stats['in_progress']
+            pool_restarts = self.stats['pool_restarts']
+
+        return {
+            # "broken" - workers can't be started, the service has to be restarted
+            'status': 'broken' if self.broken else 'ok',
+            'pool_restarts': pool_restarts,
+            'workers': self.workers,
+            'busy': min(in_progress, self.workers),
+            'queued': max(in_progress - self.workers, 0),
+            'capacity': self.capacity,
+        }
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            stats = dict(self.stats)
+
+        done = stats['processed'] + stats['failed']
+        stats['average_time'] = stats['processing_time'] / done if done else 0.0
+        stats['uptime'] = monotonic() - self.started
+
+        return stats
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    server_version = 'PostProcessService/1.0'
+    protocol_version = 'HTTP/1.1'
+
+    @property
+    def service(self) -> ProcessingService:
+        return self.server.service
+
+    def do_GET(self):
+        route = urlsplit(self.path).path
+
+        if route == '/health':
+            health = self.service.health()
+            self.send_json(503 if health['status'] == 'broken' else 200, health)
+        elif route == '/stats':
+            self.send_json(200, self.service.get_stats())
+        else:
+            self.send_json(404, {'error': 'Not found'})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+
+        if url.path != '/process':
+            self.send_json(404, {'error': 'Not found'})
+            return
+
+        length = int(self.headers.get('Content-Length') or 0)
+        path = parse_qs(url.query).get('path', [None])[0]
+
+        # unread body would be taken as the next request on a kept alive connection
+        if path is not None and length:
+            self.close_connection = True
+
+        if path is None and length <= 0:
+            self.close_connection = True
+            self.send_json(411, {'error': 'Upload with Content-Length is required'})
+            return
+        if length > self.service.max_upload:
+            self.close_connection = True
+            self.send_json(413, {'error': f'Upload is larger than {self.service.max_upload} bytes'})
+            return
+
+        if not self.service.try_acquire():
+            self.close_connection = True
+            self.send_json(503, {'error': 'All workers are busy, try again later'}, {'Retry-After': '1'})
+            return
+
+        try:
+            if path is None:
+                self.process_upload(length)
+            else:
+                self.process_path(path)
+        finally:
+            self.service.release()
+
+    def process_path(self, path: str):
+        if not self.service.is_allowed_path(path):
+            self.send_json(403, {'error': f'Path is outside of allowed catalogs: {path}'})
+            return
+        if not isfile(path) or is_processed_path(path):
+            self.send_json(404, {'error': f'File not found: {path}'})
+            return
+
+        result = self.service.process(path)
+
+        self.send_json(200 if result.ok else self.failure_code(), {
+            'status': result.status,
+            'output_path': result.output_path,
+            'error': result.error,
+            'duration': result.duration,
+            'peak_memory': result.peak_memory,
+        })
+
+    def process_upload(self, length: int):
+        catalog_path = tempfile.mkdtemp(prefix='post_process_')
+
+        try:
+            path = join(catalog_path, 'upload.3mf')
+            with open(path, 'wb') as file:
+                remaining = length
+                while remaining:
+                    chunk = self.rfile.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        self.close_connection = True
+                        return
+                    file.write(chunk)
+                    remaining -= len(chunk)
+
+            result = self.service.process(path)
+
+            if not result.ok:
+                self.send_json(self.failure_code(), {'status': result.status, 'error': result.error, 'duration': result.duration, 'peak_memory': result.peak_memory})
+                return
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'model/3mf')
+            self.send_header('Content-Length', str(getsize(result.output_path)))
+            self.send_header('X-Processing-Time', f'{result.duration:.3f}')
+            if result.peak_memory is not None:
+                self.send_header('X-Peak-Memory', str(result.peak_memory))
+            self.end_headers()
+
+            with open(result.output_path, 'rb') as file:
+                shutil.copyfileobj(file, self.wfile, CHUNK_SIZE)
+        finally:
+            shutil.rmtree(catalog_path, ignore_errors=True)
+
+    # file couldn't be processed (422), or workers can't be started and the service has to be restarted (503)
+    def failure_code(self) -> int:
+        return 503 if self.service.broken else 422
+
+    def send_json(self, code: int, payload: dict, headers: dict = None):
+        body = json.dumps(payload).encode('utf-8')
+
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+
+        self.wfile.write(body)
+
+class ServiceHTTPServer(ThreadingHTTPServer):
+    def __init__(self, address, service: ProcessingService):
+        super().__init__(address, ServiceRequestHandler)
+        self.service = service
+
+# runs until interrupted
+def serve(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, workers: int = None, queue_size: int = DEFAULT_QUEUE_SIZE, **options):
+    service = ProcessingService(workers, queue_size, **options)
+    server = ServiceHTTPServer((host, port), service)
+
+    print(f'Serving on http://{host}:{server.server_port} with {service.workers} worker(s)', flush=True)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+# as cli command
+def main():
+    parser = argparse.ArgumentParser(description='Serve 3MF post processing over HTTP, on a pool of warm worker processes.')
+    parser.add_argument('--host', type=str, default=DEFAULT_HOST, help='Interface to listen on')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='Port to listen on')
+    parser.add_argument('--workers', type=int, default=None, help='Number of worker processes, by default number of CPUs')
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE, help='Requests waiting for a free worker before new ones are rejected with 503')
+    parser.add_argument('--max-upload', type=int, default=DEFAULT_MAX_UPLOAD, help='Largest accepted upload, in bytes')
+    parser.add_argument('--allowed-root', dest='allowed_roots', action='append', help='Catalog files processed by path must be in (repeatable), by default any')
+    parser.add_argument('--stream', action='store_true', help='Process archive zip to zip, without extracting it into a temporary catalog')
+    parser.add_argument('--low-memory', action='store_true', help='Rewrite 3D model in a single pass, without loading meshes into memory')
+    parser.add_argument('--memory-budget', type=parse_size, default=None, help='Memory a single file may take to process, on top of what the worker already uses, eg. 2G - larger files are processed in low memory mode, or refused')
+    parser.add_argument('--xml-backend', choices=['auto', 'lxml', 'stdlib'], help='XML library used to rewrite files, by default lxml when installed (also set by POST_PROCESS_XML_BACKEND)')
+    args = parser.parse_args()
+
+    if args.xml_backend:
+        set_xml_backend(args.xml_backend)
+
+    serve(args.host, args.port, args.workers, args.queue_size, max_upload=args.max_upload, allowed_roots=args.allowed_roots, stream=args.stream, low_memory=args.low_memory, memory_budget=args.memory_budget)
+
+if __name__ == "__main__":
+    main()
@@ -1,2 +1,4 @@
 from .xml_utils import *
-from .archive_utils import extract_from_archive, archive_as_3mf
+from .archive_utils import extract_from_archive, archive_as_3mf, rebuild_as_3mf, open_archive_entry, get_entry_size, is_processed_path
+from .profiling import collect_report, watch_stages, stage
+from .memory import current_rss, estimate_memory, parse_size, MemoryMonitor
@@ -1,3 +1,4 @@
 from . import powershell as Powershell
 from . import zip as Zip
 from . import zipfile as ZipFile
+from . import parallel as Parallel
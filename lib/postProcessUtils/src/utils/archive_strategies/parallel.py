@@ -0,0 +1,229 @@
+from os import makedirs, cpu_count
+from os.path import join, dirname, splitdrive
+from io import BufferedIOBase
+from shutil import copyfileobj
+from functools import lru_cache
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from zipfile import ZipFile, ZipInfo, BadZipFile, ZIP_DEFLATED, ZIP_STORED, ZIP64_LIMIT
+from zlib import compressobj, decompressobj, crc32, error as ZlibError, DEFLATED, MAX_WBITS, Z_SYNC_FLUSH, Z_FINISH
+
+from ...errors import BusinessException
+from ..zip_utils import read_raw_entry, begin_raw_entry, end_raw_entry, file_entry_info, walk_catalog
+
+__all__ = [
+    "extract",
+    "archive",
+    "open_entry",
+]
+
+# zlib releases the GIL while (de)compressing - threads are enough to use all the cores.
+WORKERS = min(32, cpu_count() or 1)
+
+# Large entries are split into chunks compressed independently of each other.
+# Each chunk is a separate raw deflate stream ending on a byte boundary (sync flush),
+# concatenated they make a single valid deflate stream (same as pigz does).
+CHUNK_SIZE = 4 * 1024 * 1024
+COMPRESS_LEVEL = 6
+
+# max. amount of chunks in flight (being compressed or waiting to be written) per entry.
+WINDOW_SIZE = WORKERS * 2
+
+# general purpose flag - entry is encrypted
+_MASK_ENCRYPTED = 1 << 0
+
+def extract(catalog_path: str, file_path_zip: str):
+    try:
+        with ZipFile(file_path_zip, 'r') as zip_file:
+            infos = zip_file.infolist()
+
+        # largest first, so a single huge mesh entry doesn't end up being decompressed last
+        infos.sort(key=lambda info: info.compress_size, reverse=True)
+
+        with ThreadPoolExecutor(WORKERS) as pool:
+            for future in [pool.submit(extract_entry, catalog_path, file_path_zip, info) for info in infos]:
+                future.result()
+
+    except (OSError, BadZipFile, ZlibError) as err:
+        raise BusinessException(f'Unable to extract archive "{file_path_zip}" in parallel.\n\nOriginal message: "{err}"\n')
+
+def archive(catalog_path: str, file_path_3mf: str, deterministic: bool = False):
+    try:
+        with ZipFile(file_path_3mf, 'w', ZIP_DEFLATED) as zip_file, ThreadPoolExecutor(WORKERS) as pool:
+            for file_path, arcname in walk_catalog(catalog_path, deterministic):
+                zinfo = file_entry_info(file_path, arcname, deterministic)
+                zinfo.compress_type = ZIP_DEFLATED
+
+                with open(file_path, 'rb') as source, DeflateWriter(zip_file, zinfo, pool) as target:
+                    copyfileobj(source, target, CHUNK_SIZE)
+
+    except (OSError, ZlibError) as err:
+        raise BusinessException(f'Unable to archive "{catalog_path}" in parallel.\n\nOriginal message: "{err}"\n')
+
+# Open archive entry for writing, compressed on the pool instead of the calling thread.
+def open_entry(target_zip, zinfo: ZipInfo, pool: ThreadPoolExecutor, force_zip64: bool = False):
+    zinfo.compress_type = ZIP_DEFLATED
+
+    return DeflateWriter(target_zip, zinfo, pool, force_zip64)
+
+def extract_entry(catalog_path: str, file_path_zip: str, info: ZipInfo):
+    target_path = get_target_path(catalog_path, info.filename)
+
+    if info.is_dir():
+        makedirs(target_path, exist_ok=True)
+        return
+
+    makedirs(dirname(target_path), exist_ok=True)
+
+    # anything unusual is left for zipfile to handle
+    if info.compress_type not in [ZIP_DEFLATED, ZIP_STORED] or info.flag_bits & _MASK_ENCRYPTED:
+        with ZipFile(file_path_zip, 'r') as zip_file, zip_file.open(info) as source, open(target_path, 'wb') as target:
+            copyfileobj(source, target)
+        return
+
+    decompressor = decompressobj(-MAX_WBITS) if info.compress_type == ZIP_DEFLATED else None
+    crc = 0
+
+    with open(file_path_zip, 'rb') as fp, open(target_path, 'wb') as target:
+        for chunk in read_raw_entry(fp, info):
+            data = decompressor.decompress(chunk) if decompressor else chunk
+            crc = crc32(data, crc)
+            target.write(data)
+
+        if decompressor:
+            data = decompressor.flush()
+            crc = crc32(data, crc)
+            target.write(data)
+
+    if crc != info.CRC:
+        raise BadZipFile(f'Bad CRC-32 for file "{info.filename}"')
+
+# Same sanitization of member names as ZipFile.extract does
+def get_target_path(catalog_path: str, filename: str) -> str:
+    filename = splitdrive(filename.replace('\\', '/'))[1]
+    parts = [part for part in filename.split('/') if part not in ['', '.', '..']]
+
+    return join(catalog_path, *parts)
+
+def deflate_chunk(data: bytes, is_last: bool):
+    compressor = compressobj(COMPRESS_LEVEL, DEFLATED, -MAX_WBITS)
+    compressed = compressor.compress(data) + compressor.flush(Z_FINISH if is_last else Z_SYNC_FLUSH)
+
+    return compressed, crc32(data), len(data)
+
+# Write only file object - buffers data into CHUNK_SIZE chunks and compresses them on the pool.
+# Compressed chunks are written to the archive in order, as soon as they are ready.
+class DeflateWriter(BufferedIOBase):
+    def __init__(self, target_zip, zinfo: ZipInfo, pool: ThreadPoolExecutor, force_zip64: bool = False):
+        super().__init__()
+        self._zip = target_zip
+        self._zinfo = zinfo
+        self._pool = pool
+        self._buffer = bytearray()
+        self._pending = deque()
+
+        zinfo.CRC = 0
+        zinfo.compress_size = 0
+        self._file_size = zinfo.file_size
+        zinfo.file_size = 0
+
+        self._zip64 = begin_raw_entry(target_zip, zinfo, force_zip64 or self._file_size * 1.05 > ZIP64_LIMIT)
+
+    def writable(self):
+        return True
+
+    def write(self, data) -> int:
+        if self.closed:
+            raise ValueError('I/O operation on closed file.')
+
+        self._buffer += data
+
+        while len(self._buffer) > CHUNK_SIZE:
+            self._submit(bytes(self._buffer[:CHUNK_SIZE]), False)
+            del self._buffer[:CHUNK_SIZE]
+
+        return len(data)
+
+    def close(self):
+        if self.closed:
+            return
+
+        try:
+            self._submit(bytes(self._buffer), True)
+            self._buffer.clear()
+
+            while self._pending:
+                self._write_next()
+
+            end_raw_entry(self._zip, self._zinfo, self._zip64)
+        finally:
+            self._zip._writing = False
+            super().close()
+
+    def _submit(self, data: bytes, is_last: bool):
+        self._pending.append(self._pool.submit(deflate_chunk, data, is_last))
+
+        while len(self._pending) > WINDOW_SIZE:
+            self._write_next()
+
+    def _write_next(self):
+        compressed, crc, length = self._pending.popleft().result()
+
+        self._zip.fp.write(compressed)
+        self._zinfo.CRC = crc32_combine(self._zinfo.CRC, crc, length)
+        self._zinfo.compress_size += len(compressed)
+        self._zinfo.file_size += length
+
+# Port of zlib's crc32_combine - CRC of two concatenated byte sequences from CRC of each of them.
+# (not exposed by python's zlib module)
+def crc32_combine(crc1: int, crc2: int, length2: int) -> int:
+    if length2 <= 0:
+        return crc1
+
+    return gf2_matrix_times(crc32_zeros_operator(length2), crc1) ^ crc2
+
+# operator (32x32 bit matrix) which applied to a CRC, appends "length" zero bytes to its input.
+# all chunks except the last one have the same length, so in practice it's computed once.
+@lru_cache(maxsize=16)
+def crc32_zeros_operator(length: int) -> tuple:
+    # operator for one zero bit, CRC-32 polynomial in the first row
+    odd = [0xedb88320] + [1 << n for n in range(31)]
+    # two zero bits
+    even = gf2_matrix_square(odd)
+    # four zero bits
+    odd = gf2_matrix_square(even)
+
+    operator = [1 << n for n in range(32)]
+
+    # first square puts the operator for one zero byte (eight zero bits) in even
+    while True:
+        even = gf2_matrix_square(odd)
+        if length & 1:
+            operator = [gf2_matrix_times(even, column) for column in operator]
+        length >>= 1
+        if not length:
+            break
+
+        odd = gf2_matrix_square(even)
+        if length & 1:
+            operator = [gf2_matrix_times(odd, column) for column in operator]
+        length >>= 1
+        if not length:
+            break
+
+    return tuple(operator)
+
+def gf2_matrix_times(matrix, vector: int) -> int:
+    result = 0
+    idx = 0
+
+    while vector:
+        if vector & 1:
+            result ^= matrix[idx]
+        vector >>= 1
+        idx += 1
+
+    return result
+
+def gf2_matrix_square(matrix) -> list:
+    return [gf2_matrix_times(matrix, matrix[n]) for n in range(32)]
@@ -1,3 +1,5 @@
+from shlex import quote
+from os.path import abspath
 from subprocess import run
 
 from ...... import config
@@ -15,10 +17,11 @@ def archive(catalog_path: str, file_path_3mf: str):
     run_command(archive_cmd(catalog_path, file_path_3mf))
 
 def extract_cmd(catalog_path: str, file_path_zip: str):
-    return f'unzip {file_path_zip} -d {catalog_path}';
+    return f'unzip {quote(file_path_zip)} -d {quote(catalog_path)}';
 
+# recursively, without directory entries (3MF package has only files) - output path is resolved before changing directory
 def archive_cmd(catalog_path: str, file_path_3mf: str):
-    return f'cd {catalog_path} && zip {file_path_3mf} .';
+    return f'cd {quote(catalog_path)} && zip -r -D {quote(abspath(file_path_3mf))} .';
 
 def run_command(command: str):
     try:
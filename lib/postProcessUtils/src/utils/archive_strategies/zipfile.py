@@ -1,8 +1,8 @@
-from os import walk
-from os.path import join, relpath
-
+from shutil import copyfileobj
 from zipfile import ZipFile, ZIP_DEFLATED
 
+from ..zip_utils import file_entry_info, walk_catalog
+
 __all__ = [
     "extract",
     "archive",
@@ -12,11 +12,11 @@ def extract(catalog_path: str, file_path_zip: str):
     with ZipFile(file_path_zip, 'r') as zip_file:
         zip_file.extractall(path=catalog_path)
 
-def archive(catalog_path: str, file_path_3mf: str):
+def archive(catalog_path: str, file_path_3mf: str, deterministic: bool = False):
     with ZipFile(file_path_3mf, 'w', ZIP_DEFLATED, strict_timestamps=False) as zip_file:
-        for sub_catalog, _, files in walk(catalog_path):
-            for file in files:
-                file_path = join(sub_catalog, file)
-                arcname = relpath(file_path, catalog_path)
+        for file_path, arcname in walk_catalog(catalog_path, deterministic):
+            zinfo = file_entry_info(file_path, arcname, deterministic)
+            zinfo.compress_type = ZIP_DEFLATED
 
-                zip_file.write(file_path, arcname)
+            with open(file_path, 'rb') as source, zip_file.open(zinfo, 'w') as target:
+                copyfileobj(source, target)
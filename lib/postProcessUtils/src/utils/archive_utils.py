@@ -1,16 +1,27 @@
 import platform
+from os import remove
 from re import findall
 from time import time
-from os.path import join
+from os.path import join, exists
 from pathlib import PurePath
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from zipfile import ZipFile as ZipArchive, ZIP_DEFLATED, BadZipFile
 
 from ..... import config
 from ..errors import BusinessException, BusinessLogicException
-from .archive_strategies import Zip, ZipFile, Powershell
+from .archive_strategies import Zip, ZipFile, Powershell, Parallel
+from .zip_utils import copy_raw_entry, new_entry_info
 
 __all__ = [
     'extract_from_archive',
     'archive_as_3mf',
+    'rebuild_as_3mf',
+    'open_archive_entry',
+    'get_entry_size',
+    'get_catalog_path',
+    'get_processed_path',
+    'is_processed_path',
 ]
 
 SYSTEM_PLATFORM = platform.system().lower()
@@ -18,6 +29,13 @@ IS_WINDOWS = SYSTEM_PLATFORM == 'windows'
 IS_UNIX_LIKE = SYSTEM_PLATFORM in ['linux', 'darwin']
 
 def extract_from_archive(file_path_zip: str) -> str:
+    catalog_path = get_catalog_path(file_path_zip)
+
+    do_extract(catalog_path, file_path_zip)
+
+    return catalog_path
+
+def get_catalog_path(file_path_zip: str) -> str:
     ppath = PurePath(file_path_zip)
     if ppath.suffix not in ['.3mf', '.zip']:
         raise BusinessException(f'Unknown file extension, got: "{ppath.suffix}"')
@@ -26,15 +44,24 @@ def extract_from_archive(file_path_zip: str) -> str:
     if invalid_filename:
         ppath = PurePath(str(join(ppath.parent, f'export_{int(time())}.3mf')))
 
-    catalog_path = str(join(ppath.parent, ppath.stem))
+    return str(join(ppath.parent, ppath.stem))
 
-    do_extract(catalog_path, file_path_zip)
+PROCESSED_SUFFIX = '_processed.3mf'
 
-    return catalog_path
+def get_processed_path(catalog_path: str) -> str:
+    ppath = PurePath(catalog_path)
+
+    return str(join(ppath.parent, f'{ppath.stem}{PROCESSED_SUFFIX}'))
+
+# output of a previous post processing run
+def is_processed_path(path: str) -> bool:
+    return PurePath(path).name.endswith(PROCESSED_SUFFIX)
 
 def do_extract(catalog_path: str, file_path_zip: str):
     try:
-        if IS_WINDOWS:
+        if config.F__PARALLEL_ARCHIVE_STRATEGY:
+            return Parallel.extract(catalog_path, file_path_zip)
+        elif IS_WINDOWS:
             return Powershell.extract(catalog_path, file_path_zip)
         elif IS_UNIX_LIKE:
             return Zip.extract(catalog_path, file_path_zip)
@@ -49,17 +76,22 @@ def do_extract(catalog_path: str, file_path_zip: str):
 
         return ZipFile.extract(catalog_path, file_path_zip)
 
-def archive_as_3mf(catalog_path: str) -> str:
-    ppath = PurePath(catalog_path)
-    file_path_3mf = str(join(ppath.parent, f'{ppath.stem}_processed.3mf'))
+def archive_as_3mf(catalog_path: str, deterministic: bool = False) -> str:
+    file_path_3mf = get_processed_path(catalog_path)
+    remove_output(file_path_3mf)
 
-    do_archive(catalog_path, file_path_3mf)
+    do_archive(catalog_path, file_path_3mf, deterministic)
 
     return file_path_3mf
 
-def do_archive(catalog_path: str, file_path_3mf: str):
+def do_archive(catalog_path: str, file_path_3mf: str, deterministic: bool = False):
     try:
-        if IS_WINDOWS:
+        if config.F__PARALLEL_ARCHIVE_STRATEGY:
+            return Parallel.archive(catalog_path, file_path_3mf, deterministic)
+        elif deterministic:
+            # external archivers don't let us control entry order and timestamps
+            return ZipFile.archive(catalog_path, file_path_3mf, deterministic)
+        elif IS_WINDOWS:
             return Powershell.archive(catalog_path, file_path_3mf)
         elif IS_UNIX_LIKE:
             return Zip.archive(catalog_path, file_path_3mf)
@@ -70,4 +102,71 @@ def do_archive(catalog_path: str, file_path_3mf: str):
         if config.DEBUG:
             raise err
 
-        return ZipFile.archive(catalog_path, file_path_3mf)
+        return ZipFile.archive(catalog_path, file_path_3mf, deterministic)
+
+# Output of a previous run is replaced, never written through.
+def remove_output(file_path_3mf: str):
+    if exists(file_path_3mf):
+        remove(file_path_3mf)
+
+# Zip to zip processing, without extracting into a catalog.
+#
+# rebuild(source_zip, target_zip, pool=pool) writes the rewritten entries into the target archive (pool - see archive_pool),
+# every other entry from the source archive is copied as is (still compressed).
+# When deterministic, copied entries are sorted by name and followed by the rebuilt ones, in the order they are written.
+def rebuild_as_3mf(file_path_zip: str, rebuild, skip_entries, deterministic: bool = False) -> str:
+    file_path_3mf = get_processed_path(get_catalog_path(file_path_zip))
+    remove_output(file_path_3mf)
+
+    try:
+        with ZipArchive(file_path_zip, 'r') as source_zip, ZipArchive(file_path_3mf, 'w', ZIP_DEFLATED) as target_zip, archive_pool() as pool:
+            infos = source_zip.infolist()
+            if deterministic:
+                infos = sorted(infos, key=lambda info: info.filename)
+
+            for info in infos:
+                if info.filename not in skip_entries and not info.is_dir():
+                    copy_raw_entry(source_zip, target_zip, info, deterministic)
+
+            rebuild(source_zip, target_zip, pool=pool)
+    except BaseException as err:
+        if exists(file_path_3mf):
+            remove(file_path_3mf)
+
+        if isinstance(err, BadZipFile):
+            raise BusinessException(f'Unable to read archive "{file_path_zip}".\n\nOriginal message: "{err}"\n')
+        raise err
+
+    return file_path_3mf
+
+# Pool entries of an archive are compressed on (see open_archive_entry) - shared by all of them,
+# None when the parallel strategy is off.
+@contextmanager
+def archive_pool():
+    if not config.F__PARALLEL_ARCHIVE_STRATEGY:
+        yield None
+        return
+
+    with ThreadPoolExecutor(Parallel.WORKERS) as pool:
+        yield pool
+
+# open new entry in target archive for writing, compressed on the pool when given (see archive_pool)
+@contextmanager
+def open_archive_entry(target_zip, filename: str, deterministic: bool = False, pool: ThreadPoolExecutor = None):
+    zinfo = new_entry_info(target_zip, filename, deterministic)
+
+    if pool is None:
+        with target_zip.open(zinfo, 'w') as target:
+            yield target
+        return
+
+    with Parallel.open_entry(target_zip, zinfo, pool) as target:
+        yield target
+
+# uncompressed size (bytes) of an archive entry, read from the central directory only
+def get_entry_size(file_path_zip: str, filename: str) -> int:
+    try:
+        with ZipArchive(file_path_zip, 'r') as source_zip:
+            return source_zip.getinfo(filename).file_size
+    except (BadZipFile, KeyError) as err:
+        raise BusinessException(f'Unable to read "{filename}" from archive "{file_path_zip}".\n\nOriginal message: "{err}"\n')
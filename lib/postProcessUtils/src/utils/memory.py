@@ -0,0 +1,124 @@
+import re
+import sys
+import threading
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+__all__ = [
+    'current_rss',
+    'estimate_memory',
+    'parse_size',
+    'MemoryMonitor',
+]
+
+# Peak RSS per byte of (uncompressed) 3D model, while the whole model is loaded - parsed tree, serialization and ModelDict.
+# Measured on Fusion 360 exports (mostly meshes), lxml keeps noticeably more per element than xml.etree.
+MODEL_MEMORY_FACTOR = {
+    'stdlib': 13,
+    'lxml': 22,
+}
+# low_memory mode reads and writes the model in chunks - its memory doesn't depend on model size
+LOW_MEMORY_USAGE = 64 * 1024 ** 2
+
+SIZE_PATTERN = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([kmgt]?)i?b?\s*$', re.IGNORECASE)
+SIZE_UNITS = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3, 't': 1024 ** 4}
+
+# how often (seconds) MemoryMonitor samples RSS
+SAMPLE_INTERVAL = 0.05
+
+# bytes, None when it can't be read on this platform (without psutil - only Linux)
+def current_rss() -> int:
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+
+    try:
+        with open('/proc/self/statm', 'rb') as file:
+            return int(file.read().split()[1]) * resource.getpagesize()
+    except (OSError, AttributeError, IndexError, ValueError):
+        return None
+
+# peak RSS of the whole process so far - bytes, None on Windows
+def max_rss() -> int:
+    if resource is None:
+        return None
+
+    # kilobytes on Linux, bytes on macOS
+    value = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return value if sys.platform == 'darwin' else value * 1024
+
+# bytes needed (on top of what the process already uses) to process 3D model of model_size (uncompressed) bytes
+def estimate_memory(model_size: int, backend_name: str, low_memory: bool = False) -> int:
+    if low_memory:
+        return LOW_MEMORY_USAGE
+
+    return model_size * MODEL_MEMORY_FACTOR.get(backend_name, max(MODEL_MEMORY_FACTOR.values()))
+
+# "512M", "2G", "1.5GiB", "1048576" - bytes
+def parse_size(value: str) -> int:
+    match = SIZE_PATTERN.match(str(value))
+    if not match:
+        raise ValueError(f'Invalid size: "{value}", expected eg. 512M or 2G')
+
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).lower()])
+
+# Peak RSS of the process while within, sampled in a background thread.
+# Falls back to process peak RSS so far (ru_maxrss) where current RSS can't be read.
+#
+#   with MemoryMonitor() as monitor:
+#       ...
+#   monitor.peak, monitor.used
+class MemoryMonitor:
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        # bytes
+        self.peak = None
+        # RSS when entered (bytes), None when it can't be read
+        self.start = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def __enter__(self) -> 'MemoryMonitor':
+        self.sample()
+        self.start = self.peak
+
+        if self.peak is not None:
+            self._thread = threading.Thread(target=self.run, name='memory-monitor', daemon=True)
+            self._thread.start()
+
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+        self.sample()
+        if self.peak is None:
+            self.peak = max_rss()
+
+    # bytes used at the peak on top of RSS when entered - footprint of the work done within, None when it can't be measured.
+    # Memory freed by earlier work, but still held by the process, is reused without counting again (eg. in a warm worker).
+    @property
+    def used(self) -> int:
+        if self.start is None or self.peak is None:
+            return None
+
+        return self.peak - self.start
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        rss = current_rss()
+
+        if rss is not None:
+            self.peak = rss if self.peak is None else max(self.peak, rss)
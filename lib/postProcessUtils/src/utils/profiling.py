@@ -0,0 +1,219 @@
+import os
+import sys
+import json
+import pstats
+import cProfile
+import tracemalloc
+from time import perf_counter, process_time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+__all__ = [
+    'Report',
+    'collect_report',
+    'watch_stages',
+    'stage',
+]
+
+REPORT_VERSION = 1
+
+# report collected in the current thread (or task), None - stages aren't measured at all
+_active_report: ContextVar = ContextVar('post_process_report', default=None)
+# called with the name of every stage as it starts, see watch_stages
+_stage_listener: ContextVar = ContextVar('post_process_stage_listener', default=None)
+
+class StageReport:
+    def __init__(self, name: str, depth: int = 0, bytes_in=None):
+        self.name = name
+        # nesting level, 0 - top level stage
+        self.depth = depth
+        # seconds
+        self.wall_time = None
+        # seconds, of the whole process (including other threads)
+        self.cpu_time = None
+        # either bytes, path of a file or catalog (read when the stage starts), or file object (position when the stage ends)
+        self.bytes_in = size_of(bytes_in) if isinstance(bytes_in, str) else bytes_in
+        self.bytes_out = None
+        # bytes, see Report.memory
+        self.peak_memory = None
+
+    def as_dict(self) -> dict:
+        return {
+            'name': self.name,
+            'depth': self.depth,
+            'wall_time': self.wall_time,
+            'cpu_time': self.cpu_time,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'peak_memory': self.peak_memory,
+        }
+
+# stage written to when no report is collected
+_discarded_stage = StageReport('')
+
+# Stages measured during processing, in order they've started.
+#
+# Peak memory of a stage is either:
+#   - "tracemalloc" (trace_memory) - peak of memory allocated by Python during the stage, tracing slows processing down considerably,
+#   - "max_rss" - peak resident set size of the process so far (not available on Windows).
+#
+# profile_stage - name of stage run under cProfile (eg. "parse", "write"), in the thread it's started in.
+class Report:
+    def __init__(self, trace_memory: bool = False, profile_stage: str = None):
+        self.trace_memory = trace_memory
+        self.profile_stage = profile_stage
+        # anything describing processed input (eg. its path and options), written as is
+        self.info: dict = {}
+        self.stages: list[StageReport] = []
+        self.profiler = None
+        self.memory = 'tracemalloc' if trace_memory else ('max_rss' if resource else None)
+        # stages started and not yet finished
+        self._open_stages = 0
+        # peak memory of enclosing stages, tracemalloc peak is reset at the start of every stage
+        self._peaks: list[int] = []
+
+    def as_dict(self) -> dict:
+        return {
+            'version': REPORT_VERSION,
+            'memory': self.memory,
+            'profile_stage': self.profile_stage,
+            'info': self.info,
+            'stages': [stage_report.as_dict() for stage_report in self.stages],
+        }
+
+    def write(self, path: str):
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(self.as_dict(), file, indent=2)
+            file.write('\n')
+
+    # path - file for pstats / snakeviz, otherwise top entries are printed
+    def dump_profile(self, path: str = None, limit: int = 30):
+        if self.profiler is None:
+            return
+
+        if path:
+            self.profiler.dump_stats(path)
+            return
+
+        pstats.Stats(self.profiler, stream=sys.stderr).sort_stats('cumulative').print_stats(limit)
+
+    def measure_memory_start(self):
+        if self.memory != 'tracemalloc':
+            return
+
+        if self._peaks:
+            self._peaks[-1] = max(self._peaks[-1], tracemalloc.get_traced_memory()[1])
+        self._peaks.append(0)
+        tracemalloc.reset_peak()
+
+    def measure_memory_end(self) -> int:
+        if self.memory == 'max_rss':
+            # kilobytes on Linux, bytes on macOS
+            max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+        if self.memory != 'tracemalloc':
+            return None
+
+        peak = max(self._peaks.pop(), tracemalloc.get_traced_memory()[1])
+        if self._peaks:
+            self._peaks[-1] = max(self._peaks[-1], peak)
+
+        return peak
+
+# Measures stages (see stage) run within, in the current thread.
+#
+#   with collect_report() as report:
+#       process_file(path)
+#   report.as_dict()
+@contextmanager
+def collect_report(trace_memory: bool = False, profile_stage: str = None):
+    report = Report(trace_memory, profile_stage)
+    token = _active_report.set(report)
+    started_tracing = trace_memory and not tracemalloc.is_tracing()
+
+    if started_tracing:
+        tracemalloc.start()
+
+    try:
+        yield report
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+        _active_report.reset(token)
+
+# listener(stage name) is called whenever a stage starts within, in the current thread - eg. to report progress.
+# An exception raised by the listener (eg. ProcessCancelledException) stops processing before the stage runs.
+@contextmanager
+def watch_stages(listener):
+    token = _stage_listener.set(listener)
+
+    try:
+        yield
+    finally:
+        _stage_listener.reset(token)
+
+# Named stage of processing - wall and cpu time, bytes in and out and peak memory.
+# Does nothing (besides lookups) unless a report is collected or stages are watched.
+#
+#   with stage('extract', bytes_in=path) as current:
+#       catalog_path = ...
+#       current.bytes_out = catalog_path
+@contextmanager
+def stage(name: str, bytes_in=None):
+    listener = _stage_listener.get()
+    if listener is not None:
+        listener(name)
+
+    report: Report = _active_report.get()
+
+    if report is None:
+        yield _discarded_stage
+        return
+
+    current = StageReport(name, report._open_stages, bytes_in)
+    report.stages.append(current)
+    report._open_stages += 1
+
+    profiler = None
+    if name == report.profile_stage:
+        profiler = report.profiler = report.profiler or cProfile.Profile()
+
+    report.measure_memory_start()
+    cpu_start = process_time()
+    wall_start = perf_counter()
+    if profiler:
+        profiler.enable()
+
+    try:
+        yield current
+    finally:
+        if profiler:
+            profiler.disable()
+        current.wall_time = perf_counter() - wall_start
+        current.cpu_time = process_time() - cpu_start
+        current.peak_memory = report.measure_memory_end()
+        report._open_stages -= 1
+        current.bytes_in = size_of(current.bytes_in)
+        current.bytes_out = size_of(current.bytes_out)
+
+# bytes, path of a file or catalog, or file object (its position)
+def size_of(value) -> int:
+    if value is None or isinstance(value, int):
+        return value
+
+    if isinstance(value, str):
+        if os.path.isdir(value):
+            return sum(os.path.getsize(os.path.join(dir_path, file_name)) for dir_path, _, file_names in os.walk(value) for file_name in file_names)
+
+        return os.path.getsize(value) if os.path.isfile(value) else None
+
+    try:
+        return value.tell()
+    except (AttributeError, OSError, ValueError):
+        return None
@@ -1,16 +1,181 @@
-import xml.etree.ElementTree as ET
+import os
+import re
+import warnings
+from functools import lru_cache
+import xml.etree.ElementTree as StdlibET
+
+try:
+    from lxml import etree as LxmlET
+except ImportError:
+    LxmlET = None
 
 __all__ = [
     'ET',
     'ns',
+    'ns_name',
+    'xml_backend',
+    'set_xml_backend',
 ]
 
-ET.register_namespace('', 'http://schemas.microsoft.com/3dmanufacturing/core/2015/02')
-ET.register_namespace('m', 'http://schemas.microsoft.com/3dmanufacturing/material/2015/02')
-ET.register_namespace('p', 'http://schemas.microsoft.com/3dmanufacturing/production/2015/06')
-
 ns = {
     'core': 'http://schemas.microsoft.com/3dmanufacturing/core/2015/02',
     'material': 'http://schemas.microsoft.com/3dmanufacturing/material/2015/02',
     'production': 'http://schemas.microsoft.com/3dmanufacturing/production/2015/06',
 }
+
+# prefixes used when writing documents
+prefixes = {
+    'core': '',
+    'material': 'm',
+    'production': 'p',
+}
+
+# backend used unless set otherwise: "auto" (lxml when installed), "lxml" or "stdlib"
+XML_BACKEND_ENV = 'POST_PROCESS_XML_BACKEND'
+
+# qualified name in "{namespace}name" notation understood by both backends, eg. ns_name('production', 'UUID')
+def ns_name(namespace: str, name: str) -> str:
+    return f'{{{ns[namespace]}}}{name}'
+
+# Default - xml.etree.ElementTree
+class StdlibBackend:
+    name = 'stdlib'
+
+    def __init__(self):
+        self.etree = StdlibET
+
+        for namespace, prefix in prefixes.items():
+            StdlibET.register_namespace(prefix, ns[namespace])
+
+    def parse(self, source):
+        return StdlibET.parse(source)
+
+    # target is either a file path or binary file object
+    def write(self, tree, target):
+        tree.write(target, xml_declaration=True, encoding='UTF-8')
+
+    def find(self, element, path: str):
+        return element.find(path, ns)
+
+    def findall(self, element, path: str) -> list:
+        return element.findall(path, ns)
+
+# Fast path - lxml (C parser, compiled XPath, C serializer).
+#
+# Output is normalized to be byte for byte the same as ElementTree's:
+#   - comments and processing instructions are dropped while parsing,
+#   - unused namespace declarations are removed and the used ones sorted by prefix,
+#   - empty elements are closed with " />",
+#   - tab in attribute value is written as "&#09;".
+class LxmlBackend:
+    name = 'lxml'
+
+    def __init__(self):
+        self.etree = LxmlET
+        # 3MF meshes are easily above libxml2 default limits
+        self.parser = LxmlET.XMLParser(remove_comments=True, remove_pis=True, huge_tree=True)
+
+        # prefixes (and default namespace) of parsed documents are kept as they are,
+        # registered ones are only used by elements created in another namespace.
+        for namespace, prefix in prefixes.items():
+            if prefix:
+                LxmlET.register_namespace(prefix, ns[namespace])
+
+    def parse(self, source):
+        return LxmlET.parse(source, self.parser)
+
+    def write(self, tree, target):
+        LxmlET.cleanup_namespaces(tree)
+
+        data = LxmlET.tostring(tree, xml_declaration=True, encoding='UTF-8')
+        # text and attribute values can't hold a raw ">" - every "/>" is an end of an empty element
+        data = sort_root_namespaces(data.replace(b'/>', b' />').replace(b'&#9;', b'&#09;'))
+
+        if hasattr(target, 'write'):
+            target.write(data)
+            return
+
+        with open(target, 'wb') as file:
+            file.write(data)
+
+    def find(self, element, path: str):
+        return next(iter(self.xpath(path)(element)), None)
+
+    def findall(self, element, path: str) -> list:
+        return self.xpath(path)(element)
+
+    # ElementPath expressions used in this package are valid XPath as well
+    @lru_cache(maxsize=None)
+    def xpath(self, path: str):
+        return LxmlET.XPath(path, namespaces=ns)
+
+ROOT_TAG_PATTERN = re.compile(rb'<(?![?!])[^>]*>')
+NAMESPACE_DECLARATION_PATTERN = re.compile(rb'\sxmlns(?::([^\s=]+))?="[^"]*"')
+
+# ElementTree writes namespace declarations on the root element, sorted by prefix.
+def sort_root_namespaces(data: bytes) -> bytes:
+    match = ROOT_TAG_PATTERN.search(data)
+    if not match:
+        return data
+
+    root_tag = match.group(0)
+    declarations = sorted(NAMESPACE_DECLARATION_PATTERN.finditer(root_tag), key=lambda m: m.group(1) or b'')
+    if len(declarations) < 2:
+        return data
+
+    rest = NAMESPACE_DECLARATION_PATTERN.sub(b'', root_tag)
+    name_end = re.match(rb'<[^\s/>]+', rest).end()
+
+    sorted_tag = rest[:name_end] + b''.join(m.group(0) for m in declarations) + rest[name_end:]
+
+    return data[:match.start()] + sorted_tag + data[match.end():]
+
+_backends = {
+    'stdlib': StdlibBackend,
+    'lxml': LxmlBackend,
+}
+
+def create_xml_backend(name: str = 'auto'):
+    if name == 'auto':
+        name = 'lxml' if LxmlET is not None else 'stdlib'
+
+    if name not in _backends:
+        raise ValueError(f'Unknown XML backend "{name}", expected one of: auto, {", ".join(_backends)}')
+    if name == 'lxml' and LxmlET is None:
+        raise ValueError('XML backend "lxml" selected, but lxml is not installed')
+
+    return _backends[name]()
+
+# Backend named by the environment variable - a bad value mustn't break importing the add-in, it's reported and the
+# default is used. Explicit selection (set_xml_backend, --xml-backend) raises instead.
+def create_default_xml_backend():
+    name = os.environ.get(XML_BACKEND_ENV, 'auto')
+
+    try:
+        return create_xml_backend(name)
+    except ValueError as err:
+        warnings.warn(f'{err} (set by {XML_BACKEND_ENV}), using "auto" instead', RuntimeWarning)
+        return create_xml_backend('auto')
+
+_backend = create_default_xml_backend()
+
+def set_xml_backend(name: str):
+    global _backend
+    _backend = create_xml_backend(name)
+
+    return _backend
+
+# Both are imported by name into other modules - they resolve against the currently selected backend on every use.
+#
+# xml_backend.<name> - parse, write, find, findall
+class BackendProxy:
+    def __getattr__(self, name: str):
+        return getattr(_backend, name)
+
+# ET.<name> - Element, SubElement, ElementTree...
+class EtreeProxy:
+    def __getattr__(self, name: str):
+        return getattr(_backend.etree, name)
+
+xml_backend = BackendProxy()
+ET = EtreeProxy()
@@ -0,0 +1,224 @@
+import mmap
+from os import walk
+from os.path import join, relpath
+from time import time, localtime
+from struct import unpack
+from contextlib import contextmanager
+from zipfile import ZipInfo, BadZipFile, ZIP64_LIMIT, ZIP_STORED, sizeFileHeader, structFileHeader, stringFileHeader
+
+__all__ = [
+    'new_entry_info',
+    'file_entry_info',
+    'walk_catalog',
+    'copy_raw_entry',
+    'read_raw_entry',
+    'write_raw_entry',
+    'begin_raw_entry',
+    'end_raw_entry',
+    'open_entry_source',
+    'MappedEntry',
+]
+
+CHUNK_SIZE = 1024 * 1024
+
+# general purpose flags - entry is encrypted; CRC and sizes are stored in a data descriptor following the data.
+_MASK_ENCRYPTED = 1 << 0
+_MASK_USE_DATA_DESCRIPTOR = 1 << 3
+
+# indexes of the name and extra field lengths in the unpacked local file header.
+_FH_FILENAME_LENGTH = 10
+_FH_EXTRA_FIELD_LENGTH = 11
+
+# deterministic archives - earliest timestamp zip format can hold, regular rw-r--r-- file made on unix
+FIXED_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+FIXED_EXTERNAL_ATTR = 0o100644 << 16
+FIXED_CREATE_SYSTEM = 3
+
+# ZipInfo for a new entry, written with archive's default compression
+def new_entry_info(target_zip, filename: str, deterministic: bool = False) -> ZipInfo:
+    zinfo = ZipInfo(filename, FIXED_DATE_TIME if deterministic else localtime(time())[:6])
+    zinfo.compress_type = target_zip.compression
+
+    if deterministic:
+        fix_entry_info(zinfo)
+
+    return zinfo
+
+# ZipInfo for a file on disk, same as ZipInfo.from_file
+def file_entry_info(file_path: str, arcname: str, deterministic: bool = False) -> ZipInfo:
+    zinfo = ZipInfo.from_file(file_path, arcname, strict_timestamps=False)
+
+    if deterministic:
+        zinfo.date_time = FIXED_DATE_TIME
+        fix_entry_info(zinfo)
+
+    return zinfo
+
+def fix_entry_info(zinfo: ZipInfo):
+    zinfo.external_attr = FIXED_EXTERNAL_ATTR
+    zinfo.create_system = FIXED_CREATE_SYSTEM
+
+# (file path, archive name) of every file in a catalog.
+# File system order, which differs between machines and runs - or sorted by archive name when deterministic.
+def walk_catalog(catalog_path: str, deterministic: bool = False) -> list[tuple[str, str]]:
+    files = []
+
+    for sub_catalog, _, file_names in walk(catalog_path):
+        for file_name in file_names:
+            file_path = join(sub_catalog, file_name)
+            files.append((file_path, relpath(file_path, catalog_path).replace('\\', '/')))
+
+    if deterministic:
+        files.sort(key=lambda file: file[1])
+
+    return files
+
+# Copy archive entry without decompressing and compressing it again.
+# The compressed bytes are moved as is, together with its CRC and sizes.
+def copy_raw_entry(source_zip, target_zip, info: ZipInfo, deterministic: bool = False):
+    zinfo = ZipInfo(info.filename, FIXED_DATE_TIME if deterministic else info.date_time)
+    zinfo.compress_type = info.compress_type
+    zinfo.create_system = info.create_system
+    zinfo.external_attr = info.external_attr
+    zinfo.internal_attr = info.internal_attr
+    zinfo.flag_bits = info.flag_bits & ~_MASK_USE_DATA_DESCRIPTOR
+    zinfo.CRC = info.CRC
+    zinfo.compress_size = info.compress_size
+    zinfo.file_size = info.file_size
+
+    if deterministic:
+        fix_entry_info(zinfo)
+
+    write_raw_entry(target_zip, zinfo, read_raw_entry(source_zip.fp, info))
+
+# yields compressed data of an entry in chunks, fp is the opened archive file
+def read_raw_entry(fp, info: ZipInfo, chunk_size: int = CHUNK_SIZE):
+    fp.seek(entry_data_offset(fp, info))
+
+    remaining = info.compress_size
+    while remaining > 0:
+        chunk = fp.read(min(chunk_size, remaining))
+        if not chunk:
+            raise BadZipFile(f'Truncated data of "{info.filename}"')
+
+        remaining -= len(chunk)
+        yield chunk
+
+# offset of entry data in the archive file - right after its local file header
+def entry_data_offset(fp, info: ZipInfo) -> int:
+    fp.seek(info.header_offset)
+
+    header = fp.read(sizeFileHeader)
+    if len(header) != sizeFileHeader:
+        raise BadZipFile(f'Truncated file header of "{info.filename}"')
+
+    fields = unpack(structFileHeader, header)
+    if fields[0] != stringFileHeader:
+        raise BadZipFile(f'Bad magic number for file header of "{info.filename}"')
+
+    # skip file name and extra field
+    return info.header_offset + sizeFileHeader + fields[_FH_FILENAME_LENGTH] + fields[_FH_EXTRA_FIELD_LENGTH]
+
+# Binary file object with the (uncompressed) content of an archive entry, for reading.
+# Stored entries are memory mapped - read straight from the page cache, without decompression, CRC checks or copying
+# through the archive's file object (see MappedEntry). Compressed and encrypted entries are opened as usual.
+@contextmanager
+def open_entry_source(source_zip, filename: str):
+    info = source_zip.getinfo(filename)
+
+    if info.compress_type != ZIP_STORED or info.flag_bits & _MASK_ENCRYPTED or info.file_size == 0 or not hasattr(source_zip.fp, 'fileno'):
+        with source_zip.open(info) as source:
+            yield source
+        return
+
+    start = entry_data_offset(source_zip.fp, info)
+
+    with mmap.mmap(source_zip.fp.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        if start + info.file_size > len(mapped):
+            raise BadZipFile(f'Truncated data of "{info.filename}"')
+
+        yield MappedEntry(mapped, start, info.file_size)
+
+# read only view of a memory mapped archive entry
+class MappedEntry:
+    def __init__(self, mapped, start: int, size: int):
+        self.mapped = mapped
+        # absolute offsets of entry data in the archive
+        self.start = start
+        self.end = start + size
+        self.pos = start
+
+    def read(self, size: int = -1) -> bytes:
+        end = self.end if size is None or size < 0 else min(self.pos + size, self.end)
+        data = self.mapped[self.pos:end]
+        self.pos = end
+
+        return data
+
+    def tell(self) -> int:
+        return self.pos - self.start
+
+    def seek(self, offset: int):
+        self.pos = min(self.start + offset, self.end)
+
+    # Move right past the next occurrence of marker, searched in place - the skipped bytes are never copied.
+    # Returns False (at the end of the entry) when there is no marker.
+    def skip_until(self, marker: bytes) -> bool:
+        idx = self.mapped.find(marker, self.pos, self.end)
+        if idx == -1:
+            self.pos = self.end
+            return False
+
+        self.pos = idx + len(marker)
+        return True
+
+# Write already compressed data as a new archive entry.
+# zinfo must have compress_type, CRC, compress_size and file_size set by the time all chunks are written.
+def write_raw_entry(target_zip, zinfo: ZipInfo, chunks):
+    zip64 = begin_raw_entry(target_zip, zinfo)
+
+    for chunk in chunks:
+        target_zip.fp.write(chunk)
+
+    end_raw_entry(target_zip, zinfo, zip64)
+
+# Mirrors what ZipFile.open(..., 'w') does, minus the compressor.
+# Between begin_raw_entry and end_raw_entry the compressed data is written directly into target_zip.fp
+def begin_raw_entry(target_zip, zinfo: ZipInfo, force_zip64: bool = False) -> bool:
+    if target_zip._writing:
+        raise ValueError("Can't write to the ZIP file while there is another write handle open on it.")
+
+    # compressed size can be larger than uncompressed size
+    zip64 = force_zip64 or zinfo.file_size * 1.05 > ZIP64_LIMIT or zinfo.compress_size > ZIP64_LIMIT
+
+    if not zinfo.external_attr:
+        zinfo.external_attr = 0o600 << 16  # permissions: ?rw-------
+
+    if target_zip._seekable:
+        target_zip.fp.seek(target_zip.start_dir)
+    zinfo.header_offset = target_zip.fp.tell()
+
+    target_zip._writecheck(zinfo)
+    target_zip._didModify = True
+
+    target_zip.fp.write(zinfo.FileHeader(zip64))
+    target_zip._writing = True
+
+    return zip64
+
+def end_raw_entry(target_zip, zinfo: ZipInfo, zip64: bool):
+    try:
+        if not zip64 and (zinfo.file_size > ZIP64_LIMIT or zinfo.compress_size > ZIP64_LIMIT):
+            raise RuntimeError(f'Entry "{zinfo.filename}" too large, try using force_zip64')
+
+        target_zip.start_dir = target_zip.fp.tell()
+
+        # CRC and sizes might not have been known upfront - write file header again.
+        target_zip.fp.seek(zinfo.header_offset)
+        target_zip.fp.write(zinfo.FileHeader(zip64))
+        target_zip.fp.seek(target_zip.start_dir)
+
+        target_zip.filelist.append(zinfo)
+        target_zip.NameToInfo[zinfo.filename] = zinfo
+    finally:
+        target_zip._writing = False
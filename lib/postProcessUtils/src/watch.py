@@ -0,0 +1,251 @@
+import os
+from queue import Queue, Empty
+from threading import Event
+from time import monotonic
+from os.path import abspath, exists, getmtime
+from concurrent.futures.process import BrokenProcessPool
+
+from . import batch
+from .utils import is_processed_path
+from .utils.archive_utils import get_catalog_path, get_processed_path
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+__all__ = [
+    'watch_folders',
+    'FolderWatcher',
+]
+
+# file is considered complete once its size and mtime didn't change for that long (seconds)
+SETTLE_TIME = 0.5
+# how often growing files are checked
+TICK = 0.1
+# full scan of watched folders - when filesystem notifications are not available
+POLL_INTERVAL = 1.0
+# full scan of watched folders - safety net for missed notifications (eg. on network shares)
+RESCAN_INTERVAL = 30.0
+# a file is processed (alone) that many times at most when its worker keeps dying (eg. killed by the OS running out of memory)
+MAX_ATTEMPTS = 3
+
+# Post process 3MF files as they land in the watched folders (recursively), until stopped.
+# on_result(BatchResult) is called for every processed file, by default the result is printed.
+def watch_folders(folders: list[str], workers: int = None, stop_event: Event = None, on_result=None, use_notifications: bool = True, settle_time: float = SETTLE_TIME, poll_interval: float = POLL_INTERVAL, **options):
+    watcher = FolderWatcher(folders, workers, on_result, use_notifications, settle_time, poll_interval, options)
+
+    try:
+        watcher.run(stop_event or Event())
+    except KeyboardInterrupt:
+        pass
+
+def is_watched_file(path: str) -> bool:
+    return path.endswith('.3mf') and not is_processed_path(path)
+
+# (size, mtime) of a file or None when it's gone
+def get_signature(path: str):
+    try:
+        stat = os.stat(path)
+        return (stat.st_size, stat.st_mtime_ns)
+    except OSError:
+        return None
+
+# processed output exists and is not older than the input
+def is_up_to_date(path: str) -> bool:
+    try:
+        output_path = get_processed_path(get_catalog_path(path))
+        return exists(output_path) and getmtime(output_path) >= getmtime(path)
+    except Exception:
+        return False
+
+def scan_tree(folder: str) -> dict:
+    signatures = {}
+    catalogs = [folder]
+
+    while catalogs:
+        try:
+            with os.scandir(catalogs.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        catalogs.append(entry.path)
+                    elif entry.is_file() and is_watched_file(entry.name):
+                        stat = entry.stat()
+                        signatures[entry.path] = (stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            # catalog removed while scanning, no access...
+            pass
+
+    return signatures
+
+class ChangesHandler(FileSystemEventHandler):
+    def __init__(self, changes: Queue):
+        super().__init__()
+        self.changes = changes
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+
+        for path in [getattr(event, 'src_path', None), getattr(event, 'dest_path', None)]:
+            if path and is_watched_file(path):
+                self.changes.put(path)
+
+class FolderWatcher:
+    def __init__(self, folders: list[str], workers: int, on_result, use_notifications: bool, settle_time: float, poll_interval: float, options: dict):
+        self.folders = [abspath(folder) for folder in folders]
+        self.workers = workers
+        self.on_result = on_result or (lambda result: print(batch.format_result(result), flush=True))
+        self.use_notifications = use_notifications and Observer is not None
+        self.settle_time = settle_time
+        self.poll_interval = poll_interval
+        self.options = options
+
+        # path -> [signature, time since which it stayed the same]
+        self.candidates = {}
+        # path -> signature at the time it was processed (or found up to date)
+        self.processed = {}
+        # future -> (path, signature)
+        self.running = {}
+        # files running when the pool broke - retried one at a time, see restart_pool
+        self.suspects = set()
+        # path -> times the pool broke while the file was processed alone
+        self.attempts = {}
+        self.pool = None
+
+        self.changes = Queue()
+
+    def run(self, stop_event: Event):
+        observer = self.start_observer()
+        scan_interval = RESCAN_INTERVAL if observer else self.poll_interval
+
+        self.pool = batch.create_pool(self.workers)
+
+        try:
+            self.scan(initial=True)
+            last_scan = monotonic()
+
+            while not stop_event.is_set():
+                if monotonic() - last_scan >= scan_interval:
+                    self.scan()
+                    last_scan = monotonic()
+
+                self.drain_changes()
+
+                try:
+                    self.submit_settled()
+                    self.collect_finished()
+                except BrokenProcessPool:
+                    self.restart_pool()
+
+                stop_event.wait(TICK)
+        finally:
+            self.pool.shutdown(wait=True, cancel_futures=True)
+            if observer:
+                observer.stop()
+                observer.join()
+
+    def start_observer(self):
+        if not self.use_notifications:
+            return None
+
+        observer = Observer()
+        for folder in self.folders:
+            observer.schedule(ChangesHandler(self.changes), folder, recursive=True)
+        observer.start()
+
+        return observer
+
+    def scan(self, initial: bool = False):
+        for folder in self.folders:
+            for path, signature in scan_tree(folder).items():
+                if initial and is_up_to_date(path):
+                    self.processed[path] = signature
+                else:
+                    self.add_candidate(path, signature)
+
+    def drain_changes(self):
+        while True:
+            try:
+                path = self.changes.get_nowait()
+            except Empty:
+                return
+
+            self.add_candidate(path, get_signature(path))
+
+    def add_candidate(self, path: str, signature):
+        if signature is None or self.processed.get(path) == signature or path in self.candidates:
+            return
+        # already being processed in that version
+        if (path, signature) in self.running.values():
+            return
+
+        self.candidates[path] = [signature, monotonic()]
+
+    # submit files which stopped growing
+    def submit_settled(self):
+        running_paths = [path for path, _signature in self.running.values()]
+
+        # a suspect runs alone
+        if any(path in self.suspects for path in running_paths):
+            return
+
+        for path, (signature, since) in list(self.candidates.items()):
+            current = get_signature(path)
+
+            if current is None:
+                del self.candidates[path]
+            elif current != signature:
+                self.candidates[path] = [current, monotonic()]
+            elif monotonic() - since >= self.settle_time and path not in running_paths:
+                is_suspect = path in self.suspects
+                if is_suspect and self.running:
+                    continue
+
+                # stays a candidate when the pool is broken, see restart_pool
+                future = self.pool.submit(batch.process_file_safely, path, self.options)
+                del self.candidates[path]
+                self.running[future] = (path, signature)
+
+                if is_suspect:
+                    return
+
+    # raises BrokenProcessPool when a worker died, files being processed are then retried by restart_pool
+    def collect_finished(self):
+        for future in [future for future in self.running if future.done()]:
+            result = future.result()
+            path, signature = self.running.pop(future)
+            self.attempts.pop(path, None)
+            self.suspects.discard(path)
+
+            # a failed file is retried only once it changes again
+            self.processed[path] = signature
+            self.on_result(result)
+
+    # A worker died and took the pool down with it - the watcher goes on with a new pool.
+    # It's not known which of the files being processed killed it, they are all retried one at a time (as suspects),
+    # only a file which breaks the pool while processed alone counts an attempt.
+    def restart_pool(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        self.pool = batch.create_pool(self.workers)
+
+        alone = len(self.running) == 1
+        for path, signature in list(self.running.values()):
+            self.retry(path, signature, alone)
+        self.running.clear()
+
+    def retry(self, path: str, signature, alone: bool):
+        self.suspects.add(path)
+        if alone:
+            self.attempts[path] = self.attempts.get(path, 0) + 1
+
+        if self.attempts.get(path, 0) < MAX_ATTEMPTS:
+            self.candidates[path] = [signature, monotonic()]
+            return
+
+        del self.attempts[path]
+        self.suspects.discard(path)
+        self.processed[path] = signature
+        self.on_result(batch.BatchResult(path, 'failed', error=f'Worker process terminated abruptly, {MAX_ATTEMPTS} times in a row'))
@@ -0,0 +1,17 @@
+import sys
+import importlib
+from os.path import dirname, basename, abspath
+
+import pytest
+
+# The add-in is imported as a package named after its catalog - post processing reaches its config.py with relative imports.
+ADDIN_ROOT = dirname(dirname(abspath(__file__)))
+ADDIN_NAME = basename(ADDIN_ROOT)
+
+if dirname(ADDIN_ROOT) not in sys.path:
+    sys.path.insert(0, dirname(ADDIN_ROOT))
+
+# module of the add-in by its path within, eg. addin_module('lib.postProcessUtils.src.handle')
+@pytest.fixture(scope='session')
+def addin_module():
+    return lambda name: importlib.import_module(f'{ADDIN_NAME}.{name}')
@@ -0,0 +1,18 @@
+import os
+
+import pytest
+
+@pytest.fixture(scope='module')
+def batch(addin_module):
+    return addin_module('lib.postProcessUtils.src.batch')
+
+def test_collect_input_paths_lists_every_file_once(batch, tmp_path, monkeypatch):
+    (tmp_path / 'nested').mkdir()
+    for name in ['a.3mf', 'b.3mf', 'a_processed.3mf', 'nested/c.3mf', 'notes.txt']:
+        (tmp_path / name).write_bytes(b'')
+
+    monkeypatch.chdir(tmp_path)
+
+    paths = batch.collect_input_paths(['a.3mf', str(tmp_path), './a.3mf', '*.3mf', os.path.join('nested', '..', 'b.3mf')])
+
+    assert paths == ['a.3mf', str(tmp_path / 'b.3mf'), str(tmp_path / 'nested' / 'c.3mf')]
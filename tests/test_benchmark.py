@@ -0,0 +1,30 @@
+import json
+
+import pytest
+
+@pytest.fixture(scope='module')
+def harness(addin_module):
+    return addin_module('lib.postProcessUtils.src.benchmark.harness')
+
+def test_benchmark_runs_small_size(harness, tmp_path, capsys):
+    results_path = tmp_path / 'results.json'
+
+    harness.main(['--sizes', 'small', '--repeat', '1', '--save', str(results_path)])
+
+    results = json.loads(results_path.read_text(encoding='utf-8'))
+    assert results['version'] == harness.BASELINE_VERSION
+    assert list(results['results']) == ['small']
+    assert {'extract', 'build_model_components', 'create_model_settings', 'archive', *harness.MODES} == set(results['results']['small'])
+    assert 'small:' in capsys.readouterr().out
+
+    # against its own results (with a generous threshold) nothing regresses, against zero timings every stage past the noise does
+    harness.main(['--sizes', 'small', '--repeat', '1', '--baseline', str(results_path), '--threshold', '100'])
+
+    for timings in results['results'].values():
+        for name in timings:
+            timings[name] = 0
+    results_path.write_text(json.dumps(results), encoding='utf-8')
+
+    with pytest.raises(SystemExit) as exit_info:
+        harness.main(['--sizes', 'small', '--repeat', '1', '--baseline', str(results_path)])
+    assert exit_info.value.code == 1
@@ -0,0 +1,105 @@
+import os
+from zipfile import ZipFile, ZipInfo, ZIP_STORED
+
+import pytest
+
+from test_low_memory import make_export
+
+@pytest.fixture(scope='module')
+def handle(addin_module):
+    return addin_module('lib.postProcessUtils.src.handle')
+
+@pytest.fixture(scope='module')
+def cache(addin_module):
+    return addin_module('lib.postProcessUtils.src.cache')
+
+@pytest.fixture
+def cache_dir(cache, monkeypatch, tmp_path):
+    path = tmp_path / 'cache'
+    monkeypatch.setenv(cache.CACHE_DIR_ENV, str(path))
+    return path
+
+# counts runs of the pipeline - a cache hit doesn't run it
+@pytest.fixture
+def pipeline_runs(handle, monkeypatch):
+    runs = []
+    run_pipeline = handle.run_pipeline
+
+    def counted(path, options):
+        runs.append(path)
+        return run_pipeline(path, options)
+
+    monkeypatch.setattr(handle, 'run_pipeline', counted)
+    return runs
+
+def test_same_export_hits_the_cache(handle, cache_dir, pipeline_runs, tmp_path):
+    export_path = tmp_path / 'export.3mf'
+    make_export(export_path)
+
+    first = open(handle.process_file(str(export_path), cache=True, deterministic=True), 'rb').read()
+
+    # re-exported - other entry order, compression and timestamps
+    reexport_path = tmp_path / 'reexport.3mf'
+    with ZipFile(export_path, 'r') as source_zip, ZipFile(reexport_path, 'w') as target_zip:
+        for info in reversed(source_zip.infolist()):
+            target_zip.writestr(ZipInfo(info.filename, (2001, 1, 1, 0, 0, 0)), source_zip.read(info), ZIP_STORED)
+
+    second = open(handle.process_file(str(reexport_path), cache=True, deterministic=True), 'rb').read()
+
+    assert len(pipeline_runs) == 1
+    assert second == first
+
+def test_changed_options_and_content_miss_the_cache(handle, cache, cache_dir, pipeline_runs, tmp_path):
+    export_path = tmp_path / 'export.3mf'
+    make_export(export_path)
+
+    handle.process_file(str(export_path), cache=True)
+    handle.process_file(str(export_path), cache=True, compact_meshes=True)
+    assert len(pipeline_runs) == 2
+
+    # options which don't change the output share the entry
+    handle.process_file(str(export_path), cache=True, trace_memory=True)
+    assert len(pipeline_runs) == 2
+
+    # same entries, other content
+    other_path = tmp_path / 'other.3mf'
+    make_export(other_path, seed=1)
+    result_cache = cache.ResultCache()
+    assert result_cache.key(str(export_path), {}) != result_cache.key(str(other_path), {})
+
+def test_least_recently_used_results_are_evicted(cache, tmp_path):
+    result_cache = cache.ResultCache(str(tmp_path / 'cache'), max_size=350)
+    keys = [f'{n:02d}' * 32 for n in range(4)]
+
+    for n, key in enumerate(keys[:3]):
+        output_path = tmp_path / f'{n}.3mf'
+        output_path.write_bytes(b'x' * 100)
+        result_cache.store(key, str(output_path))
+        # distinct last use, whatever the resolution of file system timestamps
+        os.utime(result_cache.entry_path(key), (1000 + n, 1000 + n))
+
+    # restoring the oldest one makes it the most recently used, the next one is evicted instead
+    assert result_cache.restore(keys[0], str(tmp_path / 'restored.3mf'))
+    result_cache.store(keys[3], str(tmp_path / '0.3mf'))
+
+    assert [os.path.exists(result_cache.entry_path(key)) for key in keys] == [True, False, True, True]
+    assert result_cache.stats()['entries'] == 3
+
+def test_restored_output_is_a_copy(cache, tmp_path):
+    result_cache = cache.ResultCache(str(tmp_path / 'cache'))
+    key = 'ab' * 32
+
+    output_path = tmp_path / 'output.3mf'
+    output_path.write_bytes(b'processed')
+    result_cache.store(key, str(output_path))
+
+    restored_path = tmp_path / 'restored.3mf'
+    assert result_cache.restore(key, str(restored_path))
+    assert not os.path.samefile(restored_path, result_cache.entry_path(key))
+
+    # edited in place by the user - the cached result stays as it was
+    with open(restored_path, 'r+b') as file:
+        file.write(b'EDITED')
+
+    assert open(result_cache.entry_path(key), 'rb').read() == b'processed'
+    assert not result_cache.restore('cd' * 32, str(restored_path))
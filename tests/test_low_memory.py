@@ -0,0 +1,99 @@
+import random
+from zipfile import ZipFile, ZIP_DEFLATED
+from xml.etree import ElementTree as ET
+
+import pytest
+
+CONTENT_TYPES = '<?xml version="1.0" encoding="UTF-8"?><Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types"><Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/><Default Extension="model" ContentType="application/vnd.ms-package.3dmanufacturing-3dmodel+xml"/></Types>'
+RELS = '<?xml version="1.0" encoding="UTF-8"?><Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships"><Relationship Target="/3D/3dmodel.model" Id="rel0" Type="http://schemas.microsoft.com/3dmanufacturing/2013/01/3dmodel"/></Relationships>'
+
+# component: object names - long, escaped and non ASCII names end up split between reads
+COMPONENTS = {
+    'Bracket': ['$Bracket__MAIN_body', '$Bracket__MOD_infill &amp; walls', '$Bracket__NEG_hole_M3'],
+    'Housing with a very long name, to span more than a few reads': [
+        '$Housing with a very long name, to span more than a few reads__MAIN_shell',
+        '$Housing with a very long name, to span more than a few reads__PART_lid ü → ∅',
+        '$Housing with a very long name, to span more than a few reads__SUP-BLCK_blocker &quot;quoted&quot; a>b',
+    ],
+    'Body1': ['Body1'],
+}
+
+def make_export(path, seed: int = 0):
+    rng = random.Random(seed)
+    resources = []
+    items = []
+    object_id = 1
+
+    for names in COMPONENTS.values():
+        for name in names:
+            color_group_id, object_id = object_id, object_id + 1
+            vertices = ''.join(f'<vertex x="{rng.uniform(0, 50):.6f}" y="{rng.uniform(0, 50):.6f}" z="{rng.uniform(0, 50):.6f}" />' for _ in range(12))
+            triangles = ''.join(f'<triangle v1="{n}" v2="{n + 1}" v3="{n + 2}" />' for n in range(10))
+
+            resources.append(f'<m:colorgroup id="{color_group_id}"><m:color color="#{rng.randrange(16 ** 6):06X}FF" /></m:colorgroup>')
+            resources.append(
+                f'<object id="{object_id}" name="{name}" type="model" p:UUID="00000000-0000-4000-8000-{object_id:012d}" pid="{color_group_id}" pindex="0">'
+                f'<mesh><vertices>{vertices}</vertices><triangles>{triangles}</triangles></mesh></object>'
+            )
+            items.append(f'<item objectid="{object_id}" transform="1 0 0 0 1 0 0 0 1 {object_id} 0 0" />')
+            object_id += 1
+
+    model = (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<model unit="millimeter" xml:lang="en-US" xmlns="http://schemas.microsoft.com/3dmanufacturing/core/2015/02" '
+        'xmlns:m="http://schemas.microsoft.com/3dmanufacturing/material/2015/02" xmlns:p="http://schemas.microsoft.com/3dmanufacturing/production/2015/06" requiredextensions="p">\n'
+        '<metadata name="Application">Fusion</metadata><metadata name="Title">Low &amp; full</metadata>\n'
+        f'<resources>{"".join(resources)}</resources>\n<build>{"".join(items)}</build>\n</model>\n'
+    )
+
+    with ZipFile(path, 'w', ZIP_DEFLATED) as target_zip:
+        target_zip.writestr('[Content_Types].xml', CONTENT_TYPES)
+        target_zip.writestr('_rels/.rels', RELS)
+        target_zip.writestr('3D/3dmodel.model', model)
+        # as in Fusion exports - a binary entry, copied as it is
+        target_zip.writestr('Metadata/thumbnail.png', rng.randbytes(1000))
+
+# element tree without formatting - whitespace, attribute order and escaping don't matter
+def canonical(element) -> tuple:
+    return (element.tag, sorted(element.attrib.items()), (element.text or '').strip(), [canonical(child) for child in element])
+
+def read_output(path) -> dict:
+    with ZipFile(path, 'r') as source_zip:
+        return {name: canonical(ET.fromstring(source_zip.read(name))) if not name.endswith('.png') else source_zip.read(name) for name in source_zip.namelist()}
+
+@pytest.fixture(scope='module')
+def handle(addin_module):
+    return addin_module('lib.postProcessUtils.src.handle')
+
+@pytest.fixture(scope='module')
+def model_stream(addin_module):
+    return addin_module('lib.postProcessUtils.src.builder.model_stream')
+
+@pytest.mark.parametrize('stream', [False, True])
+@pytest.mark.parametrize('chunk_size', [None, 1, 7, 61, 4093])
+def test_low_memory_matches_full_model(handle, model_stream, monkeypatch, tmp_path, stream, chunk_size):
+    export_path = tmp_path / 'export.3mf'
+    make_export(export_path)
+
+    full = read_output(handle.process_file(str(export_path), deterministic=True))
+
+    if chunk_size is not None:
+        class SmallChunksRewriter(model_stream.ModelStreamRewriter):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                self.chunk_size = chunk_size
+
+        monkeypatch.setattr(model_stream, 'ModelStreamRewriter', SmallChunksRewriter)
+
+    low_memory = read_output(handle.process_file(str(export_path), deterministic=True, low_memory=True, stream=stream))
+
+    assert low_memory.keys() == full.keys()
+    for name in full:
+        assert low_memory[name] == full[name], name
+
+    # the comparison covers what it should - every component is wrapped and placed, names are kept in the settings
+    model = ET.fromstring(ZipFile(tmp_path / 'export_processed.3mf').read('3D/3dmodel.model'))
+    core = '{http://schemas.microsoft.com/3dmanufacturing/core/2015/02}'
+    assert len(model.findall(f'{core}resources/{core}object/{core}components')) == len(COMPONENTS)
+    assert len(model.findall(f'{core}build/{core}item')) == len(COMPONENTS)
+    assert [element.text for element in model.findall(f'{core}metadata')] == ['Fusion', 'Low & full']
@@ -0,0 +1,57 @@
+import random
+from zlib import crc32
+from zipfile import ZipFile, ZipInfo, ZIP_DEFLATED
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+@pytest.fixture(scope='module')
+def parallel(addin_module):
+    return addin_module('lib.postProcessUtils.src.utils.archive_strategies.parallel')
+
+# mesh like (compressible) text with random (incompressible) runs
+def make_payload(size: int) -> bytes:
+    rng = random.Random(size)
+    parts = []
+
+    while sum(len(part) for part in parts) < size:
+        parts.append(f'<vertex x="{rng.uniform(-100, 100):.6f}" y="{rng.uniform(-100, 100):.6f}" z="{rng.uniform(0, 50):.6f}" />\n'.encode('utf-8'))
+        if rng.random() < 0.01:
+            parts.append(rng.randbytes(rng.randint(1, 4096)))
+
+    return b''.join(parts)[:size]
+
+@pytest.mark.parametrize('chunks', [1, 2, 7])
+def test_multi_chunk_entry_round_trip(parallel, monkeypatch, tmp_path, chunks):
+    # small chunks and window - many chunks in flight, written while others are still compressed
+    monkeypatch.setattr(parallel, 'CHUNK_SIZE', 64 * 1024)
+    monkeypatch.setattr(parallel, 'WINDOW_SIZE', 2)
+
+    payload = make_payload(parallel.CHUNK_SIZE * (chunks - 1) + 12345)
+    archive_path = tmp_path / 'entries.3mf'
+
+    with ZipFile(archive_path, 'w', ZIP_DEFLATED) as target_zip, ThreadPoolExecutor(4) as pool:
+        with parallel.open_entry(target_zip, ZipInfo('3D/3dmodel.model'), pool) as target:
+            # uneven writes, not aligned with chunks
+            for offset in range(0, len(payload), 50000):
+                target.write(payload[offset:offset + 50000])
+
+        target_zip.writestr('after.txt', b'next entry')
+
+    with ZipFile(archive_path, 'r') as source_zip:
+        assert source_zip.testzip() is None
+
+        info = source_zip.getinfo('3D/3dmodel.model')
+        assert info.CRC == crc32(payload)
+        assert info.file_size == len(payload)
+        assert source_zip.read(info) == payload
+        assert source_zip.read('after.txt') == b'next entry'
+
+def test_crc32_combine(parallel):
+    rng = random.Random(0)
+    data = rng.randbytes(100000)
+
+    for split in [0, 1, 4096, 65536, len(data)]:
+        head, tail = data[:split], data[split:]
+
+        assert parallel.crc32_combine(crc32(head), crc32(tail), len(tail)) == crc32(data)
@@ -0,0 +1,117 @@
+import sys
+import types
+from os.path import isfile
+from unittest.mock import MagicMock
+
+import pytest
+
+from test_low_memory import make_export
+
+# Fusion's API isn't available outside of Fusion - importing the commands package (which imports every command's
+# entry module) needs just enough of "adsk" to get through module level code.
+@pytest.fixture
+def worker(addin_module, monkeypatch):
+    adsk = types.ModuleType('adsk')
+
+    for name in ['core', 'fusion', 'cam']:
+        module = types.ModuleType(f'adsk.{name}')
+        module.__getattr__ = lambda attribute: MagicMock(name=attribute)
+        setattr(adsk, name, module)
+        monkeypatch.setitem(sys.modules, f'adsk.{name}', module)
+
+    monkeypatch.setitem(sys.modules, 'adsk', adsk)
+
+    return addin_module('commands.ContextAwareExport.post_process_worker')
+
+# payloads sent by the job, in order
+class RecordingNotify:
+    def __init__(self):
+        self.payloads = []
+
+    def __call__(self, payload: dict):
+        self.payloads.append(payload)
+
+    def of_status(self, status: str) -> list[dict]:
+        return [payload for payload in self.payloads if payload['status'] == status]
+
+def run_job(worker, notify, paths: list, cancel: bool = False, **options) -> dict:
+    job = worker.PostProcessJob(notify, workers=1, **options)
+
+    if cancel:
+        job.cancel()
+    for path in paths:
+        job.submit(str(path))
+
+    job.close().join(60)
+
+    assert not job.waiter.is_alive()
+    assert notify.payloads[-1]['status'] == 'done'
+    assert len(notify.of_status('done')) == 1
+
+    return {result['path']: result for result in notify.payloads[-1]['results']}
+
+def test_progress_and_done(worker, tmp_path):
+    export_path = tmp_path / 'export.3mf'
+    make_export(export_path)
+    notify = RecordingNotify()
+
+    results = run_job(worker, notify, [export_path])
+
+    result = results[str(export_path)]
+    assert result['status'] == 'ok', result['trace']
+    assert isfile(result['output_path'])
+
+    progress = notify.of_status('progress')
+    steps = [payload['step'] for payload in progress if payload['step'] is not None]
+    assert progress[0]['stage'] == worker.PROGRESS_STAGES[0]
+    assert steps == sorted(steps) and steps[-1] == len(worker.PROGRESS_STAGES)
+    assert all(payload['path'] == str(export_path) and payload['total'] == 1 for payload in progress)
+
+def test_failed_file_does_not_stop_the_others(worker, tmp_path):
+    broken_path = tmp_path / 'broken.3mf'
+    broken_path.write_bytes(b'not a zip')
+    export_path = tmp_path / 'export.3mf'
+    make_export(export_path)
+    notify = RecordingNotify()
+
+    job = worker.PostProcessJob(notify, workers=1)
+    job.submit(str(broken_path))
+    job.submit(str(export_path))
+    job.add_result(str(tmp_path / 'not_exported.3mf'), 'failed', 'Export failed')
+    job.close().join(60)
+
+    results = notify.payloads[-1]['results']
+    assert [result['status'] for result in results] == ['failed', 'ok', 'failed']
+    assert results[0]['error'] and 'Traceback' in results[0]['trace']
+    assert results[2]['error'] == 'Export failed'
+    assert list(job.errors) == [str(broken_path)]
+
+def test_cancelled_before_start(worker, tmp_path):
+    export_path = tmp_path / 'export.3mf'
+    make_export(export_path)
+    notify = RecordingNotify()
+
+    results = run_job(worker, notify, [export_path], cancel=True)
+
+    assert results[str(export_path)]['status'] == 'cancelled'
+    assert not notify.of_status('progress')
+    assert not isfile(tmp_path / 'export_processed.3mf')
+
+def test_cancelled_before_next_stage(worker, tmp_path):
+    export_path = tmp_path / 'export.3mf'
+    make_export(export_path)
+    notify = RecordingNotify()
+
+    # cancelled as the first stage starts - processing stops before the second one
+    def cancelling_notify(payload: dict):
+        notify(payload)
+        if payload['status'] == 'progress':
+            job.cancel()
+
+    job = worker.PostProcessJob(cancelling_notify, workers=1)
+    job.submit(str(export_path))
+    job.close().join(60)
+
+    assert notify.payloads[-1]['results'][0]['status'] == 'cancelled'
+    assert [payload['stage'] for payload in notify.of_status('progress')] == [worker.PROGRESS_STAGES[0]]
+    assert not isfile(tmp_path / 'export_processed.3mf')
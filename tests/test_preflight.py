@@ -0,0 +1,78 @@
+from zipfile import ZipFile, ZIP_DEFLATED, ZIP_STORED
+
+import pytest
+
+from test_low_memory import make_export
+
+@pytest.fixture(scope='module')
+def preflight(addin_module):
+    return addin_module('lib.postProcessUtils.src.preflight')
+
+# export with 3D/3dmodel.model passed through edit, other entries as they are
+def make_broken_export(path, edit, compress_type=ZIP_DEFLATED):
+    valid_path = path.with_name('valid.3mf')
+    make_export(valid_path)
+
+    with ZipFile(valid_path, 'r') as source_zip, ZipFile(path, 'w', compress_type) as target_zip:
+        for name in source_zip.namelist():
+            content = source_zip.read(name)
+            if name == '3D/3dmodel.model':
+                content = edit(content)
+            if content is not None:
+                target_zip.writestr(name, content)
+
+def test_valid_export(preflight, tmp_path):
+    make_export(tmp_path / 'export.3mf')
+
+    report = preflight.preflight(str(tmp_path / 'export.3mf'))
+
+    assert report.ok, report.errors
+    assert report.objects == 7
+    assert report.components['Bracket'] == {'MAIN': 1, 'MOD': 1, 'NEG': 1}
+
+def test_not_a_zip(preflight, tmp_path):
+    (tmp_path / 'export.3mf').write_bytes(b'solid cube\nendsolid cube\n')
+
+    report = preflight.preflight(str(tmp_path / 'export.3mf'))
+
+    assert not report.ok
+    assert report.errors[0].startswith('Unable to read archive')
+
+def test_missing_entry(preflight, tmp_path):
+    make_broken_export(tmp_path / 'export.3mf', lambda content: None)
+
+    report = preflight.preflight(str(tmp_path / 'export.3mf'))
+
+    assert report.errors == ['Missing archive entry "3D/3dmodel.model"']
+
+# cut inside of mesh content (skipped in place when stored, memory mapped) and inside of tags, before and after </resources>
+@pytest.mark.parametrize('compress_type', [ZIP_DEFLATED, ZIP_STORED], ids=['deflated', 'stored'])
+@pytest.mark.parametrize('marker', [b'<triangles>', b'<object id="4"', b'<build>', b'</build>'])
+def test_truncated_model(preflight, tmp_path, compress_type, marker):
+    make_broken_export(tmp_path / 'export.3mf', lambda content: content[:content.index(marker) + 3], compress_type)
+
+    report = preflight.preflight(str(tmp_path / 'export.3mf'))
+
+    assert not report.ok
+    assert 'unexpected end of file' in report.errors[-1]
+
+def test_dangling_color_group(preflight, tmp_path):
+    make_broken_export(tmp_path / 'export.3mf', lambda content: content.replace(b'pid="1"', b'pid="99"', 1))
+
+    report = preflight.preflight(str(tmp_path / 'export.3mf'))
+
+    assert report.errors == ['Object "$Bracket__MAIN_body" references missing color group 99']
+
+@pytest.mark.parametrize('edit, error', [
+    (lambda content: content.replace(b'</build>', b'</buil>'), 'end tag </buil> does not match <build>'),
+    (lambda content: content.replace(b'</build>', b'</model>'), 'end tag </model> does not match <build>'),
+    (lambda content: content.replace(b'</model>', b''), 'unexpected end of file, <model> is not closed'),
+    (lambda content: content.replace(b'<item objectid="2"', b'<item objectid="99"'), 'Build item references missing object 99'),
+], ids=['misspelled', 'unclosed', 'no_root_end', 'dangling_item'])
+def test_broken_build(preflight, tmp_path, edit, error):
+    make_broken_export(tmp_path / 'export.3mf', edit)
+
+    report = preflight.preflight(str(tmp_path / 'export.3mf'))
+
+    assert len(report.errors) == 1
+    assert error in report.errors[0]
@@ -0,0 +1,92 @@
+import os
+import json
+import threading
+from http.client import HTTPConnection
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from test_low_memory import make_export
+
+@pytest.fixture(scope='module')
+def service(addin_module):
+    return addin_module('lib.postProcessUtils.src.service')
+
+@pytest.fixture
+def processing_service(service):
+    processing_service = service.ProcessingService(workers=1)
+    yield processing_service
+    processing_service.shutdown()
+
+# pool of workers which died, as seen by the requests submitted to it
+class BrokenPool:
+    def submit(self, *args, **kwargs):
+        raise BrokenProcessPool('A child process terminated abruptly')
+
+    def shutdown(self, *args, **kwargs):
+        pass
+
+def post(server, path: str) -> tuple[int, dict]:
+    connection = HTTPConnection('127.0.0.1', server.server_port)
+    try:
+        connection.request('POST', f'/process?path={path}')
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        connection.close()
+
+def test_pool_which_cannot_be_restarted_fails_requests_with_503(service, processing_service, monkeypatch, tmp_path):
+    export_path = tmp_path / 'export.3mf'
+    make_export(export_path)
+
+    def create_pool(workers):
+        raise OSError('Too many open files')
+
+    monkeypatch.setattr(service.batch, 'create_pool', create_pool)
+    processing_service.pool = BrokenPool()
+
+    server = service.ServiceHTTPServer(('127.0.0.1', 0), processing_service)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    try:
+        code, payload = post(server, export_path)
+        assert code == 503
+        assert payload['status'] == 'failed'
+        assert 'could not be restarted' in payload['error']
+        assert processing_service.health()['status'] == 'broken'
+
+        # the next request tries to start the workers again
+        monkeypatch.undo()
+
+        code, payload = post(server, export_path)
+        assert code == 422
+        assert processing_service.health()['status'] == 'ok'
+        assert processing_service.health()['pool_restarts'] == 1
+
+        code, payload = post(server, export_path)
+        assert code == 200, payload
+        assert os.path.isfile(payload['output_path'])
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_symlinks_do_not_lead_out_of_allowed_roots(service, tmp_path):
+    allowed_path = tmp_path / 'allowed'
+    outside_path = tmp_path / 'outside'
+    allowed_path.mkdir()
+    outside_path.mkdir()
+    (outside_path / 'export.3mf').write_bytes(b'')
+    (allowed_path / 'export.3mf').write_bytes(b'')
+    (allowed_path / 'link').symlink_to(outside_path, target_is_directory=True)
+    (tmp_path / 'allowed_link').symlink_to(allowed_path, target_is_directory=True)
+
+    processing_service = service.ProcessingService(workers=1, allowed_roots=[str(tmp_path / 'allowed_link')])
+
+    try:
+        assert processing_service.is_allowed_path(str(allowed_path / 'export.3mf'))
+        assert processing_service.is_allowed_path(str(tmp_path / 'allowed_link' / 'export.3mf'))
+        assert not processing_service.is_allowed_path(str(allowed_path / 'link' / 'export.3mf'))
+        assert not processing_service.is_allowed_path(str(outside_path / 'export.3mf'))
+    finally:
+        processing_service.shutdown()
@@ -0,0 +1,61 @@
+import shutil
+from zipfile import ZipFile
+
+import pytest
+
+pytest.importorskip('lxml')
+
+OPTIONS = {
+    'default': {},
+    'split_objects': {'split_objects': True},
+    'optimize_meshes': {'optimize_meshes': True},
+    'map_filaments': {'map_filaments': True},
+}
+
+@pytest.fixture(scope='module')
+def handle(addin_module):
+    return addin_module('lib.postProcessUtils.src.handle')
+
+@pytest.fixture(scope='module')
+def xml_utils(addin_module):
+    return addin_module('lib.postProcessUtils.src.utils.xml_utils')
+
+@pytest.fixture(scope='module')
+def export_path(addin_module, tmp_path_factory):
+    generator = addin_module('lib.postProcessUtils.src.benchmark.generator')
+    return generator.generate_3mf(str(tmp_path_factory.mktemp('export') / 'export.3mf'), generator.GeneratorOptions(components=3, triangles=200))
+
+def read_entries(path: str) -> dict:
+    with ZipFile(path, 'r') as source_zip:
+        return {name: source_zip.read(name) for name in source_zip.namelist()}
+
+def process_with(handle, xml_utils, monkeypatch, export_path: str, tmp_path, backend: str, options: dict) -> dict:
+    monkeypatch.setattr(xml_utils, '_backend', xml_utils.create_xml_backend(backend))
+
+    path = str(tmp_path / f'{backend}.3mf')
+    shutil.copyfile(export_path, path)
+
+    return read_entries(handle.process_file(path, deterministic=True, **options))
+
+# both backends write the same bytes - the backend is a matter of speed and memory, never of the output
+@pytest.mark.parametrize('options', OPTIONS.values(), ids=OPTIONS.keys())
+def test_backends_write_identical_archives(handle, xml_utils, monkeypatch, export_path, tmp_path, options):
+    if options.get('optimize_meshes'):
+        pytest.importorskip('numpy')
+
+    stdlib = process_with(handle, xml_utils, monkeypatch, export_path, tmp_path, 'stdlib', options)
+    lxml = process_with(handle, xml_utils, monkeypatch, export_path, tmp_path, 'lxml', options)
+
+    assert list(lxml) == list(stdlib)
+    for name in stdlib:
+        assert lxml[name] == stdlib[name], name
+
+def test_bad_environment_backend_falls_back_to_auto(xml_utils, monkeypatch):
+    monkeypatch.setenv(xml_utils.XML_BACKEND_ENV, 'lxm')
+
+    with pytest.warns(RuntimeWarning, match='lxm'):
+        backend = xml_utils.create_default_xml_backend()
+    assert backend.name == xml_utils.create_xml_backend('auto').name
+
+    with pytest.raises(ValueError):
+        xml_utils.create_xml_backend('lxm')